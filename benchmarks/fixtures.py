@@ -0,0 +1,390 @@
+"""
+Synthetic stand-ins for the downloaded source files of the workflows, at a fraction ("scale") of their size for the
+whole of Great Britain, so that the stages can be benchmarked offline.
+
+The files have the layout, columns and types the stages read (e.g. the GML of the OS OpenMap Local tiles, with
+features repeated in neighbouring tiles, or the CSV files with the columns the stages drop as well as those they
+keep), with random values. At scale 1 they have about as many features as the real files; the sizes at scale 1 are
+the GB_* constants.
+"""
+import json
+import math
+import sys
+import zipfile
+from pathlib import Path
+from typing import List, Sequence
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "workflows"))
+from common.geometry import from_pygeos, to_pygeos  # noqa: E402 pylint: disable=wrong-import-position
+
+# approximate sizes of the real files
+GB_OPENMAP_TILES = 55
+GB_OPENMAP_ROADS = 3_500_000
+GB_OPENMAP_BUILDINGS = 12_000_000
+GB_WPD_SUBSTATIONS = 185_000
+GB_UKPN_SITES = 1_000
+GB_NCR_CHARGE_POINTS = 30_000
+GB_POSTCODE_AREAS = 120
+GB_POSTCODE_DISTRICTS = 2_900
+GB_LSOAS = 34_753
+
+# the extent of the features, in the British National Grid (EPSG:27700) and in longitude / latitude
+BNG_BOUNDS = (100_000, 20_000, 650_000, 1_000_000)
+LON_LAT_BOUNDS = (-5.5, 50.0, 1.7, 58.6)
+
+# the share of the features of an OS OpenMap Local tile that are repeated in the next tile
+OPENMAP_REPEATED_FRACTION = 0.05
+ROAD_CLASSIFICATIONS = [
+    "Motorway",
+    "Primary Road",
+    "A Road",
+    "B Road",
+    "Minor Road",
+    "Local Street",
+    "Private Road Publicly Accessible",
+    "Pedestrianised Street",
+]
+STREET_NAMES = ["High Street", "Station Road", "Church Lane", "Mill Road", "London Road", "Park Avenue", None]
+
+# the number of columns of the CSV files that the stages do not read
+WPD_UNUSED_COLUMNS = 20
+NCR_UNUSED_COLUMNS = 150
+UKPN_YEARS = range(2019, 2031)
+UKPN_SCENARIOS = ["Planning Scenario", "Consumer Transformation", "Leading the Way", "Steady Progression"]
+POSTCODE_DISTRICT_VERTICES = 400
+LSOA_VERTICES = 120
+EV_REGISTRATION_QUARTERS = 12
+
+
+def scaled(count: int, scale: float, minimum: int = 1) -> int:
+    """
+    :param count: a count at scale 1
+    :param scale: the scale
+    :return: the count at the scale
+    """
+    return max(minimum, int(round(count * scale)))
+
+
+def _uniform_points(rng: np.random.Generator, n: int, bounds: Sequence[float]) -> np.ndarray:
+    return rng.uniform(bounds[:2], bounds[2:], size=(n, 2))
+
+
+def noisy_grid_polygons(
+    n: int, vertices: int, bounds: Sequence[float] = LON_LAT_BOUNDS, seed: int = 0
+) -> np.ndarray:
+    """
+    :param n: the number of polygons
+    :param vertices: the number of vertices of each polygon
+    :param bounds: the extent of the grid
+    :param seed: the seed of the noise
+    :return: pygeos polygons on a grid covering the bounds, with noisy, densely sampled edges
+    """
+    rng = np.random.default_rng(seed)
+    columns = math.ceil(math.sqrt(n))
+    rows = math.ceil(n / columns)
+    width, height = (bounds[2] - bounds[0]) / columns, (bounds[3] - bounds[1]) / rows
+    per_edge = max(1, vertices // 4)
+    t = np.linspace(0, 1, per_edge, endpoint=False)
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+    unit_ring = np.concatenate([a + (b - a) * t[:, np.newaxis] for a, b in zip(corners[:-1], corners[1:])])
+    # the vertices only move across their edge (less towards the corners), so the rings never cross themselves
+    normals = np.concatenate(
+        [np.tile([b[1] - a[1], a[0] - b[0]], (per_edge, 1)) for a, b in zip(corners[:-1], corners[1:])]
+    )
+    normals = normals * np.tile(np.sin(np.pi * t), 4)[:, np.newaxis]
+    polygons = []
+    for i in range(n):
+        column, row = i % columns, i // columns
+        ring = (unit_ring + normals * rng.normal(0, 0.02, (len(unit_ring), 1))) * [width, height]
+        ring += [bounds[0] + column * width, bounds[1] + row * height]
+        polygons.append(pygeos.polygons(np.concatenate([ring, ring[:1]])))
+    return np.array(polygons)
+
+
+def _pos_list(coordinates: np.ndarray) -> str:
+    return " ".join(f"{x:.2f} {y:.2f}" for x, y in coordinates)
+
+
+def _road_member(feature_id: str, coordinates: np.ndarray, rng: np.random.Generator) -> str:
+    classification = ROAD_CLASSIFICATIONS[rng.integers(len(ROAD_CLASSIFICATIONS))]
+    name = STREET_NAMES[rng.integers(len(STREET_NAMES))]
+    number = f"{classification[0]}{rng.integers(1, 9999)}" if classification in ("A Road", "B Road") else None
+    properties = "".join(
+        f"<os:{tag}>{value}</os:{tag}>"
+        for tag, value in [("distinctiveName", name), ("roadNumber", number), ("classification", classification)]
+        if value is not None
+    )
+    return (
+        f'<gml:featureMember><os:Road gml:id="{feature_id}"><os:featureCode>25710</os:featureCode>{properties}'
+        f'<os:geometry><gml:LineString srsName="EPSG:27700"><gml:posList>{_pos_list(coordinates)}</gml:posList>'
+        "</gml:LineString></os:geometry></os:Road></gml:featureMember>\n"
+    )
+
+
+def _building_member(feature_id: str, coordinates: np.ndarray) -> str:
+    return (
+        f'<gml:featureMember><os:Building gml:id="{feature_id}"><os:featureCode>15014</os:featureCode>'
+        '<os:geometry><gml:Polygon srsName="EPSG:27700"><gml:exterior><gml:LinearRing>'
+        f"<gml:posList>{_pos_list(coordinates)}</gml:posList></gml:LinearRing></gml:exterior></gml:Polygon>"
+        "</os:geometry></os:Building></gml:featureMember>\n"
+    )
+
+
+def _openmap_tile(
+    tile: int, bounds: Sequence[float], n_roads: int, n_buildings: int, rng: np.random.Generator
+) -> List[str]:
+    members = []
+    starts = _uniform_points(rng, n_roads, bounds)
+    for i, start in enumerate(starts):
+        steps = rng.normal(0, 50, size=(rng.integers(1, 10), 2))
+        coordinates = np.concatenate([[start], start + np.cumsum(steps, axis=0)])
+        members.append(_road_member(f"road-{tile}-{i}", coordinates, rng))
+    corners = _uniform_points(rng, n_buildings, bounds)
+    sizes = rng.uniform(5, 30, size=(n_buildings, 2))
+    for i, ((x, y), (width, height)) in enumerate(zip(corners, sizes)):
+        coordinates = np.array([[x, y], [x + width, y], [x + width, y + height], [x, y + height], [x, y]])
+        members.append(_building_member(f"building-{tile}-{i}", coordinates))
+    return members
+
+
+def write_openmap_zip(path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write a stand-in for os-openmap-local.zip: GML tiles with Road and Building layers, in which some of the features
+    of each tile are repeated in the next one (as the real tiles repeat the features crossing their edges)
+    :param path: the zip file
+    :param scale: the fraction of the size of the real file
+    :param seed: the seed of the random features
+    """
+    rng = np.random.default_rng(seed)
+    n_tiles = scaled(GB_OPENMAP_TILES, scale, minimum=2)
+    n_roads = scaled(GB_OPENMAP_ROADS, scale) // n_tiles + 1
+    n_buildings = scaled(GB_OPENMAP_BUILDINGS, scale) // n_tiles + 1
+    columns = math.ceil(math.sqrt(n_tiles))
+    tile_size = 100_000
+    repeated: List[str] = []
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for tile in range(n_tiles):
+            min_x = BNG_BOUNDS[0] + (tile % columns) * tile_size
+            min_y = BNG_BOUNDS[1] + (tile // columns) * tile_size
+            members = _openmap_tile(
+                tile, (min_x, min_y, min_x + tile_size, min_y + tile_size), n_roads, n_buildings, rng
+            )
+            body = "".join(repeated + members)
+            repeated = [members[i] for i in np.flatnonzero(rng.random(len(members)) < OPENMAP_REPEATED_FRACTION)]
+            zip_file.writestr(
+                f"OSOpenMapLocal/data/tile{tile:03d}.gml",
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" '
+                'xmlns:os="http://namespaces.os.uk/open/oml/1.0">\n' + body + "</gml:FeatureCollection>\n",
+            )
+
+
+def _unused_columns(rng: np.random.Generator, n_rows: int, n_columns: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {f"Unused Column {i}": rng.integers(0, 1000, n_rows) if i % 2 else "x" * (i % 7) for i in range(n_columns)}
+    )
+
+
+def write_wpd_substations_csv(path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write a stand-in for the WPD distribution substation CSV file
+    :param path: the CSV file
+    :param scale: the fraction of the size of the real file
+    :param seed: the seed of the random values
+    """
+    rng = np.random.default_rng(seed)
+    n = scaled(GB_WPD_SUBSTATIONS, scale)
+    points = _uniform_points(rng, n, LON_LAT_BOUNDS)
+
+    def counts():
+        return np.where(rng.random(n) < 0.2, np.nan, rng.integers(0, 50, n))
+
+    df = pd.DataFrame(
+        {
+            "DNO": rng.choice(["WPD South West", "WPD South Wales", "WPD East Midlands", "WPD West Midlands"], n),
+            "PRIMARY SUBSTATION NAME": [f"Primary {i}" for i in rng.integers(0, 2_000, n)],
+            "PRIMARY SUBSTATION NUMBER": rng.integers(100_000, 999_999, n).astype(str),
+            "HV FEEDER": [f"Feeder {i}" for i in rng.integers(0, 30, n)],
+            "SUBSTATION TYPE": rng.choice(["Ground Mounted", "Pole Mounted"], n),
+            "SUBSTATION NAME": [f"Substation {i}" for i in range(n)],
+            "SUBSTATION NUMBER": np.arange(n).astype(str),
+            "GRID REFERENCE": [f"ST{x:05d}{y:05d}" for x, y in rng.integers(0, 99_999, (n, 2))],
+            "DAY_MAX_DEMAND": rng.uniform(0, 500, n).round(1),
+            "NIGHT_MAX_DEMAND": rng.uniform(0, 500, n).round(1),
+            "SUBSTATION_RATING": rng.choice([50.0, 100.0, 200.0, 315.0, 500.0, 800.0], n),
+            "LCT Count": counts(),
+            "Energy Storage": counts(),
+            "EV Charge Point": counts(),
+            "Heat Pump": counts(),
+            "Photovoltaic": counts(),
+            "CUSTOMERS COUNT": counts(),
+            "LATITUDE": points[:, 1].round(6),
+            "LONGITUDE": points[:, 0].round(6),
+        }
+    )
+    pd.concat([df, _unused_columns(rng, n, WPD_UNUSED_COLUMNS)], axis=1).to_csv(path, index=False)
+
+
+def write_ukpn_csvs(sites_path: str, headroom_path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write stand-ins for the UKPN grid and primary sites and network headroom CSV files
+    :param sites_path: the sites CSV file
+    :param headroom_path: the headroom CSV file, with a row for each site, year and scenario
+    :param scale: the fraction of the size of the real files
+    :param seed: the seed of the random values
+    """
+    rng = np.random.default_rng(seed)
+    n = scaled(GB_UKPN_SITES, scale)
+    points = _uniform_points(rng, n, LON_LAT_BOUNDS)
+    site_ids = [f"EPN-S{i:06d}" for i in range(n)]
+    sites_df = pd.DataFrame(
+        {
+            "SiteFunctionalLocation": site_ids,
+            "SiteName": [f"Site {i}" for i in range(n)],
+            "SiteType": rng.choice(["Primary Substation", "Grid Substation"], n, p=[0.85, 0.15]),
+            "SiteVoltage": rng.choice([11, 33, 132], n),
+            "Total_Generation": rng.uniform(0, 60, n).round(2),
+            # a few sites have no location
+            "Longitude": np.where(rng.random(n) < 0.005, np.nan, points[:, 0].round(6)),
+            "Latitude": points[:, 1].round(6),
+        }
+    )
+    sites_df.to_csv(sites_path, index=False)
+    years, scenarios, sites = np.meshgrid(list(UKPN_YEARS), UKPN_SCENARIOS, site_ids, indexing="ij")
+    headroom_df = pd.DataFrame(
+        {
+            "SiteFunctionalLocation": sites.ravel(),
+            "Year": years.ravel(),
+            "Scenario": scenarios.ravel(),
+            "Headroom": rng.uniform(-10, 40, sites.size).round(2),
+        }
+    )
+    headroom_df.to_csv(headroom_path, index=False)
+
+
+def write_ncr_csv(path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write a stand-in for the National Chargepoint Registry CSV file
+    :param path: the CSV file
+    :param scale: the fraction of the size of the real file
+    :param seed: the seed of the random values
+    """
+    rng = np.random.default_rng(seed)
+    n = scaled(GB_NCR_CHARGE_POINTS, scale)
+    points = _uniform_points(rng, n, LON_LAT_BOUNDS)
+    df = pd.DataFrame(
+        {
+            "chargeDeviceID": [f"{i:032x}" for i in rng.integers(0, 2 ** 62, n)],
+            "reference": [f"REF{i}" for i in range(n)],
+            "name": [f"Charge point {i}" for i in range(n)],
+            "latitude": points[:, 1].round(6),
+            "longitude": points[:, 0].round(6),
+            "town": rng.choice(["Oxford", "Cardiff", "Édinburgh", "Leeds", "Norwich"], n),
+            "county": rng.choice(["Oxfordshire", "South Glamorgan", "Lothian", "West Yorkshire", "Norfolk"], n),
+            "postcode": [f"OX{i % 30} {i % 9}AB" for i in range(n)],
+            "chargeDeviceStatus": rng.choice(["In service", "Planned", "Out of service"], n, p=[0.9, 0.05, 0.05]),
+            "locationType": rng.choice(["On-street", "Car park", "Retail car park", "Service station"], n),
+            "connector1RatedOutputKW": rng.choice([3.7, 7.0, 22.0, 50.0, 150.0], n),
+        }
+    )
+    pd.concat([df, _unused_columns(rng, n, NCR_UNUSED_COLUMNS)], axis=1).to_csv(
+        path, index=False, line_terminator="\n"
+    )
+
+
+def postcode_districts(scale: float, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    :param scale: the fraction of the number of real postcode districts
+    :param seed: the seed of the random boundaries
+    :return: postcode districts, with their "Name" and area, as the postcode-districts stage writes them
+    """
+    n = scaled(GB_POSTCODE_DISTRICTS, scale, minimum=2)
+    n_areas = min(n, scaled(GB_POSTCODE_AREAS, scale, minimum=2))
+    polygons = noisy_grid_polygons(n, POSTCODE_DISTRICT_VERTICES, seed=seed)
+    areas = [f"{chr(ord('A') + area // 26)}{chr(ord('A') + area % 26)}" for area in range(n_areas)]
+    names = [f"{areas[i % n_areas]}{i // n_areas + 1}" for i in range(n)]
+    return gpd.GeoDataFrame({"Name": names}, geometry=from_pygeos(polygons, pd.RangeIndex(n), "EPSG:4326"))
+
+
+def write_postcode_kml(path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write a stand-in for PostcodeDistricts.kml: a folder (read as a layer) of 3D polygons for each postcode area,
+    including Northern Ireland (BT), which the stage leaves out
+    :param path: the KML file
+    :param scale: the fraction of the size of the real file
+    :param seed: the seed of the random boundaries
+    """
+    gdf = postcode_districts(scale, seed)
+    areas = gdf["Name"].str.extract(r"^([A-Z]+)")[0]
+    areas[areas == areas.iloc[-1]] = "BT"
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+        for area, area_gdf in gdf.groupby(areas, sort=False):
+            file.write(f"<Folder><name>{area}</name>\n")
+            for name, polygon in zip(area_gdf["Name"], to_pygeos(area_gdf.geometry)):
+                ring = pygeos.get_coordinates(pygeos.get_exterior_ring(polygon))
+                coordinates = " ".join(f"{x:.6f},{y:.6f},0" for x, y in ring)
+                file.write(
+                    f"<Placemark><name>{name}</name><description>{name} postcode district</description>"
+                    f"<Polygon><outerBoundaryIs><LinearRing><coordinates>{coordinates}</coordinates></LinearRing>"
+                    "</outerBoundaryIs></Polygon></Placemark>\n"
+                )
+            file.write("</Folder>\n")
+        file.write("</Document></kml>\n")
+
+
+def write_lsoa_geojson(path: str, scale: float, seed: int = 0) -> None:
+    """
+    Write a stand-in for lsoa-boundaries.geojson
+    :param path: the GeoJSON file
+    :param scale: the fraction of the size of the real file
+    :param seed: the seed of the random boundaries
+    """
+    n = scaled(GB_LSOAS, scale)
+    polygons = noisy_grid_polygons(n, LSOA_VERTICES, seed=seed)
+    features = [
+        {
+            "type": "Feature",
+            "properties": {
+                "OBJECTID": i + 1,
+                "LSOA11CD": f"E{i:08d}",
+                "LSOA11NM": f"Area {i // 5:04d}{chr(ord('A') + i % 5)}",
+                "Shape__Area": float(pygeos.area(polygon)),
+            },
+            "geometry": _geojson(polygon),
+        }
+        for i, polygon in enumerate(polygons)
+    ]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"type": "FeatureCollection", "features": features}, file)
+
+
+def _geojson(polygon: pygeos.Geometry) -> dict:
+    rings = [pygeos.get_exterior_ring(polygon)] + [
+        pygeos.get_interior_ring(polygon, i) for i in range(pygeos.get_num_interior_rings(polygon))
+    ]
+    return {"type": "Polygon", "coordinates": [pygeos.get_coordinates(ring).round(6).tolist() for ring in rings]}
+
+
+def write_ev_registrations_ods(path: str, districts: Sequence[str], seed: int = 0) -> None:
+    """
+    Write a stand-in for the DfT veh0134.ods spreadsheet: the registrations of each postcode district in each
+    quarter, below a few rows of notes and above a footer
+    :param path: the spreadsheet
+    :param districts: the postcode districts; the last one is renamed ZE2, which ends the table
+    :param seed: the seed of the random counts
+    """
+    rng = np.random.default_rng(seed)
+    districts = list(districts[:-1]) + ["ZE2"]
+    quarters = {
+        f"{2021 - i // 4} Q{4 - i % 4}": rng.integers(0, 2_000, len(districts)) for i in range(EV_REGISTRATION_QUARTERS)
+    }
+    df = pd.DataFrame({"Postcode District 2": districts, **quarters})
+    df = pd.concat([df, pd.DataFrame({"Postcode District 2": ["Source: DVLA, DfT", "Notes"]})], ignore_index=True)
+    # the rows of notes above the table are left empty
+    df.to_excel(path, sheet_name="VEH0134a", index=False, startrow=6, engine="odf")
@@ -0,0 +1,282 @@
+"""
+Runs the core function of each workflow stage on synthetic stand-ins for its source files (see fixtures.py) at several
+scales, and reports its throughput and memory. Nothing is downloaded, so it runs offline.
+
+e.g. python benchmarks/stages_benchmark.py --scales 0.01 0.1 --cases charge-points dno-wpd
+
+A scale is a fraction of the size of the source files for the whole of Great Britain. Each case runs in its own
+process, in a temporary directory holding its fixtures, and is measured with common/metrics.py: "rows" are the rows
+or features the stage produced, "peak MB" is the peak resident memory of the process (which starts at "baseline MB",
+the memory of the benchmark itself), "child peak MB" that of the largest worker process it started, and "steps" the
+time of the spans of the stage (e.g. parse and write).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import traceback
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Sequence
+
+import fiona
+import pandas as pd
+import pyarrow.parquet as pq
+
+import fixtures
+
+WORKFLOWS_DIR = Path(__file__).resolve().parents[1] / "workflows"
+sys.path.append(str(WORKFLOWS_DIR))
+from common.metrics import (  # noqa: E402 pylint: disable=wrong-import-position
+    BYTES_PER_MB,
+    METRICS_FILE_TEMPLATE,
+    TOTAL_SPAN,
+    peak_rss,
+    reset_peak_rss,
+    span,
+    stage_metrics,
+)
+
+DEFAULT_SCALES = [0.001, 0.01]
+RUN_SPAN = "run"
+BENCHMARK_METRICS_FILE = "benchmark-metrics.json"
+
+
+@dataclass(frozen=True)
+class Case:
+    """
+    :param name: the name of the case
+    :param script: the stage script, relative to the workflows directory
+    :param prepare: writes the fixtures of the case at a scale to the working directory
+    :param run: runs the core function of the stage (loaded from the script), returning the number of rows it produced
+    """
+
+    name: str
+    script: str
+    prepare: Callable[[float], None]
+    run: Callable[[ModuleType], int]
+
+
+def load_stage(script: str) -> ModuleType:
+    """
+    :param script: a stage script, relative to the workflows directory (the scripts have hyphenated names, so cannot
+        be imported by name)
+    :return: the script, loaded as a module
+    """
+    path = WORKFLOWS_DIR / script
+    # for the modules next to the script (e.g. openmap.py)
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    # registered, so the functions of the module can be sent to worker processes
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _n_rows(parquet_path: str) -> int:
+    return pq.read_metadata(parquet_path).num_rows
+
+
+def _prepare_land_use(scale: float) -> None:
+    fixtures.write_openmap_zip("os-openmap-local.zip", scale)
+
+
+def _run_land_use(openmap: ModuleType) -> int:
+    specs = list(openmap.LAYERS.values())
+    openmap.extract_layers_to_files(specs, workers=2)
+    n_rows = 0
+    for spec in specs:
+        with fiona.open(spec.output) as collection:
+            n_rows += len(collection)
+    return n_rows
+
+
+def _prepare_dno_wpd(scale: float) -> None:
+    fixtures.write_wpd_substations_csv("distribution_substation_details.csv", scale)
+
+
+def _run_dno_wpd(stage: ModuleType) -> int:
+    # the fixture stands in for the download
+    stage.download_data = lambda file_name: None
+    stage.generate_all_substation_data()
+    return _n_rows("wpd-substation-data.parquet")
+
+
+def _prepare_dno_ukpn(scale: float) -> None:
+    fixtures.write_ukpn_csvs("grid-and-primary-sites.csv", "network-headroom.csv", scale)
+
+
+def _run_dno_ukpn(stage: ModuleType) -> int:
+    sys.argv = [stage.__file__, "grid-and-primary-sites.csv", "network-headroom.csv"]
+    stage.main()
+    return _n_rows("ukpn-primary-substations.parquet")
+
+
+def _prepare_ncr(scale: float) -> None:
+    fixtures.write_ncr_csv("ncr-data.csv", scale)
+
+
+def _run_charge_points(engine: str) -> Callable[[ModuleType], int]:
+    def run(stage: ModuleType) -> int:
+        return len(stage.read_ncr_data(engine))
+
+    return run
+
+
+def _prepare_postcode_districts(scale: float) -> None:
+    fixtures.write_postcode_kml("PostcodeDistricts.kml", scale)
+
+
+def _run_postcode_districts(stage: ModuleType) -> int:
+    gdf = stage.read_kml_file("PostcodeDistricts.kml", excluded_areas=[stage.NORTHERN_IRELAND_POSTCODE_AREA])
+    return len(gdf)
+
+
+def _prepare_lsoa_boundaries(scale: float) -> None:
+    fixtures.write_lsoa_geojson("lsoa-boundaries.geojson", scale)
+
+
+def _run_lsoa_boundaries(stage: ModuleType) -> int:
+    sys.argv = [stage.__file__]
+    stage.main()
+    return _n_rows("lsoa-boundaries.parquet")
+
+
+def _prepare_ev_registrations(scale: float) -> None:
+    districts_gdf = fixtures.postcode_districts(scale)
+    districts_gdf.to_parquet("uk-postcode-districts.parquet")
+    fixtures.write_ev_registrations_ods("veh0134.ods", districts_gdf["Name"].tolist())
+
+
+def _run_ev_registrations(stage: ModuleType) -> int:
+    stage.POSTCODE_DISTRICTS_FILE = "uk-postcode-districts.parquet"
+    stage.create_ev_registration_data()
+    return _n_rows("ev-registrations.parquet")
+
+
+CASES: Dict[str, Case] = {
+    case.name: case
+    for case in [
+        Case("land-use", "land-use/openmap.py", _prepare_land_use, _run_land_use),
+        Case("dno-wpd", "dnos/dno-wpd/dno-wpd-substations.py", _prepare_dno_wpd, _run_dno_wpd),
+        Case("dno-ukpn", "dnos/dno-ukpn/dno-ukpn-substations.py", _prepare_dno_ukpn, _run_dno_ukpn),
+        Case("charge-points", "charge-points/charge-points.py", _prepare_ncr, _run_charge_points("pandas")),
+        Case("charge-points-pyarrow", "charge-points/charge-points.py", _prepare_ncr, _run_charge_points("pyarrow")),
+        Case(
+            "postcode-districts",
+            "boundaries-postcode-district/postcode-district-boundaries.py",
+            _prepare_postcode_districts,
+            _run_postcode_districts,
+        ),
+        Case("lsoa-boundaries", "boundaries-lsoa/lsoa-boundaries.py", _prepare_lsoa_boundaries, _run_lsoa_boundaries),
+        Case(
+            "ev-registrations",
+            "ev-registrations/ev-registrations.py",
+            _prepare_ev_registrations,
+            _run_ev_registrations,
+        ),
+    ]
+}
+
+
+def _run_case(case: Case, scale: float, connection) -> None:
+    # runs in the case's own process
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            case.prepare(scale)
+            stage = load_stage(case.script)
+            reset_peak_rss()
+            baseline = peak_rss()
+            with stage_metrics(case.name, path=os.path.join(temp_dir, BENCHMARK_METRICS_FILE)) as metrics:
+                with span(RUN_SPAN) as run_span:
+                    run_span.rows_out += case.run(stage)
+            report = metrics.report()
+            # a stage that records its own metrics (in its main function) writes its steps to its own file
+            for path in Path(temp_dir).glob(METRICS_FILE_TEMPLATE.format(stage="*")):
+                if path.name != BENCHMARK_METRICS_FILE:
+                    report.update(json.loads(path.read_text()))
+            connection.send((report, baseline, None))
+    except Exception:  # pylint: disable=broad-except
+        connection.send((None, 0, traceback.format_exc()))
+
+
+def run_case(case: Case, scale: float) -> Dict[str, object]:
+    """
+    :param case: the case to run
+    :param scale: the scale of its fixtures
+    :return: the measurements of the case
+    """
+    context = get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    # not a Pool, whose daemon processes could not start the stages' own worker processes
+    process = context.Process(target=_run_case, args=(case, scale, sender))
+    process.start()
+    # only the child holds the sending end, so recv raises EOFError if it dies without sending (e.g. when it is
+    # killed by the OOM killer at a large scale)
+    sender.close()
+    try:
+        report, baseline, error = receiver.recv()
+    except EOFError:
+        process.join()
+        cause = f"killed by signal {-process.exitcode}" if process.exitcode < 0 else f"exit code {process.exitcode}"
+        raise RuntimeError(f"{case.name} at scale {scale} failed: its process ended ({cause}) without a report")
+    process.join()
+    if error is not None:
+        raise RuntimeError(f"{case.name} at scale {scale} failed:\n{error}")
+    run = report[RUN_SPAN]
+    steps = {name: totals for name, totals in report.items() if name not in (RUN_SPAN, TOTAL_SPAN)}
+    return {
+        "case": case.name,
+        "scale": scale,
+        "rows": run["rows_out"],
+        "seconds": run["seconds"],
+        "rows/s": run.get("rows_per_second", 0.0),
+        "peak MB": run["peak_rss_mb"],
+        "baseline MB": baseline / BYTES_PER_MB,
+        "child peak MB": run.get("peak_child_rss_mb", 0.0),
+        "MB read": run.get("bytes_read", 0) / BYTES_PER_MB,
+        "MB written": run.get("bytes_written", 0) / BYTES_PER_MB,
+        "steps": ", ".join(f"{name} {totals['seconds']:.2f}s" for name, totals in steps.items()),
+    }
+
+
+def run(case_names: Sequence[str], scales: Sequence[float], output: Optional[str] = None) -> pd.DataFrame:
+    """
+    :param case_names: the cases to run
+    :param scales: the scales to run them at
+    :param output: a CSV file to write the results to
+    :return: the measurements of each case at each scale
+    """
+    rows: List[Dict[str, object]] = []
+    for name in case_names:
+        for scale in scales:
+            print(f"{name} at scale {scale}", file=sys.stderr)
+            rows.append(run_case(CASES[name], scale))
+    results = pd.DataFrame(rows)
+    if output:
+        results.to_csv(output, index=False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="the cases to run")
+    parser.add_argument(
+        "--scales", nargs="+", type=float, default=DEFAULT_SCALES, help="the fractions of the GB-wide data to run at"
+    )
+    parser.add_argument("--output", help="a CSV file to write the results to")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.scales, args.output)
+    with pd.option_context("display.width", 250, "display.max_columns", None, "display.precision", 3):
+        print(results)
+
+
+if __name__ == "__main__":
+    main()
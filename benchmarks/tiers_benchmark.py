@@ -0,0 +1,136 @@
+"""
+Compares the file size, load time and number of vertices of the simplified tiers of a boundary output
+(see workflows/common/tiers.py) with those of the output itself.
+
+e.g. python benchmarks/tiers_benchmark.py workflows/boundaries-postcode-district/uk-postcode-districts.parquet
+
+Without an input, the tiers of synthetic boundaries (a grid of polygons with noisy, densely sampled edges) are
+compared.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "workflows"))
+from common.geometry import from_pygeos, to_pygeos  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import (  # noqa: E402 pylint: disable=wrong-import-position
+    FORMAT_EXTENSIONS,
+    GEOJSON,
+    PARQUET,
+    read_geodataframe,
+    write_outputs,
+)
+from common.tiers import (  # noqa: E402 pylint: disable=wrong-import-position
+    DEFAULT_WORKERS,
+    TIERS,
+    tier_stem,
+    write_tiers,
+)
+
+SYNTHETIC_GRID_SIZE = 30
+SYNTHETIC_VERTICES_PER_EDGE = 200
+REPEATS = 3
+
+
+def synthetic_boundaries(
+    grid_size: int = SYNTHETIC_GRID_SIZE, vertices_per_edge: int = SYNTHETIC_VERTICES_PER_EDGE, seed: int = 0
+) -> gpd.GeoDataFrame:
+    """
+    :param grid_size: the number of areas along each side of the grid
+    :param vertices_per_edge: the number of vertices along each edge of an area
+    :param seed: the seed of the noise
+    :return: a grid of areas (about 0.05 degrees across) over Great Britain with noisy edges
+    """
+    rng = np.random.default_rng(seed)
+    size = 0.05
+    t = np.linspace(0, 1, vertices_per_edge, endpoint=False)
+    # the corners of a unit square, then the points along its edges
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+    edges = np.concatenate([a + (b - a) * t[:, np.newaxis] for a, b in zip(corners[:-1], corners[1:])])
+    polygons = []
+    for column in range(grid_size):
+        for row in range(grid_size):
+            ring = (edges + rng.normal(0, 0.002, edges.shape)) * size + [-3 + column * size, 52 + row * size]
+            polygons.append(pygeos.polygons(np.concatenate([ring, ring[:1]])))
+    geometries = pygeos.make_valid(np.array(polygons))
+    return gpd.GeoDataFrame(
+        {"code": [f"A{i}" for i in range(len(geometries))]},
+        geometry=from_pygeos(geometries, pd.RangeIndex(len(geometries)), "EPSG:4326"),
+    )
+
+
+def _time(load: Callable[[], gpd.GeoDataFrame]) -> Tuple[float, gpd.GeoDataFrame]:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        gdf = load()
+        best = min(best, time.perf_counter() - start)
+    return best, gdf
+
+
+def measure(stem: str, name: str) -> List[Dict]:
+    """
+    :param stem: the file name, without extension, of an output written in every format
+    :param name: the name of the output in the results
+    :return: the size, load time and number of vertices of the output in each format
+    """
+    rows = []
+    for output_format, extension in FORMAT_EXTENSIONS.items():
+        path = stem + extension
+        seconds, gdf = _time(lambda: read_geodataframe(path))
+        rows.append(
+            {
+                "tier": name,
+                "format": output_format,
+                "MB": Path(path).stat().st_size / 2 ** 20,
+                "load seconds": seconds,
+                "vertices": int(pygeos.get_num_coordinates(to_pygeos(gdf.geometry)).sum()),
+            }
+        )
+    return rows
+
+
+def run(input_path: Optional[str], workers: int) -> pd.DataFrame:
+    """
+    :param input_path: a boundary output, or None for synthetic boundaries
+    :param workers: the number of processes computing the tiers
+    :return: the measurements of the output and each of its tiers
+    """
+    gdf = read_geodataframe(input_path) if input_path else synthetic_boundaries()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stem = str(Path(temp_dir) / "boundaries")
+        write_outputs(gdf, stem, formats=[GEOJSON, PARQUET])
+        start = time.perf_counter()
+        write_tiers(gdf, stem, list(TIERS.values()), workers)
+        print(f"Wrote {len(TIERS)} tiers of {len(gdf)} features in {time.perf_counter() - start:.1f}s")
+        rows = measure(stem, "original")
+        for tier_name in TIERS:
+            rows.extend(measure(tier_stem(stem, tier_name), tier_name))
+
+    results = pd.DataFrame(rows)
+    original = results[results["tier"] == "original"].set_index("format")
+    for column in ["MB", "load seconds", "vertices"]:
+        results[f"{column} vs original"] = results[column] / results["format"].map(original[column])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="a GeoJSON or GeoParquet boundary output")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of processes computing tiers")
+    args = parser.parse_args()
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 3):
+        print(run(args.input, args.workers))
+
+
+if __name__ == "__main__":
+    main()
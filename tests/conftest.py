@@ -0,0 +1,7 @@
+"""
+The tests import the shared workflow modules as the workflow scripts do, as the "common" package
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "workflows"))
@@ -0,0 +1,147 @@
+"""
+Tests of the restartable downloads, against a local stand-in server
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import pytest
+import requests
+
+from common.fetch import (
+    DOWNLOADED,
+    NOT_MODIFIED,
+    PARTIAL_SUFFIX,
+    RESUMED,
+    Fetcher,
+    FetchRecord,
+    _save_record,
+    load_record,
+)
+
+CONTENT = bytes(range(256)) * 64
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Serves one file, with an ETag, and records the headers of each request"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.content = CONTENT
+        self.etag = '"v1"'
+        self.requests: List[Dict[str, str]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/data.bin"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.requests.append(dict(self.headers))
+        content = self.server.content
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self._respond(304, b"")
+            return
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", self.server.etag) == self.server.etag:
+            start = int(range_header[len("bytes=") :].rstrip("-"))
+            if start >= len(content):
+                self._respond(416, b"", {"Content-Range": f"bytes */{len(content)}"})
+            else:
+                content_range = f"bytes {start}-{len(content) - 1}/{len(content)}"
+                self._respond(206, content[start:], {"Content-Range": content_range})
+            return
+        self._respond(200, content)
+
+    def _respond(self, status: int, body: bytes, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name="fetcher")
+def fixture_fetcher():
+    # a session without retries, so failures show up at once
+    return Fetcher(session=requests.Session(), chunk_size=1024)
+
+
+def _write_partial(path: str, url: str, content: bytes, etag: str) -> None:
+    with open(path + PARTIAL_SUFFIX, "wb") as file:
+        file.write(content)
+    _save_record(path + PARTIAL_SUFFIX, FetchRecord(url, 0, "", etag, None, "2021-01-01T00:00:00+00:00"))
+
+
+def test_download(server, fetcher, tmp_path):
+    path = str(tmp_path / "data.bin")
+    assert fetcher.fetch(server.url, path) == DOWNLOADED
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
+    record = load_record(path)
+    assert record.size == len(CONTENT)
+    assert record.etag == server.etag
+
+
+def test_not_modified(server, fetcher, tmp_path):
+    path = str(tmp_path / "data.bin")
+    fetcher.fetch(server.url, path)
+    assert fetcher.fetch(server.url, path) == NOT_MODIFIED
+    assert server.requests[-1]["If-None-Match"] == server.etag
+
+
+def test_resume(server, fetcher, tmp_path):
+    path = str(tmp_path / "data.bin")
+    _write_partial(path, server.url, CONTENT[:1000], server.etag)
+    assert fetcher.fetch(server.url, path) == RESUMED
+    assert server.requests[-1]["Range"] == "bytes=1000-"
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
+    assert not (tmp_path / ("data.bin" + PARTIAL_SUFFIX)).exists()
+
+
+def test_changed_since_partial_download(server, fetcher, tmp_path):
+    path = str(tmp_path / "data.bin")
+    _write_partial(path, server.url, b"x" * 1000, '"v0"')
+    assert fetcher.fetch(server.url, path) == DOWNLOADED
+    assert server.requests[-1]["If-Range"] == '"v0"'
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
+
+
+def test_complete_partial_download(server, fetcher, tmp_path):
+    # the partial file has every byte, so the server can't satisfy the range and the partial file is kept
+    path = str(tmp_path / "data.bin")
+    _write_partial(path, server.url, CONTENT, server.etag)
+    assert fetcher.fetch(server.url, path) == RESUMED
+    assert len(server.requests) == 1
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
+    assert load_record(path).size == len(CONTENT)
+
+
+def test_partial_download_longer_than_file(server, fetcher, tmp_path):
+    path = str(tmp_path / "data.bin")
+    _write_partial(path, server.url, CONTENT + b"x" * 10, server.etag)
+    assert fetcher.fetch(server.url, path) == DOWNLOADED
+    assert "Range" not in server.requests[-1]
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
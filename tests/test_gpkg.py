@@ -0,0 +1,31 @@
+"""
+Tests of the chunked GeoPackage reader (workflows/common/gpkg.py)
+"""
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from common.gpkg import gpkg_extent, iter_gpkg_chunks
+
+
+@pytest.mark.parametrize("spatial_index", ["YES", "NO"])
+def test_features_within_bounds(tmp_path, spatial_index):
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 1000, 200), rng.uniform(0, 1000, 200)
+    gdf = gpd.GeoDataFrame(
+        {"name": [f"feature {i}" for i in range(200)]},
+        geometry=[box(a, b, a + 10, b + 10) for a, b in zip(x, y)],
+        crs="EPSG:27700",
+    )
+    path = str(tmp_path / "features.gpkg")
+    gdf.to_file(path, driver="GPKG", SPATIAL_INDEX=spatial_index)
+
+    bounds = (200, 300, 500, 700)
+    expected = gdf.cx[bounds[0] : bounds[2], bounds[1] : bounds[3]]
+    chunks = list(iter_gpkg_chunks(path, ["name"], chunk_size=50, bounds=bounds))
+    assert sorted(name for chunk in chunks for name in chunk["name"]) == sorted(expected["name"])
+    assert all(chunk.crs == "EPSG:27700" for chunk in chunks)
+
+    extent, crs = gpkg_extent(path)
+    assert np.allclose(extent, gdf.total_bounds) and crs == "EPSG:27700"
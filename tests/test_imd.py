@@ -0,0 +1,49 @@
+"""
+Tests of the Great Britain IMD stage (workflows/demographics/imd.py)
+"""
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from common.outputs import PARQUET, write_outputs
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "workflows" / "demographics"))
+import imd  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_rank_deciles_match_qcut():
+    rng = np.random.default_rng(0)
+    ranks = pd.DataFrame({"a": rng.permutation(1909) + 1.0, "b": rng.permutation(1909) + 1.0})
+    ranks.loc[[3, 500], "b"] = np.nan
+    deciles = imd.rank_deciles(ranks)
+    for column in ranks.columns:
+        expected = pd.qcut(ranks[column], 10, labels=False) + 1
+        pd.testing.assert_series_equal(deciles[column], expected.astype(float), check_names=False)
+    assert deciles.loc[[3, 500], "b"].isna().all()
+
+
+def test_missing_deciles_are_float():
+    codes = pd.Series(["W01", "W02"])
+    complete = pd.DataFrame({column: [1.0, 2.0] for column in imd.DECILE_COLUMNS})
+    assert (imd._index_frame(codes, complete, "Wales")[imd.DECILE_COLUMNS].dtypes == "int8").all()
+    missing = complete.assign(HealthDecile=[1.0, np.nan])
+    missing_df = imd._index_frame(codes, missing, "Wales")
+    assert (missing_df[imd.DECILE_COLUMNS].dtypes == "float32").all()
+    assert np.isnan(missing_df.loc[1, "HealthDecile"])
+
+
+def test_lsoas_missing_from_the_boundaries_are_kept(tmp_path, monkeypatch):
+    boundaries = gpd.GeoDataFrame(
+        {"LSOA11CD": ["W01", "W03"]}, geometry=[Point(-3, 52), Point(-3.1, 52.1)], crs="EPSG:4326"
+    )
+    write_outputs(boundaries, str(tmp_path / "lsoa-boundaries"), formats=[PARQUET])
+    monkeypatch.setattr(imd, "LSOA_BOUNDARIES_FILE", str(tmp_path / "lsoa-boundaries.parquet"))
+    df = pd.DataFrame({imd.AREA_CODE_COLUMN: ["W01", "W02", "W03"], "OverallDecile": [1, 2, 3]})
+    gdf = imd.add_lsoa_geometry(df)
+    assert gdf[imd.AREA_CODE_COLUMN].tolist() == ["W01", "W02", "W03"]
+    assert gdf.geometry.isna().tolist() == [False, True, False]
+    assert gdf.geometry[2].equals(Point(-3.1, 52.1))
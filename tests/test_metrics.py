@@ -0,0 +1,38 @@
+"""
+Tests of the stage metrics (workflows/common/metrics.py)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common import metrics
+from common.metrics import span, stage_metrics
+
+
+def test_closing_a_span_leaves_an_equal_span_of_another_thread_open(monkeypatch):
+    # a fixed clock and memory, so spans of the same name compare equal
+    monkeypatch.setattr(metrics.time, "perf_counter", lambda: 0.0)
+    monkeypatch.setattr(metrics, "peak_rss", lambda: 0)
+
+    def closed_in_thread():
+        with span("parse"):
+            pass
+
+    with span("parse") as outer:
+        thread = threading.Thread(target=closed_in_thread)
+        thread.start()
+        thread.join()
+        assert any(open_span is outer for open_span in metrics._OPEN_SPANS)
+    assert all(open_span is not outer for open_span in metrics._OPEN_SPANS)
+
+
+def test_spans_from_worker_threads(tmp_path):
+    def work(i):
+        with span("work") as work_span:
+            work_span.rows_out += i
+
+    with stage_metrics("threads", str(tmp_path / "threads-metrics.json")) as stage:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(work, range(1000)))
+    assert stage.spans["work"]["calls"] == 1000
+    assert stage.spans["work"]["rows_out"] == sum(range(1000))
+    assert metrics._OPEN_SPANS == []
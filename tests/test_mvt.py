@@ -0,0 +1,215 @@
+"""
+Tests of the Mapbox Vector Tile encoder (workflows/common/mvt.py), against the examples of the specification and a
+minimal protobuf decoder
+"""
+import struct
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pygeos
+import pytest
+
+from common.mvt import MvtLayer, encode_geometry, encode_tile, varints, zigzag
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        value |= (byte & 0x7F) << shift
+        position += 1
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _fields(data: bytes) -> List[Tuple[int, object]]:
+    # the (field number, value) of each field of a message: an int for varints, bytes otherwise
+    fields, position = [], 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 1:
+            value, position = data[position : position + 8], position + 8
+        elif wire_type == 2:
+            length, position = _read_varint(data, position)
+            value, position = data[position : position + length], position + length
+        else:
+            raise ValueError(f"Unexpected wire type {wire_type}")
+        fields.append((field, value))
+    return fields
+
+
+def _packed(data: bytes) -> List[int]:
+    values, position = [], 0
+    while position < len(data):
+        value, position = _read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_value(data: bytes) -> object:
+    ((field, value),) = _fields(data)
+    if field == 1:
+        return value.decode("utf-8")
+    if field == 3:
+        return struct.unpack("<d", value)[0]
+    if field == 5:
+        return value
+    if field == 6:
+        return _unzigzag(value)
+    if field == 7:
+        return bool(value)
+    raise ValueError(f"Unexpected value field {field}")
+
+
+def _decode_rings(commands: List[int]) -> List[List[Tuple[int, int]]]:
+    # the paths of a geometry, in tile coordinates, with the cursor carried between them
+    paths, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 0x7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            continue
+        for _ in range(count):
+            x, y = x + _unzigzag(commands[i]), y + _unzigzag(commands[i + 1])
+            i += 2
+            # each MoveTo starts a path (or, in a MultiPoint, is a point of its own)
+            if command == 1:
+                paths.append([(x, y)])
+            else:
+                paths[-1].append((x, y))
+    return paths
+
+
+def _decode_tile(data: bytes) -> Dict[str, Dict[str, object]]:
+    layers = {}
+    for field, layer_data in _fields(data):
+        assert field == 3
+        layer_fields = _fields(layer_data)
+        name = next(value for field, value in layer_fields if field == 1).decode("utf-8")
+        keys = [value.decode("utf-8") for field, value in layer_fields if field == 3]
+        values = [_decode_value(value) for field, value in layer_fields if field == 4]
+        features = []
+        for feature_data in (value for field, value in layer_fields if field == 2):
+            feature_fields = dict(_fields(feature_data))
+            tags = _packed(feature_fields.get(2, b""))
+            features.append(
+                {
+                    "type": feature_fields[3],
+                    "paths": _decode_rings(_packed(feature_fields[4])),
+                    "properties": {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)},
+                }
+            )
+        layer_fields = dict(layer_fields)
+        layers[name] = {"version": layer_fields[15], "extent": layer_fields[5], "features": features}
+    return layers
+
+
+def _commands(geometry: pygeos.Geometry) -> List[int]:
+    _, encoded = encode_geometry(geometry)
+    return _packed(encoded)
+
+
+def _signed_area(ring: List[Tuple[int, int]]) -> float:
+    # positive for clockwise rings on screen (y down), as in the specification
+    x, y = np.array(ring, dtype=float).T
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)) / 2
+
+
+def test_varints():
+    assert varints(np.array([0, 1, 127, 128, 300, 2 ** 32])) == bytes(
+        [0x00, 0x01, 0x7F, 0x80, 0x01, 0xAC, 0x02, 0x80, 0x80, 0x80, 0x80, 0x10]
+    )
+    assert varints(np.array([], dtype=np.int64)) == b""
+
+
+def test_zigzag():
+    assert zigzag([0, -1, 1, -2, 2, -(2 ** 31), 2 ** 31 - 1]).tolist() == [0, 1, 2, 3, 4, 2 ** 32 - 1, 2 ** 32 - 2]
+
+
+@pytest.mark.parametrize(
+    "wkt, commands",
+    [
+        # the examples of section 4.3.5 of the specification
+        ("POINT (25 17)", [9, 50, 34]),
+        ("MULTIPOINT (5 7, 3 2)", [17, 10, 14, 3, 9]),
+        ("LINESTRING (2 2, 2 10, 10 10)", [9, 4, 4, 18, 0, 16, 16, 0]),
+        ("MULTILINESTRING ((2 2, 2 10, 10 10), (1 1, 3 5))", [9, 4, 4, 18, 0, 16, 16, 0, 9, 17, 17, 10, 4, 8]),
+        ("POLYGON ((3 6, 8 12, 20 34, 3 6))", [9, 6, 12, 18, 10, 12, 24, 44, 15]),
+        (
+            "MULTIPOLYGON (((0 0, 10 0, 10 10, 0 10, 0 0)), "
+            "((11 11, 20 11, 20 20, 11 20, 11 11), (13 13, 13 17, 17 17, 17 13, 13 13)))",
+            [9, 0, 0, 26, 20, 0, 0, 20, 19, 0, 15, 9, 22, 2, 26, 18, 0, 0, 18, 17, 0, 15]
+            + [9, 4, 13, 26, 0, 8, 8, 0, 0, 7, 15],
+        ),
+    ],
+)
+def test_geometries_match_the_specification(wkt, commands):
+    assert _commands(pygeos.from_wkt(wkt)) == commands
+
+
+def test_multipoint_cursor_is_carried_between_points():
+    assert _decode_rings(_commands(pygeos.from_wkt("MULTIPOINT (5 7, 3 2, 10 1)"))) == [[(5, 7)], [(3, 2)], [(10, 1)]]
+
+
+def test_rings_are_reoriented():
+    # an anticlockwise exterior and a clockwise hole, on screen: both the wrong way round
+    polygon = pygeos.from_wkt("POLYGON ((0 0, 0 10, 10 10, 10 0, 0 0), (2 2, 8 2, 8 8, 2 8, 2 2))")
+    exterior, hole = _decode_rings(_commands(polygon))
+    assert _signed_area(exterior) == 100
+    assert _signed_area(hole) == -36
+    assert set(exterior) == {(0, 0), (0, 10), (10, 10), (10, 0)}
+    assert set(hole) == {(2, 2), (8, 2), (8, 8), (2, 8)}
+
+
+def test_collapsed_geometries_are_dropped():
+    assert encode_geometry(pygeos.from_wkt("POLYGON ((0 0, 0.2 0, 0.2 0.2, 0 0))")) is None
+    assert encode_geometry(pygeos.from_wkt("LINESTRING (1 1, 1.2 1.1)")) is None
+    assert encode_geometry(pygeos.from_wkt("POINT EMPTY")) is None
+
+
+def test_tile_matches_hand_built_bytes():
+    layer = MvtLayer("points", np.array([pygeos.points(25, 17)]), pd.DataFrame(index=[0]))
+    feature = b"\x18\x01" + b"\x22\x03\x09\x32\x22"
+    encoded_layer = b"\x78\x02" + b"\x0a\x06points" + b"\x12\x07" + feature + b"\x28\x80\x20"
+    assert encode_tile([layer]) == b"\x1a" + bytes([len(encoded_layer)]) + encoded_layer
+
+
+def test_tile_round_trip():
+    geometries = pygeos.from_wkt(
+        [
+            "POLYGON ((0 0, 100 0, 100 100, 0 100, 0 0), (20 20, 80 20, 80 80, 20 80, 20 20))",
+            "LINESTRING (0 0, 50 50, 50 100)",
+            "POINT (4095 0)",
+        ]
+    )
+    properties = pd.DataFrame(
+        {
+            "name": ["a", "b", None],
+            "count": pd.array([-5, 2 ** 40, None], dtype="Int64"),
+            "share": [0.25, np.nan, -1.5],
+            "open": [True, False, True],
+        }
+    )
+    decoded = _decode_tile(encode_tile([MvtLayer("features", geometries, properties)]))
+    layer = decoded["features"]
+    assert layer["version"] == 2 and layer["extent"] == 4096
+    assert [feature["type"] for feature in layer["features"]] == [3, 2, 1]
+    assert [feature["properties"] for feature in layer["features"]] == [
+        {"name": "a", "count": -5, "share": 0.25, "open": True},
+        {"name": "b", "count": 2 ** 40, "open": False},
+        {"share": -1.5, "open": True},
+    ]
+    polygon, line, point = (feature["paths"] for feature in layer["features"])
+    assert [_signed_area(ring) for ring in polygon] == [10000, -3600]
+    assert line == [[(0, 0), (50, 50), (50, 100)]]
+    assert point == [[(4095, 0)]]
+    assert encode_tile([MvtLayer("empty", np.empty(0, dtype=object), pd.DataFrame())]) is None
@@ -0,0 +1,25 @@
+"""
+Tests of the OS OpenMap Local extraction (workflows/land-use/openmap.py)
+"""
+import sys
+import warnings
+from pathlib import Path
+
+import geopandas as gpd
+from shapely.geometry import Point
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "workflows" / "land-use"))
+import openmap  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_trim_columns_hashes_ids_without_writing_to_a_slice():
+    gdf = gpd.GeoDataFrame(
+        {openmap.ID_COLUMN: ["a", "b"], "kept": [1, 2], "dropped": [3, 4]}, geometry=[Point(0, 0), Point(1, 1)]
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        trimmed = openmap._trim_columns(gdf, ["kept", "missing", "geometry"])
+    assert list(trimmed.columns) == ["kept", "missing", "geometry", openmap.ID_COLUMN]
+    assert trimmed["missing"].isna().all()
+    assert list(trimmed[openmap.ID_COLUMN]) == list(openmap.hash_ids(gdf[openmap.ID_COLUMN]))
+    assert isinstance(trimmed, gpd.GeoDataFrame)
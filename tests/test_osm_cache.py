@@ -0,0 +1,117 @@
+"""
+Tests of the OSM query cache, offline, in a temporary directory
+"""
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from common import osm_cache
+from common.osm_cache import SECONDS_PER_DAY, OfflineCacheMiss, OsmCache
+
+DATA_VERSION = "2021-11-19T21:24:02Z"
+PREVIOUS_DATA_VERSION = "2021-11-18T21:22:01Z"
+OXFORD = {"query": "Oxford"}
+
+
+def _features(n: int) -> gpd.GeoDataFrame:
+    gdf = gpd.GeoDataFrame(
+        {"element_type": ["node"] * n, "osmid": range(n), "name": [f"stop {i}" for i in range(n)]},
+        geometry=[Point(-1.25 + i / 100, 51.75) for i in range(n)],
+        crs="EPSG:4326",
+    )
+    return gdf.set_index(["element_type", "osmid"])
+
+
+@pytest.fixture(autouse=True)
+def fixture_no_overpass(monkeypatch):
+    # the tests that need a data version pin one or count the requests for it
+    def overpass_data_version():
+        raise AssertionError("asked Overpass for the data version")
+
+    monkeypatch.setattr(osm_cache, "overpass_data_version", overpass_data_version)
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+    now = [1_600_000_000.0]
+    monkeypatch.setattr(osm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_put_and_get(tmp_path):
+    cache = OsmCache(str(tmp_path), data_version=DATA_VERSION)
+    gdf = _features(3)
+    cache.put("geometries_from_place", OXFORD, gdf)
+    cached_gdf = cache.get("geometries_from_place", OXFORD)
+    assert cached_gdf.index.names == ["element_type", "osmid"]
+    assert cached_gdf.equals(gdf)
+    assert cache.get("geometries_from_place", {"query": "Reading"}) is None
+    # the index is saved, so another process finds the result
+    cache.close()
+    assert OsmCache(str(tmp_path), data_version=DATA_VERSION).get("geometries_from_place", OXFORD) is not None
+
+
+def test_get_makes_no_network_requests(tmp_path):
+    OsmCache(str(tmp_path), data_version=DATA_VERSION).put("geocode_to_gdf", OXFORD, _features(1))
+    # not pinned, so the result of any version is used
+    cache = OsmCache(str(tmp_path))
+    assert cache.get_or_fetch("geocode_to_gdf", OXFORD, lambda: pytest.fail("fetched")) is not None
+    assert cache.metrics.hits == 1
+
+
+def test_data_version_is_only_asked_for_when_storing(tmp_path, monkeypatch):
+    version_requests = []
+    monkeypatch.setattr(osm_cache, "overpass_data_version", lambda: version_requests.append(1) or DATA_VERSION)
+    cache = OsmCache(str(tmp_path))
+    cache.get_or_fetch("geocode_to_gdf", OXFORD, lambda: _features(1))
+    cache.get_or_fetch("geocode_to_gdf", {"query": "Reading"}, lambda: _features(1))
+    cache.get_or_fetch("geocode_to_gdf", OXFORD, lambda: pytest.fail("fetched"))
+    assert len(version_requests) == 1
+    assert cache.metrics.misses == 2
+
+
+def test_pinned_version(tmp_path):
+    OsmCache(str(tmp_path), data_version=PREVIOUS_DATA_VERSION).put("geocode_to_gdf", OXFORD, _features(1))
+    cache = OsmCache(str(tmp_path), data_version=DATA_VERSION)
+    assert cache.get("geocode_to_gdf", OXFORD) is None
+    cache.put("geocode_to_gdf", OXFORD, _features(2))
+    assert len(cache.get("geocode_to_gdf", OXFORD)) == 2
+    # a pinned cache keeps the results of other versions
+    assert len(OsmCache(str(tmp_path), data_version=PREVIOUS_DATA_VERSION).get("geocode_to_gdf", OXFORD)) == 1
+
+
+def test_ttl_expiry(tmp_path, clock):
+    cache = OsmCache(str(tmp_path), ttl_days=1, data_version=DATA_VERSION)
+    cache.put("geocode_to_gdf", OXFORD, _features(1))
+    clock[0] += SECONDS_PER_DAY / 2
+    assert cache.get("geocode_to_gdf", OXFORD) is not None
+    clock[0] += SECONDS_PER_DAY
+    assert cache.get("geocode_to_gdf", OXFORD) is None
+    assert not list(tmp_path.glob("*.parquet"))
+
+
+def test_lru_eviction(tmp_path, clock):
+    cache = OsmCache(str(tmp_path), data_version=DATA_VERSION)
+    for place in ["Oxford", "Reading"]:
+        cache.put("geocode_to_gdf", {"query": place}, _features(10))
+        clock[0] += 1
+    entry_size = max(entry.size for entry in cache._entries.values())  # pylint: disable=protected-access
+    cache.max_bytes = 2 * entry_size
+    # Oxford is used more recently than Reading, so Reading is evicted to make space for Swindon
+    cache.get("geocode_to_gdf", OXFORD)
+    clock[0] += 1
+    cache.put("geocode_to_gdf", {"query": "Swindon"}, _features(10))
+    assert cache.get("geocode_to_gdf", {"query": "Reading"}) is None
+    assert cache.get("geocode_to_gdf", OXFORD) is not None
+    assert cache.get("geocode_to_gdf", {"query": "Swindon"}) is not None
+    assert cache.metrics.evictions == 1
+
+
+def test_offline(tmp_path, clock):
+    OsmCache(str(tmp_path), ttl_days=1, data_version=DATA_VERSION).put("geocode_to_gdf", OXFORD, _features(1))
+    clock[0] += 10 * SECONDS_PER_DAY
+    cache = OsmCache(str(tmp_path), ttl_days=1, offline=True)
+    # used whatever its age
+    assert cache.get("geocode_to_gdf", OXFORD) is not None
+    with pytest.raises(OfflineCacheMiss):
+        cache.get_or_fetch("geocode_to_gdf", {"query": "Reading"}, lambda: pytest.fail("fetched"))
@@ -0,0 +1,99 @@
+"""
+Tests of the extraction of features from OpenStreetMap files, on a fixture of a few elements
+"""
+from pathlib import Path
+
+import osmium
+import pytest
+from shapely.geometry import LineString, MultiPolygon, Point, Polygon
+
+from common.osm_pbf import ELEMENT_TYPE_COLUMN, OSM_ID_COLUMN, features_from_pbf
+
+FIXTURE = str(Path(__file__).parent / "fixtures" / "tiny.osm")
+
+QUERIES = {
+    "car-parks": {"amenity": "parking"},
+    "bus-stops-and-stations": {"amenity": "bus_station", "highway": "bus_stop"},
+    "main-roads": {"highway": ["primary", "secondary"]},
+    "admin-level-6": {"admin_level": "6"},
+}
+
+
+class _Copy(osmium.SimpleHandler):
+    def __init__(self, writer: osmium.SimpleWriter):
+        super().__init__()
+        self.writer = writer
+
+    def node(self, node):
+        self.writer.add_node(node)
+
+    def way(self, way):
+        self.writer.add_way(way)
+
+    def relation(self, relation):
+        self.writer.add_relation(relation)
+
+
+@pytest.fixture(name="osm_path", params=["osm", "pbf"])
+def fixture_osm_path(request, tmp_path):
+    if request.param == "osm":
+        return FIXTURE
+    path = str(tmp_path / "tiny.osm.pbf")
+    writer = osmium.SimpleWriter(path)
+    _Copy(writer).apply_file(FIXTURE)
+    writer.close()
+    return path
+
+
+@pytest.fixture(name="features")
+def fixture_features(osm_path):
+    return features_from_pbf(osm_path, QUERIES, threads=1)
+
+
+def _keys(gdf):
+    return list(zip(gdf[ELEMENT_TYPE_COLUMN], gdf[OSM_ID_COLUMN]))
+
+
+def test_tag_filters(features):
+    assert _keys(features["car-parks"]) == [("node", 1), ("way", 100)]
+    # an element matches if any of the tags match
+    assert _keys(features["bus-stops-and-stations"]) == [("node", 2)]
+    # only the listed values match
+    assert _keys(features["main-roads"]) == [("way", 101)]
+    assert _keys(features["admin-level-6"]) == [("relation", 200)]
+
+
+def test_tags_become_columns(features):
+    car_parks = features["car-parks"].set_index(OSM_ID_COLUMN)
+    assert car_parks.loc[1, "fee"] == "yes"
+    assert car_parks.loc[100, "capacity"] == "40"
+    assert features["bus-stops-and-stations"].loc[0, "name"] == "High Street"
+
+
+def test_only_the_requested_tags_are_kept(osm_path):
+    features = features_from_pbf(osm_path, QUERIES, threads=1, columns={"car-parks": ["fee", "surface"]})
+    car_parks = features["car-parks"].set_index(OSM_ID_COLUMN)
+    assert list(car_parks.columns) == [ELEMENT_TYPE_COLUMN, "fee", "surface", "geometry"]
+    assert car_parks.loc[1, "fee"] == "yes"
+    # no car park has a surface tag
+    assert car_parks["surface"].isna().all()
+    # queries without columns keep all the tags
+    assert "name" in features["bus-stops-and-stations"]
+
+
+def test_geometries(features):
+    car_parks = features["car-parks"].set_index(OSM_ID_COLUMN)
+    assert car_parks.crs == "EPSG:4326"
+    assert car_parks.geometry[1].equals(Point(-1.3, 51.5))
+    square = Polygon([(-1.2, 51.6), (-1.19, 51.6), (-1.19, 51.61), (-1.2, 51.61)])
+    assert car_parks.geometry[100].equals(MultiPolygon([square]))
+    assert features["main-roads"].geometry[0].equals(LineString([(-1.1, 51.7), (-1.09, 51.71)]))
+
+
+def test_multipolygon_relation(features):
+    # the outer ring is assembled from two ways, and the inner way is a hole
+    county = features["admin-level-6"].geometry[0]
+    outer = [(-2, 52), (-1, 52), (-1, 53), (-2, 53)]
+    hole = [(-1.6, 52.4), (-1.4, 52.4), (-1.4, 52.6), (-1.6, 52.6)]
+    assert county.equals(MultiPolygon([Polygon(outer, [hole])]))
+    assert county.area == pytest.approx(1 - 0.04)
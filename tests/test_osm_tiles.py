@@ -0,0 +1,156 @@
+"""
+Tests of the tiled, checkpointed download of OSM features, against a local stand-in Overpass server
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Set, Tuple
+from urllib.parse import parse_qs
+
+import osmnx as ox
+import pytest
+from shapely.geometry import box
+
+from common import osm_tiles
+from common.osm_cache import OsmCache
+from common.osm_tiles import RUNS_DIR_NAME, iter_tiled_features
+
+# six 0.1 degree tiles
+AREA = box(-1.3, 51.6, -1.0, 51.8)
+TILE_SIZE = 0.1
+TAGS = {"amenity": "parking"}
+PLACE = "Testshire"
+POLYGON_PATTERN = re.compile(r"poly:'([^']*)'")
+
+
+class StandInOverpass(ThreadingHTTPServer):
+    """
+    Answers each query for a tile with one car park at its centre, and records the tiles asked for. The tiles in
+    failing are answered with a server error
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInOverpassHandler)
+        self.timestamp = "2021-11-19T21:24:02Z"
+        self.tile_requests: List[Tuple[float, float]] = []
+        self.failing: Set[Tuple[float, float]] = set()
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+
+class StandInOverpassHandler(BaseHTTPRequestHandler):
+    server: StandInOverpass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        # the status query of overpass_data_version
+        self._respond(200, {"osm3s": {"timestamp_osm_base": self.server.timestamp}, "elements": []})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        query = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))["data"][0]
+        coordinates = [float(value) for value in POLYGON_PATTERN.search(query).group(1).split()]
+        lats, lons = coordinates[0::2], coordinates[1::2]
+        centre = (round((min(lons) + max(lons)) / 2, 6), round((min(lats) + max(lats)) / 2, 6))
+        self.server.tile_requests.append(centre)
+        if centre in self.server.failing:
+            self._respond(500, None)
+            return
+        node_id = int((centre[0] + 180) * 1000) * 1000_000 + int((centre[1] + 90) * 1000)
+        node = {"type": "node", "id": node_id, "lat": centre[1], "lon": centre[0], "tags": TAGS}
+        self._respond(200, {"osm3s": {"timestamp_osm_base": self.server.timestamp}, "elements": [node]})
+
+    def _respond(self, status: int, body: Dict):
+        content = json.dumps(body).encode("utf-8") if body is not None else b"Internal Server Error"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture(name="overpass")
+def fixture_overpass(monkeypatch):
+    server = StandInOverpass()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(ox.settings, "overpass_endpoint", server.endpoint)
+    monkeypatch.setattr(ox.settings, "overpass_rate_limit", False)
+    monkeypatch.setattr(ox.settings, "use_cache", False)
+    monkeypatch.setattr(ox.settings, "log_console", False)
+    monkeypatch.setattr(osm_tiles, "BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(osm_tiles, "MAX_ATTEMPTS", 2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _fetch(cache_dir: str, **cache_args):
+    with OsmCache(cache_dir, **cache_args) as cache:
+        return list(iter_tiled_features(AREA, TAGS, cache, tile_size=TILE_SIZE, workers=1, source=PLACE))
+
+
+def _cached_results(cache_dir: str) -> int:
+    return len(OsmCache(cache_dir)._entries)  # pylint: disable=protected-access
+
+
+def test_resume_fetches_only_the_missing_tiles(overpass, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    failing_tile = (-1.15, 51.65)
+    overpass.failing.add(failing_tile)
+    with pytest.raises(Exception, match="Server returned"):
+        _fetch(cache_dir)
+    # the failed tile was retried, and the tiles fetched before it were checkpointed
+    assert overpass.tile_requests.count(failing_tile) == 2
+    fetched_tiles = set(overpass.tile_requests) - {failing_tile}
+    assert fetched_tiles
+    assert len(list((tmp_path / "cache" / RUNS_DIR_NAME).glob("*.json"))) == 1
+
+    # resumed the next day, after OSM has been updated
+    overpass.failing.clear()
+    overpass.tile_requests.clear()
+    overpass.timestamp = "2021-11-20T21:24:02Z"
+    tile_gdfs = _fetch(cache_dir)
+    assert failing_tile in overpass.tile_requests
+    assert len(overpass.tile_requests) == 6 - len(fetched_tiles)
+    assert not fetched_tiles & set(overpass.tile_requests)
+    assert sum(len(gdf) for gdf in tile_gdfs) == 6
+    # the run completed, so its record and checkpoints are removed
+    assert not list((tmp_path / "cache" / RUNS_DIR_NAME).glob("*.json"))
+    assert _cached_results(cache_dir) == 0
+
+
+def test_completed_run_is_not_reused(overpass, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    _fetch(cache_dir)
+    overpass.tile_requests.clear()
+    _fetch(cache_dir)
+    assert len(overpass.tile_requests) == 6
+
+
+def test_pinned_run_is_reused(overpass, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    _fetch(cache_dir, data_version=overpass.timestamp)
+    overpass.tile_requests.clear()
+    tile_gdfs = _fetch(cache_dir, data_version=overpass.timestamp, offline=True)
+    assert not overpass.tile_requests
+    assert sum(len(gdf) for gdf in tile_gdfs) == 6
+
+
+def test_other_errors_are_not_retried(overpass, tmp_path, monkeypatch):
+    calls = []
+
+    def geometries_from_polygon(polygon, tags):
+        calls.append(polygon.wkt)
+        raise TypeError("not a network error")
+
+    monkeypatch.setattr(ox, "geometries_from_polygon", geometries_from_polygon)
+    with pytest.raises(TypeError):
+        _fetch(str(tmp_path / "cache"))
+    # the tiles that had started were each tried once
+    assert calls
+    assert len(calls) == len(set(calls))
@@ -0,0 +1,54 @@
+"""
+Tests of the feature sinks (workflows/common/sinks.py)
+"""
+import fiona
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from common.sinks import FeatureSink, GeoParquetSink
+
+SCHEMA = {"geometry": "Point", "properties": {"name": "str"}}
+
+
+def _features(n: int) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {"name": [f"point {i}" for i in range(n)]}, geometry=[Point(i, i) for i in range(n)], crs="EPSG:27700"
+    )
+
+
+def test_writes_features(tmp_path):
+    path = str(tmp_path / "points.gpkg")
+    with FeatureSink(path, batch_size=3) as sink:
+        for _ in range(3):
+            sink.write(_features(2))
+    assert sink.features_written == 6
+    assert list(gpd.read_file(path)["name"]) == ["point 0", "point 1"] * 3
+
+
+def test_no_features_create_an_empty_layer_from_the_schema(tmp_path):
+    path = str(tmp_path / "points.gpkg")
+    _features(3).to_file(path, driver="GPKG")
+    with FeatureSink(path, schema=SCHEMA) as sink:
+        sink.write(_features(0))
+    with fiona.open(path) as collection:
+        assert len(collection) == 0
+        assert collection.schema["properties"] == {"name": "str"}
+
+
+def test_no_features_without_a_schema_leave_no_output(tmp_path):
+    path = tmp_path / "points.geojson"
+    _features(3).to_file(path, driver="GeoJSON")
+    with pytest.raises(ValueError, match="No features were written"):
+        with FeatureSink(str(path), driver="GeoJSON"):
+            pass
+    assert not path.exists()
+
+
+def test_no_features_leave_no_geoparquet_output(tmp_path):
+    path = tmp_path / "points.parquet"
+    _features(3).to_parquet(path)
+    with pytest.raises(ValueError, match="No features were written"):
+        with GeoParquetSink(str(path)) as sink:
+            sink.write(_features(0))
+    assert not path.exists()
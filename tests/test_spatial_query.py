@@ -0,0 +1,54 @@
+"""
+Tests of the persisted spatial query indexes (workflows/common/spatial_query.py)
+"""
+import os
+import shutil
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point
+
+from common.outputs import write_geoparquet
+from common.spatial_query import QueryLayer, build_index, index_is_current
+
+
+def _points(n: int, name: str = "point") -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {"name": [f"{name} {i}" for i in range(n)], "value": np.arange(n)},
+        geometry=[Point(-1.25 + i * 1e-4, 51.75) for i in range(n)],
+        crs="EPSG:4326",
+    )
+
+
+def test_index_follows_contents_not_modification_time(tmp_path):
+    source = tmp_path / "points.parquet"
+    write_geoparquet(_points(10), str(source))
+    build_index(source, tmp_path / "index")
+    assert index_is_current(source, tmp_path / "index")
+
+    # as after "dvc checkout": the same contents, with a new modification time
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert index_is_current(source, tmp_path / "index")
+    shutil.copyfile(source, tmp_path / "copy.parquet")
+    os.replace(tmp_path / "copy.parquet", source)
+    assert index_is_current(source, tmp_path / "index")
+
+    write_geoparquet(_points(10, "changed"), str(source))
+    assert not index_is_current(source, tmp_path / "index")
+
+
+def test_attributes_across_row_groups(tmp_path):
+    source = tmp_path / "points.parquet"
+    write_geoparquet(_points(25), str(source), row_group_size=4)
+    layer = QueryLayer("points", source, tmp_path / "index")
+
+    positions = np.array([22, 0, 5, 4, 23, 5])
+    attributes = layer.attributes(positions)
+    assert list(attributes.index) == list(positions)
+    assert list(attributes["value"]) == list(positions)
+    assert list(attributes["name"]) == [f"point {i}" for i in positions]
+    assert sorted(layer._row_groups) == [0, 1, 5]
+
+    assert layer.attributes(np.array([], dtype=np.int64)).empty
+    assert list(layer.within_radius(-1.25, 51.75, 1)["value"]) == [0]
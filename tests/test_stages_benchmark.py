@@ -0,0 +1,23 @@
+"""
+Tests of the stage benchmark (benchmarks/stages_benchmark.py)
+"""
+import os
+import signal
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "benchmarks"))
+import stages_benchmark  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def _killed(scale: float) -> None:
+    # as the OOM killer would
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_a_killed_case_fails_rather_than_hanging():
+    case = stages_benchmark.Case("killed", "charge-points/charge-points.py", _killed, lambda stage: 0)
+    with pytest.raises(RuntimeError, match="killed by signal 9"):
+        stages_benchmark.run_case(case, 1)
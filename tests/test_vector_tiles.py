@@ -0,0 +1,79 @@
+"""
+Tests of the vector tile export (workflows/vector-tiles/vector-tiles.py)
+"""
+import gzip
+import importlib.util
+import sqlite3
+import sys
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+import pytest
+from shapely.geometry import box
+
+SCRIPT = Path(__file__).resolve().parents[1] / "workflows" / "vector-tiles" / "vector-tiles.py"
+spec = importlib.util.spec_from_file_location("vector_tiles", SCRIPT)
+vector_tiles = importlib.util.module_from_spec(spec)
+# registered, so the functions of the module can be sent to the worker processes
+sys.modules[spec.name] = vector_tiles
+spec.loader.exec_module(vector_tiles)
+
+
+@pytest.fixture
+def loaded_layers(monkeypatch):
+    monkeypatch.setattr(vector_tiles, "_LAYERS", {})
+    return vector_tiles._LAYERS
+
+
+def _layer(min_zoom: int) -> "vector_tiles.LoadedLayer":
+    # a square of about 100 m in Oxford, in web mercator
+    geometries = np.array([pygeos.box(-140000, 6745000, -139900, 6745100)])
+    return vector_tiles.LoadedLayer(geometries, pd.DataFrame(index=[0]), pygeos.STRtree(geometries), min_zoom)
+
+
+def test_zoom_levels_below_every_layer_have_no_tasks(loaded_layers):
+    loaded_layers["buildings"] = _layer(13)
+    tasks = vector_tiles.tile_tasks(4, 14)
+    assert sorted({zoom for zoom, _ in tasks}) == [13, 14]
+    assert all(len(tiles) for _, tiles in tasks)
+
+
+def test_no_layers_have_no_tasks(loaded_layers):
+    assert vector_tiles.tile_tasks(4, 14) == []
+
+
+def _tiles(path: Path) -> Dict[Tuple[int, int, int], bytes]:
+    with closing(sqlite3.connect(path)) as connection:
+        return {(z, x, y): gzip.decompress(data) for z, x, y, data in connection.execute("SELECT * FROM tiles")}
+
+
+def test_regions_render_the_same_tiles_as_whole_layers(tmp_path, loaded_layers):
+    rng = np.random.default_rng(0)
+    # buildings across the corner of four zoom-10 regions near Oxford, in web mercator
+    corner_x, _, _, corner_y = vector_tiles.tile_bounds(10, 508, 339)
+    x, y = rng.uniform(-3000, 3000, 300) + corner_x, rng.uniform(-3000, 3000, 300) + corner_y
+    buildings = gpd.GeoDataFrame(
+        {"height": rng.integers(-10, 50, 300)},
+        geometry=[box(a, b, a + 20, b + 15) for a, b in zip(x, y)],
+        crs=vector_tiles.TILE_CRS,
+    ).to_crs("EPSG:27700")
+    buildings.to_file(tmp_path / "buildings.gpkg", driver="GPKG")
+    layers = {"buildings": vector_tiles.TileLayer(str(tmp_path / "buildings.gpkg"), ("height",), 12)}
+
+    regional_layers = vector_tiles.load_layers(layers)
+    assert list(regional_layers) == ["buildings"] and not loaded_layers
+    regions = vector_tiles.tile_regions(regional_layers, 10)
+    assert len(regions) == 4
+    n_tiles = vector_tiles.export_tiles(str(tmp_path / "regions.mbtiles"), 8, 13, regional_layers, workers=2)
+
+    # the whole layer, loaded at once
+    regional_buildings = regional_layers["buildings"]
+    loaded_layers["buildings"] = vector_tiles.read_region(regional_buildings, regional_buildings.bounds)
+    assert len(loaded_layers["buildings"].geometries) == 300
+    assert vector_tiles.export_tiles(str(tmp_path / "whole.mbtiles"), 8, 13, workers=2) == n_tiles
+    assert _tiles(tmp_path / "regions.mbtiles") == _tiles(tmp_path / "whole.mbtiles")
@@ -0,0 +1,149 @@
+"""
+Precomputes the LSOA, postcode district, and administrative and ceremonial county of every charge point, car park,
+bus stop or station, and primary substation, so that these can be looked up by reading a column rather than with a
+spatial join. Polygons (e.g. car parks) are looked up by a point inside them.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.area_index import AreaIndex, representative_points  # noqa: E402 pylint: disable=wrong-import-position
+from common.geometry import to_pygeos  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
+CRS = "EPSG:4326"
+DEFAULT_WORKERS = 1
+
+
+@dataclass(frozen=True)
+class BoundaryLayer:
+    """
+    :param path: the GeoParquet file of the areas
+    :param code_column: the column holding the code of each area
+    """
+
+    path: str
+    code_column: str
+
+
+@dataclass(frozen=True)
+class PointLayer:
+    """
+    :param path: the GeoParquet file of the features
+    :param key_columns: the columns identifying each feature
+    """
+
+    path: str
+    key_columns: Tuple[str, ...]
+
+
+# the area code columns added to the point layers, and the boundaries they come from
+BOUNDARY_LAYERS = {
+    "LSOA11CD": BoundaryLayer("../boundaries-lsoa/lsoa-boundaries.parquet", "LSOA11CD"),
+    "postcodeDistrict": BoundaryLayer("../boundaries-postcode-district/uk-postcode-districts.parquet", "Name"),
+    "administrativeCounty": BoundaryLayer("../boundaries/administrative-county-boundaries.parquet", "display_name"),
+    "ceremonialCounty": BoundaryLayer("../boundaries/ceremonial-county-boundaries.parquet", "display_name"),
+}
+
+# the point layers (car parks and bus stations are polygons, and are looked up by a point inside them), and the
+# columns identifying their features. The outputs are named after the layers, e.g. "charge-points-area-codes"
+POINT_LAYERS = {
+    "charge-points": PointLayer("../charge-points/charge-points.parquet", ("chargeDeviceID",)),
+    "car-parks": PointLayer("../car-parks/car-parks.parquet", ("element_type", "osmid")),
+    "bus-stops-and-stations": PointLayer(
+        "../bus-stops-stations/bus-stops-and-stations.parquet", ("element_type", "osmid")
+    ),
+    "dnos-primary-substations": PointLayer("../dnos/merge/dnos-primary-substations.parquet", ("DNO", "Site Name")),
+}
+
+# built before the worker processes are forked, so they share the indexes rather than each building them
+_INDEXES: Dict[str, AreaIndex] = {}
+
+
+def build_indexes() -> None:
+    """Read each boundary layer and build its spatial index"""
+    for code_column, layer in BOUNDARY_LAYERS.items():
+        boundaries = read_geoparquet(layer.path, columns=[layer.code_column]).to_crs(CRS)
+        _INDEXES[code_column] = AreaIndex(boundaries, layer.code_column)
+        print(f"Indexed {len(boundaries)} areas of {layer.path}")
+
+
+def lookup_region(points: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    :param points: pygeos points, in EPSG:4326
+    :return: the positions of the area each point is in, for each boundary layer
+    """
+    return {code_column: index.positions(points) for code_column, index in _INDEXES.items()}
+
+
+def assign_area_codes(points_gs: gpd.GeoSeries, workers: int = DEFAULT_WORKERS) -> pd.DataFrame:
+    """
+    :param points_gs: the points
+    :param workers: the number of processes looking up the points. The points are split into regions (strips of
+        longitude), one per process
+    :return: the code of the area each point is in (None if it is in no area), for each boundary layer
+    """
+    points = to_pygeos(points_gs.to_crs(CRS))
+    if workers <= 1:
+        positions = lookup_region(points)
+    else:
+        regions = np.array_split(np.argsort(pygeos.get_x(points), kind="stable"), workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork")) as executor:
+            region_positions = list(executor.map(lookup_region, (points[region] for region in regions)))
+        positions = {}
+        for code_column in _INDEXES:
+            positions[code_column] = np.empty(len(points), dtype=np.int64)
+            for region, region_position in zip(regions, region_positions):
+                positions[code_column][region] = region_position[code_column]
+    return pd.DataFrame(
+        {column: index.codes_at(positions[column], points_gs.index) for column, index in _INDEXES.items()},
+        index=points_gs.index,
+    )
+
+
+def area_codes_of_layer(layer: PointLayer, workers: int = DEFAULT_WORKERS) -> gpd.GeoDataFrame:
+    """
+    :param layer: the point layer
+    :param workers: the number of processes looking up the points
+    :return: the key columns of each feature, its area codes, and the point it was looked up by as its geometry
+    """
+    gdf = read_geoparquet(layer.path, columns=list(layer.key_columns))
+    points_gs = representative_points(gdf.geometry).to_crs(CRS)
+    with span("lookup") as lookup_span:
+        codes_df = assign_area_codes(points_gs, workers)
+        lookup_span.rows_in += len(points_gs)
+    return gpd.GeoDataFrame(pd.concat([gdf[list(layer.key_columns)], codes_df], axis=1), geometry=points_gs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of processes looking up the points of each layer",
+    )
+    args = parser.parse_args()
+
+    with stage_metrics("area-codes"):
+        build_indexes()
+        for name, layer in POINT_LAYERS.items():
+            codes_gdf = area_codes_of_layer(layer, args.workers)
+            unassigned = codes_gdf[list(BOUNDARY_LAYERS)].isna().sum()
+            print(f"{name}: {len(codes_gdf)} features, in no area: {unassigned.to_dict()}")
+            write_outputs(codes_gdf, f"{name}-area-codes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Converts the downloaded LSOA boundaries to GeoParquet, so downstream stages can load them (or just the columns and
+rows they need) without parsing the GeoJSON.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import PARQUET, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tiers import (  # noqa: E402 pylint: disable=wrong-import-position
+    add_tiers_argument,
+    selected_tiers,
+    write_tiers,
+)
+
+LSOA_BOUNDARIES_GEOJSON = "lsoa-boundaries.geojson"
+OUTPUT = "lsoa-boundaries"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_tiers_argument(parser)
+    args = parser.parse_args()
+
+    with stage_metrics("lsoa-boundaries"):
+        with span("parse") as parse_span:
+            gdf = gpd.read_file(LSOA_BOUNDARIES_GEOJSON)
+            parse_span.rows_in += len(gdf)
+        write_outputs(gdf, OUTPUT, formats=[PARQUET])
+        # the tiers are for drawing the boundaries on maps, so are written in all the output formats
+        write_tiers(gdf, OUTPUT, selected_tiers(args.tiers))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,34 @@
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Sequence
+
 import fiona
 import geopandas as gpd
-import shapely
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.geometry import force_2d  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tiers import (  # noqa: E402 pylint: disable=wrong-import-position
+    Tier,
+    add_tiers_argument,
+    selected_tiers,
+    write_tiers,
+)
 
 # enable the KML driver
 gpd.io.file.fiona.drvsupport.supported_drivers["KML"] = "rw"
 
 POSTCODE_DISTRICT_KML_FILE = "PostcodeDistricts.kml"
-OUT_FILE = "uk-postcode-districts.geojson"
+OUTPUT = "uk-postcode-districts"
+# all postcodes in Northern Ireland are in the BT postcode area
+NORTHERN_IRELAND_POSTCODE_AREA = "BT"
+# the layers are read one at a time by default: fiona holds the GIL while it reads features, and GDAL's KML driver
+# parses the whole file each time a layer is opened, so reading layers in threads was measured to be no quicker
+DEFAULT_WORKERS = 1
 
 ATTRIBUTES_TO_KEEP = [
     "Name",
@@ -14,38 +36,57 @@ ATTRIBUTES_TO_KEEP = [
 ]
 
 
-def read_kml_file(filepath: str) -> gpd.GeoDataFrame:
+def read_kml_layer(filepath: str, layer: str) -> gpd.GeoDataFrame:
+    """
+    Read one layer of the kml file. The Z coordinate is dropped as the layer is read, so the 3D geometries of the
+    whole file are never held in memory together.
+    """
+    return drop_z_coordinate(gpd.read_file(filepath, driver="KML", layer=layer))
+
+
+def read_kml_file(
+    filepath: str, excluded_areas: Iterable[str] = (), workers: int = DEFAULT_WORKERS
+) -> gpd.GeoDataFrame:
     """Data in the kml file is divided into multiple regions (AB, Al, BB, etc). Have to read each layer to
-    get all the data.
+    get all the data. The layers are concatenated once.
+    :param filepath: the kml file
+    :param excluded_areas: postcode areas whose layers are not read
+    :param workers: the number of threads reading layers (see DEFAULT_WORKERS)
     """
-    gdf = gpd.GeoDataFrame()
+    excluded_areas = tuple(area.upper() for area in excluded_areas)
+    layers = [layer for layer in fiona.listlayers(filepath) if not layer.upper().startswith(excluded_areas)]
 
-    for layer in fiona.listlayers(filepath):
-        layer_df = gpd.read_file(filepath, driver="KML", layer=layer)
-        gdf = gdf.append(layer_df, ignore_index=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        layer_dfs = list(executor.map(lambda layer: read_kml_layer(filepath, layer), layers))
 
-    return gdf
+    return gpd.GeoDataFrame(pd.concat(layer_dfs, ignore_index=True), crs="EPSG:4326")
 
 
 def drop_z_coordinate(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     """The kml file contains a Z coordinate (value=0) for all points, do drop this."""
-    return gdf.set_geometry(
-        gdf.geometry.map(lambda polygon: shapely.ops.transform(lambda x, y, _: (x, y), polygon)), crs="EPSG:4326"
-    )
+    return gdf.set_geometry(force_2d(gdf.geometry), crs="EPSG:4326")
+
 
+def convert_kml_file_to_geojson(workers: int = DEFAULT_WORKERS, tiers: Sequence[Tier] = ()) -> None:
+    with span("parse") as parse_span:
+        gdf = read_kml_file(
+            POSTCODE_DISTRICT_KML_FILE, excluded_areas=[NORTHERN_IRELAND_POSTCODE_AREA], workers=workers
+        )
+        parse_span.rows_in += len(gdf)
+    gdf = gdf[ATTRIBUTES_TO_KEEP]
+    write_outputs(gdf, OUTPUT)
+    write_tiers(gdf, OUTPUT, tiers)
 
-def drop_northern_ireland(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    """All postcodes in Northern Ireland start with BT"""
-    return gdf.drop(gdf.loc[gdf["Name"].str.startswith("BT")].index)
 
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of threads reading KML layers")
+    add_tiers_argument(parser)
+    args = parser.parse_args()
 
-def convert_kml_file_to_geojson() -> None:
-    gdf = read_kml_file(POSTCODE_DISTRICT_KML_FILE)
-    gdf = drop_z_coordinate(gdf)
-    gdf = drop_northern_ireland(gdf)
-    gdf = gdf[ATTRIBUTES_TO_KEEP]
-    gdf.to_file(OUT_FILE, driver="GeoJSON")
+    with stage_metrics("postcode-districts"):
+        convert_kml_file_to_geojson(workers=args.workers, tiers=selected_tiers(args.tiers))
 
 
 if __name__ == "__main__":
-    convert_kml_file_to_geojson()
+    main()
@@ -1,36 +1,125 @@
 """
 Downloads the county boundaries from Open Street Map using the OSMNX python library.
+The boundary of each county is cached (see common/osm_cache.py), so only new or updated counties are downloaded.
+
+With "--source pbf", the boundaries are instead read from those extracted from the Great Britain .osm.pbf file by the
+osm-extract workflow, and only the counties missing from the extract are downloaded.
 """
+import argparse
+import sys
+from functools import partial
 from glob import glob
+from pathlib import Path
 from typing import List, Literal
 
 import geopandas as gpd
 import osmnx as ox
 import pandas as pd
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_cache import OsmCache  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_pbf import ELEMENT_TYPE_COLUMN, read_osm_extract  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tiers import (  # noqa: E402 pylint: disable=wrong-import-position
+    add_tiers_argument,
+    selected_tiers,
+    write_tiers,
+)
+
 COUNTRY = "Great Britain"
 OSM_ID_COL = "osmid"
+COUNTRY_COL = "country"
 
 PROPERTIES_TO_RETAIN = ["display_name", "geometry"]
 
 HomeNations = Literal["England", "Scotland", "Wales", "Northern Ireland"]
 
+NOMINATIM_SOURCE = "nominatim"
+PBF_SOURCE = "pbf"
+# county, unitary authority and ceremonial county boundaries extracted from the Great Britain .osm.pbf file by the
+# osm-extract workflow
+OSM_EXTRACT = "../osm-extract/osm-county-boundaries.parquet"
+
+
+def read_county_list(file_list: List[str]) -> pd.DataFrame:
+    """
+    :param file_list: a list of CSV files of the OSM IDs of the UK counties (e.g. one per home country, named
+        "<kind>-counties-<country>.csv")
+    :return: the OSM ID, name and home country of each county
+    """
+    county_dfs = []
+    for file in file_list:
+        county_df = pd.read_csv(file)
+        if COUNTRY_COL not in county_df:
+            county_df[COUNTRY_COL] = Path(file).stem.rsplit("-", 1)[1].title()
+        county_dfs.append(county_df)
+    return pd.concat(county_dfs, ignore_index=True).drop_duplicates(subset=[OSM_ID_COL])
+
 
-def get_county_boundaries_from_csv_files(file_list: List[str]) -> gpd.GeoDataFrame:
+def get_county_boundaries_from_csv_files(file_list: List[str], cache: OsmCache) -> gpd.GeoDataFrame:
     """
     Given a list of files containing the OSM IDs for the UK counties (dovided by home country)
     build a GeoDataFrame containing all the boundaries
     :param file_list: a list of CSV files (e.g. one per home country)
+    :param cache: the cache of Nominatim results
     :return: GeoDataFrame with boundaries for each county
     """
-    counties_df = pd.concat((pd.read_csv(file) for file in file_list), ignore_index=True)
-    counties_df = counties_df.drop_duplicates(subset=[OSM_ID_COL])
-    county_osm_ids = counties_df[OSM_ID_COL].tolist()
-    gdf: gpd.GeoDataFrame = ox.geocode_to_gdf(county_osm_ids, by_osmid=True)
+    return geocode_counties(read_county_list(file_list)[OSM_ID_COL].tolist(), cache)
+
+
+def geocode_counties(county_osm_ids: List[str], cache: OsmCache) -> gpd.GeoDataFrame:
+    """
+    :param county_osm_ids: the OSM IDs of the counties (e.g. "R81941")
+    :param cache: the cache of Nominatim results
+    :return: GeoDataFrame with the boundary of each county, from Nominatim
+    """
+    county_gdfs = [
+        cache.get_or_fetch(
+            "geocode_to_gdf", {"query": osm_id, "by_osmid": True}, partial(ox.geocode_to_gdf, [osm_id], by_osmid=True)
+        )
+        for osm_id in county_osm_ids
+    ]
+    gdf = gpd.GeoDataFrame(pd.concat(county_gdfs, ignore_index=True), crs=county_gdfs[0].crs)
     gdf = gdf[PROPERTIES_TO_RETAIN]
     return gdf
 
 
+def get_county_boundaries_from_extract(
+    file_list: List[str], cache: OsmCache, extract_path: str = OSM_EXTRACT
+) -> gpd.GeoDataFrame:
+    """
+    Build the boundaries of the counties listed in the CSV files from the boundaries extracted from a local OSM file
+    by the osm-extract workflow. The display_name is composed as Nominatim writes it for a county (e.g.
+    "Oxfordshire, England, United Kingdom"). Counties missing from the extract (e.g. a relation cut by the edge of
+    the extract) are looked up with Nominatim.
+    :param file_list: a list of CSV files (e.g. one per home country)
+    :param cache: the cache of Nominatim results
+    :param extract_path: the GeoParquet file written by osm-extract
+    :return: GeoDataFrame with boundaries for each county, in the order of the CSV files
+    """
+    counties_df = read_county_list(file_list).set_index(OSM_ID_COL)
+    extract_gdf = read_osm_extract(extract_path, [ELEMENT_TYPE_COLUMN, OSM_ID_COL, "name"])
+    relations_gdf = extract_gdf[extract_gdf[ELEMENT_TYPE_COLUMN] == "relation"]
+    relations_gdf = relations_gdf.set_index("R" + relations_gdf[OSM_ID_COL].astype(str))
+
+    extracted = counties_df.index.isin(relations_gdf.index)
+    extracted_gdf = relations_gdf.loc[counties_df.index[extracted]]
+    extracted_df = counties_df[extracted]
+    display_names = (
+        extracted_gdf["name"].fillna(extracted_df["name"]) + ", " + extracted_df[COUNTRY_COL] + ", United Kingdom"
+    )
+    gdf = gpd.GeoDataFrame({"display_name": display_names}, geometry=extracted_gdf.geometry, crs=extract_gdf.crs)
+
+    missing_osm_ids = counties_df.index[~extracted].tolist()
+    if missing_osm_ids:
+        print(f"{len(missing_osm_ids)} counties are missing from {extract_path}, looking them up with Nominatim")
+        missing_gdf = geocode_counties(missing_osm_ids, cache).to_crs(gdf.crs).set_axis(missing_osm_ids)
+        gdf = gpd.GeoDataFrame(pd.concat([gdf, missing_gdf]).loc[counties_df.index], crs=gdf.crs)
+    gdf = gdf.reset_index(drop=True)
+    return gdf[PROPERTIES_TO_RETAIN]
+
+
 def get_administrative_counties_from_osm(country: HomeNations) -> gpd.GeoDataFrame:
     """
     Retrieve all the administrative counties from one of the four UK Countries
@@ -70,12 +159,30 @@ def get_administrative_counties_from_osm(country: HomeNations) -> gpd.GeoDataFra
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--source",
+        choices=[NOMINATIM_SOURCE, PBF_SOURCE],
+        default=NOMINATIM_SOURCE,
+        help="look up each county with Nominatim or read the boundaries extracted from the Great Britain .osm.pbf file",
+    )
+    add_tiers_argument(parser)
+    args = parser.parse_args()
+    tiers = selected_tiers(args.tiers)
+    get_county_boundaries = (
+        get_county_boundaries_from_extract if args.source == PBF_SOURCE else get_county_boundaries_from_csv_files
+    )
+
     admin_file_list = sorted(glob("static-src/administrative-counties-*.csv"))
     ceremonial_file_list = sorted(glob("static-src/ceremonial-counties-*.csv"))
-    administrative_counties_df = get_county_boundaries_from_csv_files(admin_file_list)
-    ceremonial_counties_df = get_county_boundaries_from_csv_files(ceremonial_file_list)
-    ceremonial_counties_df.to_file("ceremonial-county-boundaries.geojson", driver="GeoJSON")
-    administrative_counties_df.to_file("administrative-county-boundaries.geojson", driver="GeoJSON")
+    with stage_metrics("osm-county-boundary"):
+        with OsmCache() as cache:
+            administrative_counties_df = get_county_boundaries(admin_file_list, cache)
+            ceremonial_counties_df = get_county_boundaries(ceremonial_file_list, cache)
+        write_outputs(ceremonial_counties_df, "ceremonial-county-boundaries")
+        write_outputs(administrative_counties_df, "administrative-county-boundaries")
+        write_tiers(ceremonial_counties_df, "ceremonial-county-boundaries", tiers)
+        write_tiers(administrative_counties_df, "administrative-county-boundaries", tiers)
 
 
 if __name__ == "__main__":
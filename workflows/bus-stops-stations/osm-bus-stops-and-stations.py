@@ -1,39 +1,149 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterator, List, Optional
+
 import geopandas as gpd
-import osmnx as ox
-import pandas as pd
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.dedup import DuplicateFilter  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_cache import OsmCache  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_pbf import read_osm_extract  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_tiles import (  # noqa: E402 pylint: disable=wrong-import-position
+    DEFAULT_TILE_SIZE,
+    DEFAULT_WORKERS,
+    feature_keys,
+    features_from_place,
+    geocode_area,
+    iter_tiled_features,
+)
+from common.outputs import OutputSink, select_columns  # noqa: E402 pylint: disable=wrong-import-position
+
+HOME_NATIONS = ["England", "Scotland", "Wales"]
+# the OSM element type and id, which together identify a feature
+KEY_COLUMNS = ["element_type", "osmid"]
 PROPERTIES_TO_RETAIN = ["isStation", "geometry"]
+# Retrieve all the bus stops and bus station according to these two tags:
+#     - amenity=bus_station (https://wiki.openstreetmap.org/wiki/Tag:amenity%3Dbus_station)
+#     - highway=bus_stop (https://wiki.openstreetmap.org/wiki/Tag:highway%3Dbus_stop)
+# There is one more tag who includes train and tram stations so we don't use it for now:
+#     - public_transport=station (https://wiki.openstreetmap.org/wiki/Tag:public_transport%3Dstation)
+BUS_STOP_AND_STATION_TAGS = {
+    "amenity": "bus_station",
+    "highway": "bus_stop",
+}
+
+OUTPUT = "bus-stops-and-stations"
+# the number of stops and stations kept and dropped as duplicates, for each area
+DEDUP_REPORT = "bus-stops-and-stations-dedup.json"
 
+OVERPASS_SOURCE = "overpass"
+PBF_SOURCE = "pbf"
+# bus stops and stations extracted from the Great Britain .osm.pbf file by the osm-extract workflow
+OSM_EXTRACT = "../osm-extract/osm-bus-stops-and-stations.parquet"
 
-def get_bus_stops_and_stations_from_area(area: str) -> gpd.GeoDataFrame:
+
+def select_properties(stops_and_stations_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    :param stops_and_stations_gdf: stops and stations in the osmnx layout, indexed by (element_type, osmid)
+    :return: the key and properties we keep for each stop or station
     """
-    Retrieve all the bus stops and bus station in the area
-    according to these three tags:
-        - amenity=bus_station (https://wiki.openstreetmap.org/wiki/Tag:amenity%3Dbus_station)
-        - highway=bus_stop (https://wiki.openstreetmap.org/wiki/Tag:highway%3Dbus_stop)
-    There is one more tag who includes train and tram stations so we don't use it for now:
-        - public_transport=station (https://wiki.openstreetmap.org/wiki/Tag:public_transport%3Dstation)
+    stops_and_stations_gdf = select_columns(
+        stops_and_stations_gdf.reset_index(), KEY_COLUMNS + ["amenity", "geometry"], {"amenity": "string"}
+    )
+    is_station = stops_and_stations_gdf["amenity"] == "bus_station"
+    stops_and_stations_gdf["isStation"] = is_station.fillna(False).astype(bool)
+    return stops_and_stations_gdf[KEY_COLUMNS + PROPERTIES_TO_RETAIN]
+
+
+def get_bus_stops_and_stations_from_area(
+    area: str,
+    cache: Optional[OsmCache] = None,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+) -> gpd.GeoDataFrame:
+    """
+    Retrieve all the bus stops and bus station in the area (see BUS_STOP_AND_STATION_TAGS)
     :param area:
+    :param cache: the cache of Overpass results (defaults to the shared OSM cache)
+    :param tile_size: the size (in degrees) of the tiles the area is fetched in
+    :param workers: the number of tiles fetched at the same time
+    :return: GeoDataFrame with all bus stops and stations, one stop per row.
+    """
+    cache = cache if cache is not None else OsmCache()
+    stops_and_stations_gdf = features_from_place(
+        area, BUS_STOP_AND_STATION_TAGS, cache, tile_size=tile_size, workers=workers
+    )
+    return select_properties(stops_and_stations_gdf)
+
+
+def iter_bus_stops_and_stations_from_areas(
+    areas: List[str],
+    cache: OsmCache,
+    duplicates: DuplicateFilter,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Retrieve all the bus stops and stations in several areas, tile by tile, skipping those in more than one area
+    :param areas: countries or other regions/places. Must be names recognized by the Nominatim database
+    :param cache: the cache of Overpass results
+    :param duplicates: counts the stops and stations dropped as duplicates in each area
+    :param tile_size: the size (in degrees) of the tiles the areas are fetched in
+    :param workers: the number of tiles fetched at the same time
+    :return: an iterator over the stops and stations of each tile
+    """
+    for area in areas:
+        area_geometry = geocode_area(area, cache)
+        for stops_and_stations_gdf in iter_tiled_features(
+            area_geometry, BUS_STOP_AND_STATION_TAGS, cache, tile_size, workers, duplicates, source=area
+        ):
+            yield select_properties(stops_and_stations_gdf)
+
+
+def get_bus_stops_and_stations_from_extract(extract_path: str = OSM_EXTRACT) -> gpd.GeoDataFrame:
+    """
+    Read the bus stops and stations extracted from a local OSM file by the osm-extract workflow
+    (with the same tags as get_bus_stops_and_stations_from_area)
+    :param extract_path: the GeoParquet file written by osm-extract
     :return: GeoDataFrame with all bus stops and stations, one stop per row.
     """
-    tags = {
-        "amenity": "bus_station",
-        "highway": "bus_stop",
-    }
-    stops_and_stations_gdf = ox.geometries_from_place(area, tags)
-    stops_and_stations_gdf = stops_and_stations_gdf.reset_index()
-    stops_and_stations_gdf["isStation"] = stops_and_stations_gdf["amenity"] == "bus_station"
-    stops_and_stations_gdf = stops_and_stations_gdf[PROPERTIES_TO_RETAIN]
-    return stops_and_stations_gdf
+    stops_and_stations_gdf = read_osm_extract(extract_path, KEY_COLUMNS + ["amenity"])
+    return select_properties(stops_and_stations_gdf)
 
 
 def main():
     """Get bus stops and bus stations for the whole of Great Britain"""
-    en_gdf = get_bus_stops_and_stations_from_area("England")
-    sco_gdf = get_bus_stops_and_stations_from_area("Scotland")
-    wal_gdf = get_bus_stops_and_stations_from_area("Wales")
-    gb_gdf = gpd.GeoDataFrame(pd.concat([en_gdf, sco_gdf, wal_gdf], ignore_index=True), crs=en_gdf.crs)
-    gb_gdf.to_file("bus-stops-and-stations.geojson", driver="GeoJSON")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--source",
+        choices=[OVERPASS_SOURCE, PBF_SOURCE],
+        default=OVERPASS_SOURCE,
+        help="query the Overpass API or read the features extracted from the Great Britain .osm.pbf file",
+    )
+    parser.add_argument(
+        "--tile-size", type=float, default=DEFAULT_TILE_SIZE, help="size (in degrees) of the Overpass query tiles"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="number of Overpass query tiles fetched at a time"
+    )
+    args = parser.parse_args()
+
+    with stage_metrics("osm-bus-stops-and-stations"):
+        duplicates = DuplicateFilter()
+        with OutputSink(OUTPUT) as sink:
+            if args.source == PBF_SOURCE:
+                gb_gdf = get_bus_stops_and_stations_from_extract()
+                sink.write(duplicates.filter(gb_gdf, feature_keys(gb_gdf), "Great Britain"))
+            else:
+                with OsmCache() as cache:
+                    for stops_and_stations_gdf in iter_bus_stops_and_stations_from_areas(
+                        HOME_NATIONS, cache, duplicates, tile_size=args.tile_size, workers=args.workers
+                    ):
+                        sink.write(stops_and_stations_gdf)
+        print(duplicates.summary())
+        duplicates.write_report(DEDUP_REPORT)
 
 
 if __name__ == "__main__":
@@ -1,32 +1,137 @@
-from typing import Literal, Union
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterator, List, Literal, Optional, Union
 
 import geopandas as gpd
-import osmnx as ox
-import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.dedup import DuplicateFilter  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_cache import OsmCache  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_pbf import read_osm_extract  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_tiles import (  # noqa: E402 pylint: disable=wrong-import-position
+    DEFAULT_TILE_SIZE,
+    DEFAULT_WORKERS,
+    feature_keys,
+    features_from_place,
+    geocode_area,
+    iter_tiled_features,
+)
+from common.outputs import OutputSink, select_columns  # noqa: E402 pylint: disable=wrong-import-position
 
 HomeNation = Literal["England", "Scotland", "Wales"]
+HOME_NATIONS: List[HomeNation] = ["England", "Scotland", "Wales"]
+# the OSM element type and id, which together identify a feature
+KEY_COLUMNS = ["element_type", "osmid"]
 PROPERTIES_TO_RETAIN = ["parking", "fee", "capacity", "park_ride", "supervised", "maxstay", "opening_hours", "geometry"]
+# tags are strings, including in frames where no feature has them
+PROPERTY_DTYPES = {tag: "string" for tag in PROPERTIES_TO_RETAIN[:-1]}
+CAR_PARK_TAGS = {"amenity": "parking"}
+
+OUTPUT = "car-parks"
+# the number of car parks kept and dropped as duplicates, for each area
+DEDUP_REPORT = "car-parks-dedup.json"
+
+OVERPASS_SOURCE = "overpass"
+PBF_SOURCE = "pbf"
+# car parks extracted from the Great Britain .osm.pbf file by the osm-extract workflow
+OSM_EXTRACT = "../osm-extract/osm-car-parks.parquet"
+
 
+def select_properties(parking_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    :param parking_gdf: car parks in the osmnx layout, indexed by (element_type, osmid)
+    :return: the key and properties we keep for each car park
+    """
+    return select_columns(parking_gdf.reset_index(), KEY_COLUMNS + PROPERTIES_TO_RETAIN, PROPERTY_DTYPES)
 
-def get_car_parks_from_area(area: Union[HomeNation, str]) -> gpd.GeoDataFrame:
+
+def get_car_parks_from_area(
+    area: Union[HomeNation, str],
+    cache: Optional[OsmCache] = None,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+) -> gpd.GeoDataFrame:
     """
     Retrieve all the car parks in the area
     :param area: a country or another region/place. Must be a name recognized by the Nominatim database
+    :param cache: the cache of Overpass results (defaults to the shared OSM cache)
+    :param tile_size: the size (in degrees) of the tiles the area is fetched in
+    :param workers: the number of tiles fetched at the same time
     :return: A GeoDataFrame containing all the car parks found in the are
     """
-    parking_gdf = ox.geometries_from_place(area, {"amenity": "parking"})
-    parking_gdf = parking_gdf.reset_index()
-    parking_gdf = parking_gdf[PROPERTIES_TO_RETAIN]
-    return parking_gdf
+    cache = cache if cache is not None else OsmCache()
+    parking_gdf = features_from_place(area, CAR_PARK_TAGS, cache, tile_size=tile_size, workers=workers)
+    return select_properties(parking_gdf)
+
+
+def iter_car_parks_from_areas(
+    areas: List[str],
+    cache: OsmCache,
+    duplicates: DuplicateFilter,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Retrieve all the car parks in several areas, tile by tile, skipping car parks in more than one area
+    :param areas: countries or other regions/places. Must be names recognized by the Nominatim database
+    :param cache: the cache of Overpass results
+    :param duplicates: counts the car parks dropped as duplicates in each area
+    :param tile_size: the size (in degrees) of the tiles the areas are fetched in
+    :param workers: the number of tiles fetched at the same time
+    :return: an iterator over the car parks of each tile
+    """
+    for area in areas:
+        area_geometry = geocode_area(area, cache)
+        for parking_gdf in iter_tiled_features(
+            area_geometry, CAR_PARK_TAGS, cache, tile_size, workers, duplicates, source=area
+        ):
+            yield select_properties(parking_gdf)
+
+
+def get_car_parks_from_extract(extract_path: str = OSM_EXTRACT) -> gpd.GeoDataFrame:
+    """
+    Read the car parks extracted from a local OSM file by the osm-extract workflow
+    :param extract_path: the GeoParquet file written by osm-extract
+    :return: A GeoDataFrame containing all the car parks in the extract, with the same columns as
+        get_car_parks_from_area
+    """
+    parking_gdf = read_osm_extract(extract_path, KEY_COLUMNS + PROPERTIES_TO_RETAIN[:-1])
+    return parking_gdf.astype(PROPERTY_DTYPES)
 
 
 def main():
     """Get car parks for the whole of Great Britain"""
-    en_gdf = get_car_parks_from_area("England")
-    sco_gdf = get_car_parks_from_area("Scotland")
-    wal_gdf = get_car_parks_from_area("Wales")
-    gb_gdf = gpd.GeoDataFrame(pd.concat([en_gdf, sco_gdf, wal_gdf], ignore_index=True), crs=en_gdf.crs)
-    gb_gdf.to_file("car-parks.geojson", driver="GeoJSON")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--source",
+        choices=[OVERPASS_SOURCE, PBF_SOURCE],
+        default=OVERPASS_SOURCE,
+        help="query the Overpass API or read the features extracted from the Great Britain .osm.pbf file",
+    )
+    parser.add_argument(
+        "--tile-size", type=float, default=DEFAULT_TILE_SIZE, help="size (in degrees) of the Overpass query tiles"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="number of Overpass query tiles fetched at a time"
+    )
+    args = parser.parse_args()
+
+    with stage_metrics("osm-car-parks"):
+        duplicates = DuplicateFilter()
+        with OutputSink(OUTPUT) as sink:
+            if args.source == PBF_SOURCE:
+                gb_gdf = get_car_parks_from_extract()
+                sink.write(duplicates.filter(gb_gdf, feature_keys(gb_gdf), "Great Britain"))
+            else:
+                with OsmCache() as cache:
+                    for parking_gdf in iter_car_parks_from_areas(
+                        HOME_NATIONS, cache, duplicates, tile_size=args.tile_size, workers=args.workers
+                    ):
+                        sink.write(parking_gdf)
+        print(duplicates.summary())
+        duplicates.write_report(DEDUP_REPORT)
 
 
 if __name__ == "__main__":
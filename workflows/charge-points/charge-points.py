@@ -1,8 +1,27 @@
+import argparse
+import sys
+from pathlib import Path
+
 import geopandas as gpd
 import pandas as pd
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.delta import VERSION_COLUMN, SnapshotHistory  # noqa: E402 pylint: disable=wrong-import-position
+from common.encoding import detect_encoding  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import PARQUET, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tabular import (  # noqa: E402 pylint: disable=wrong-import-position
+    CSV_ENGINES,
+    PANDAS_ENGINE,
+    PYARROW_ENGINE,
+    read_csv_chunks,
+)
+
 NCR_DATA_CSV = "ncr-data.csv"
-CHARGE_POINTS_GEOJSON = "charge-points.geojson"
+CHARGE_POINTS_OUTPUT = "charge-points"
+CHANGES_OUTPUT = "charge-points-changes"
+HISTORY_DIR = "charge-points-history"
+KEY = "chargeDeviceID"
 
 ATTRIBUTES = [
     "chargeDeviceID",
@@ -17,13 +36,78 @@ ATTRIBUTES = [
     "connector1RatedOutputKW",
 ]
 
+ATTRIBUTE_DTYPES = {
+    "chargeDeviceID": "str",
+    "name": "str",
+    "latitude": "float64",
+    "longitude": "float64",
+    "town": "str",
+    "county": "str",
+    "postcode": "str",
+    "chargeDeviceStatus": "category",
+    "locationType": "category",
+    "connector1RatedOutputKW": "float64",
+}
+
+
+def read_ncr_data(csv_engine: str = PANDAS_ENGINE) -> pd.DataFrame:
+    """
+    Read the columns we keep from the NCR CSV file, with explicit types
+    :param csv_engine: the CSV parser to use, "pandas" or "pyarrow"
+    """
+    encoding = detect_encoding(NCR_DATA_CSV)
+    if csv_engine == PYARROW_ENGINE:
+        chunks = read_csv_chunks(NCR_DATA_CSV, ATTRIBUTES, ATTRIBUTE_DTYPES, encoding=encoding, engine=PYARROW_ENGINE)
+        return pd.concat(chunks, ignore_index=True)
+    return pd.read_csv(NCR_DATA_CSV, lineterminator="\n", usecols=ATTRIBUTES, dtype=ATTRIBUTE_DTYPES, encoding=encoding)
+
+
+def to_points(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    :param df: charge points, with latitude and longitude columns
+    :return: the charge points as points
+    """
+    with span("geometry"):
+        return gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df["longitude"], df["latitude"], crs="EPSG:4326"))
+
+
+def write_changes(ncr_df: pd.DataFrame) -> None:
+    """
+    Compare the charge points with the previous NCR snapshot, by chargeDeviceID, add the charge points that were
+    added, changed or removed to the history, and write them (with a "change" and "version" column) to the changes
+    output, so that downstream caches and indexes can be patched rather than rebuilt.
+    The changes are only written as GeoParquet, as there may be none.
+    :param ncr_df: the NCR snapshot
+    """
+    history = SnapshotHistory(HISTORY_DIR, KEY, ATTRIBUTES)
+    with span("diff") as diff_span:
+        delta = history.diff(ncr_df)
+        diff_span.rows_in += len(ncr_df)
+        diff_span.rows_out += len(delta)
+    version = history.append(delta)
+    history.compact()
+    print(f"NCR snapshot version {version}: {delta.summary()}")
+    changes_df = delta.to_frame().drop(columns="fingerprint").assign(**{VERSION_COLUMN: version})
+    write_outputs(to_points(changes_df), CHANGES_OUTPUT, formats=[PARQUET])
+
 
 def main() -> None:
-    ncr_df: pd.DataFrame = pd.read_csv(NCR_DATA_CSV, lineterminator="\n", usecols=ATTRIBUTES)
-    ncr_gdf = gpd.GeoDataFrame(
-        ncr_df, geometry=gpd.points_from_xy(ncr_df["longitude"], ncr_df["latitude"], crs="EPSG:4326")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv-engine", choices=CSV_ENGINES, default=PANDAS_ENGINE, help="CSV parser to use")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"also record the changes since the previous run in {HISTORY_DIR} and write them to {CHANGES_OUTPUT}",
     )
-    ncr_gdf.to_file(CHARGE_POINTS_GEOJSON, driver="GeoJSON")
+    args = parser.parse_args()
+
+    with stage_metrics("charge-points"):
+        with span("parse") as parse_span:
+            ncr_df = read_ncr_data(args.csv_engine)
+            parse_span.rows_in += len(ncr_df)
+        if args.delta:
+            write_changes(ncr_df)
+        write_outputs(to_points(ncr_df), CHARGE_POINTS_OUTPUT)
 
 
 if __name__ == "__main__":
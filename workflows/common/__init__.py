@@ -0,0 +1,6 @@
+"""
+Helpers shared by the workflow scripts.
+
+The workflow scripts are run directly (e.g. by DVC from their own directory) rather than installed, so they make
+this package importable by adding the ``workflows`` directory to ``sys.path`` before importing from it.
+"""
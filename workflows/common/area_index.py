@@ -0,0 +1,77 @@
+"""
+Point-in-area lookups against a boundary layer (e.g. LSOAs or postcode districts) with a pygeos STRtree.
+
+The tree is built once per layer and every point is looked up in one vectorized query_bulk call, rather than
+spatial-joining each point dataset against the boundaries when it is used.
+"""
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+from .geometry import from_pygeos, to_pygeos
+
+# the position of a point that is in no area
+NO_AREA = -1
+
+
+def representative_points(geoseries: gpd.GeoSeries) -> gpd.GeoSeries:
+    """
+    :param geoseries: the geometries (points, lines or polygons)
+    :return: a point on (or in) each geometry: the point itself for points, and a point inside each polygon, which
+        unlike its centroid is always in the same area as the polygon is (mostly) in
+    """
+    return from_pygeos(pygeos.point_on_surface(to_pygeos(geoseries)), geoseries.index, geoseries.crs)
+
+
+class AreaIndex:
+    """
+    A spatial index over the areas of a boundary layer, returning the code of the area each point is in
+    """
+
+    def __init__(self, boundaries: gpd.GeoDataFrame, code_column: str):
+        """
+        :param boundaries: the areas
+        :param code_column: the column holding the code of each area (e.g. "LSOA11CD")
+        """
+        self.codes = boundaries[code_column].to_numpy()
+        self.crs = boundaries.crs
+        self.tree = pygeos.STRtree(to_pygeos(boundaries.geometry))
+
+    def positions(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: pygeos points, in the CRS of the boundaries
+        :return: the position (in the boundaries) of the area each point is in, or NO_AREA. A point on the border
+            of several areas is in the first of them
+        """
+        point_positions, area_positions = self.tree.query_bulk(points, predicate="intersects")
+        positions = np.full(len(points), NO_AREA, dtype=np.int64)
+        # order the matches by point, then area, and keep the first match of each point
+        order = np.lexsort((area_positions, point_positions))
+        point_positions, area_positions = point_positions[order], area_positions[order]
+        first_matches = np.ones(len(point_positions), dtype=bool)
+        first_matches[1:] = point_positions[1:] != point_positions[:-1]
+        positions[point_positions[first_matches]] = area_positions[first_matches]
+        return positions
+
+    def codes_at(self, positions: np.ndarray, index: Optional[pd.Index] = None) -> pd.Series:
+        """
+        :param positions: positions returned by positions()
+        :param index: the index of the result
+        :return: the code of the area at each position (None for NO_AREA)
+        """
+        codes = pd.Series(self.codes[np.maximum(positions, 0)], index=index, dtype=object)
+        codes[positions == NO_AREA] = None
+        return codes
+
+    def lookup(self, geoseries: gpd.GeoSeries) -> pd.Series:
+        """
+        :param geoseries: the features, in any CRS. Lines and polygons are looked up by their representative point
+        :return: the code of the area each feature is in (None if it is in no area), with the index of the features
+        """
+        points = representative_points(geoseries)
+        if self.crs is not None and points.crs is not None and points.crs != self.crs:
+            points = points.to_crs(self.crs)
+        return self.codes_at(self.positions(to_pygeos(points)), geoseries.index)
@@ -0,0 +1,151 @@
+"""
+Compact, bounded-memory de-duplication of feature ids.
+"""
+import json
+from typing import Dict, Iterable, Optional, TypeVar, Union
+
+import numpy as np
+import pandas as pd
+
+Frame = TypeVar("Frame", bound=Union[pd.DataFrame, pd.Series])
+
+# Pending hashes are merged into the main sorted array once they exceed this fraction of it (or MIN_MERGE_SIZE),
+# which keeps the number of full-array merges logarithmic in the number of ids.
+MERGE_FRACTION = 0.25
+MIN_MERGE_SIZE = 1_000_000
+
+
+def hash_ids(ids: Iterable) -> np.ndarray:
+    """
+    Hash ids (e.g. the gml_id strings of OS features) to 64-bit integers.
+    The hash is deterministic, so ids hashed in different processes can be compared.
+    :param ids: the ids to hash
+    :return: an array of uint64 hashes, one per id
+    """
+    return pd.util.hash_array(np.asarray(ids, dtype=object), categorize=False)
+
+
+def _sorted_contains(sorted_hashes: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.searchsorted(sorted_hashes, hashes)
+    positions = np.minimum(positions, len(sorted_hashes) - 1)
+    return sorted_hashes[positions] == hashes
+
+
+class HashedIdSet:
+    """
+    A set of ids stored as sorted 64-bit hashes rather than Python strings.
+    Each id costs 8 bytes (plus transient copies while merging), compared to roughly 100 bytes for a string in a
+    Python set. With 64-bit hashes the chance of any collision among 100 million ids is around 1 in 3,700, so a
+    handful of features may be wrongly treated as duplicates in the worst case.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        :param max_bytes: optional memory ceiling. A MemoryError is raised if the set would need more than this
+            (including the transient copies made while merging), rather than the process being killed by the OS.
+        """
+        self.max_bytes = max_bytes
+        self.peak_nbytes = 0
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._pending = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._pending)
+
+    @property
+    def nbytes(self) -> int:
+        """The memory currently used by the set, in bytes"""
+        return self._sorted.nbytes + self._pending.nbytes
+
+    def _check_memory(self, nbytes: int) -> None:
+        self.peak_nbytes = max(self.peak_nbytes, nbytes)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            raise MemoryError(
+                f"De-duplication index needs {nbytes / 2 ** 20:.0f} MB for {len(self)} ids, "
+                f"which exceeds the limit of {self.max_bytes / 2 ** 20:.0f} MB"
+            )
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        :param hashes: hashed ids, as returned by hash_ids
+        :return: a boolean mask, True where the id is already in the set
+        """
+        return _sorted_contains(self._sorted, hashes) | _sorted_contains(self._pending, hashes)
+
+    def add(self, hashes: np.ndarray) -> None:
+        """
+        Add hashed ids to the set
+        :param hashes: hashed ids, as returned by hash_ids
+        """
+        self._check_memory(self.nbytes + 2 * (self._pending.nbytes + hashes.nbytes))
+        self._pending = np.union1d(self._pending, hashes)
+        if len(self._pending) > max(MIN_MERGE_SIZE, MERGE_FRACTION * len(self._sorted)):
+            self._check_memory(2 * self.nbytes)
+            self._sorted = np.union1d(self._sorted, self._pending)
+            self._pending = np.empty(0, dtype=np.uint64)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Add hashed ids to the set, reporting which of them were not already present
+        :param hashes: hashed ids, as returned by hash_ids
+        :return: a boolean mask, True where the id was not already in the set
+        """
+        new_mask = ~self.contains(hashes)
+        self.add(hashes[new_mask])
+        return new_mask
+
+    def summary(self) -> str:
+        """A one-line description of the size of the set"""
+        return f"{len(self)} ids, {self.nbytes / 2 ** 20:.1f} MB (peak {self.peak_nbytes / 2 ** 20:.1f} MB)"
+
+
+class DuplicateFilter:
+    """
+    Drops the rows of a stream of frames (e.g. the features fetched for several areas) whose key has already been
+    seen, counting the rows kept and dropped for each source of frames
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        :param max_bytes: optional memory ceiling for the keys seen (see HashedIdSet)
+        """
+        self.seen = HashedIdSet(max_bytes)
+        self.kept: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+
+    def filter(self, frame: Frame, hashes: np.ndarray, source: str = "") -> Frame:
+        """
+        :param frame: the rows to filter
+        :param hashes: the hashed key of each row, as returned by hash_ids
+        :param source: where the rows come from (e.g. an area name), for the report
+        :return: the rows whose key has not been seen before (only the first of rows with the same key is kept)
+        """
+        first_occurrence = np.zeros(len(hashes), dtype=bool)
+        first_occurrence[np.unique(hashes, return_index=True)[1]] = True
+        new_mask = first_occurrence & ~self.seen.contains(hashes)
+        self.seen.add(hashes[new_mask])
+        self.kept[source] = self.kept.get(source, 0) + int(new_mask.sum())
+        self.dropped[source] = self.dropped.get(source, 0) + int((~new_mask).sum())
+        return frame[new_mask]
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: the number of rows kept and dropped, for each source and in total
+        """
+        sources = {source: {"kept": self.kept[source], "dropped": self.dropped[source]} for source in self.kept}
+        total = {"kept": sum(self.kept.values()), "dropped": sum(self.dropped.values())}
+        return {"sources": sources, "total": total}
+
+    def write_report(self, path: str) -> None:
+        """
+        :param path: the JSON file to write the report to
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def summary(self) -> str:
+        """A one-line description of the duplicates dropped"""
+        dropped = ", ".join(f"{count} from {source or 'all'}" for source, count in self.dropped.items())
+        return f"Dropped {sum(self.dropped.values())} duplicates ({dropped}), kept {sum(self.kept.values())} rows"
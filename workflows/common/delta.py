@@ -0,0 +1,217 @@
+"""
+Change-only refresh of keyed snapshots (e.g. the NCR charge points, keyed on chargeDeviceID).
+
+Each row of a new snapshot is given a fingerprint (a 64-bit hash of its values), and the fingerprints are compared
+with those of the previous snapshot to find the rows that were added, changed or removed. Only those rows are
+appended to the history, a directory of Parquet files in which each row records a change to one key:
+
+    <key columns>, <value columns>   the values of the row (for a removed row, its last values)
+    fingerprint                      the hash of the values
+    change                           "added", "changed" or "removed"
+    version                          the version of the snapshot that made the change (1, 2, ...)
+    snapshotTime                     when that snapshot was taken (UTC, ISO 8601)
+
+so a snapshot of any version is the last change to each key up to that version, less the removed keys. Each refresh
+writes one small file ("<first version>-<last version>.parquet"), and compact() merges them into one when they
+build up. Changing the value columns (or their types) changes every fingerprint, so the next refresh records every
+row as changed.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FINGERPRINT_COLUMN = "fingerprint"
+CHANGE_COLUMN = "change"
+VERSION_COLUMN = "version"
+SNAPSHOT_TIME_COLUMN = "snapshotTime"
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+CHANGES = [ADDED, CHANGED, REMOVED]
+VERSION_DIGITS = 6
+# compact() merges the history files once there are more than this many
+DEFAULT_MAX_FILES = 64
+
+
+def fingerprint_rows(df: pd.DataFrame, columns: Optional[Sequence[str]] = None) -> pd.Series:
+    """
+    Hash the values of each row. The hash is deterministic, so fingerprints written by one run can be compared with
+    those of the next, as long as the columns and their types are the same.
+    :param df: the rows
+    :param columns: the columns to hash (defaults to all of them)
+    :return: a uint64 Series of the fingerprints, with the index of df
+    """
+    return pd.util.hash_pandas_object(df[list(columns) if columns is not None else df.columns], index=False)
+
+
+@dataclass(frozen=True)
+class SnapshotDelta:
+    """
+    The differences between two snapshots. Each frame has the value columns and the fingerprint of its rows; removed
+    rows have their last values.
+    """
+
+    added: pd.DataFrame
+    changed: pd.DataFrame
+    removed: pd.DataFrame
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: the added, changed and removed rows, with a "change" column saying which they are
+        """
+        frames = [
+            frame.assign(**{CHANGE_COLUMN: change})
+            for change, frame in zip(CHANGES, [self.added, self.changed, self.removed])
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self) -> str:
+        """
+        :return: a description of the number of rows of each change
+        """
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+def diff_snapshots(current: pd.DataFrame, previous: pd.DataFrame, key: str) -> SnapshotDelta:
+    """
+    :param current: the new snapshot, with unique keys and a fingerprint column
+    :param previous: the previous snapshot, with unique keys and a fingerprint column
+    :param key: the column identifying a row
+    :return: the rows of current that are not in previous or whose fingerprint differs, and the rows of previous
+        that are not in current
+    """
+    previous_fingerprints = previous.set_index(key)[FINGERPRINT_COLUMN]
+    in_previous = current[key].isin(previous_fingerprints.index)
+    matched_fingerprints = previous_fingerprints.reindex(current.loc[in_previous, key]).to_numpy()
+    differs = current.loc[in_previous, FINGERPRINT_COLUMN].to_numpy() != matched_fingerprints
+    return SnapshotDelta(
+        added=current[~in_previous].reset_index(drop=True),
+        changed=current[in_previous][differs].reset_index(drop=True),
+        removed=previous[~previous[key].isin(current[key])].reset_index(drop=True),
+    )
+
+
+def _history_file_name(first_version: int, last_version: int) -> str:
+    return f"{first_version:0{VERSION_DIGITS}d}-{last_version:0{VERSION_DIGITS}d}.parquet"
+
+
+def _history_file_versions(path: Path) -> Tuple[int, int]:
+    first_version, last_version = path.stem.split("-")
+    return int(first_version), int(last_version)
+
+
+class SnapshotHistory:
+    """
+    The versioned history of a keyed snapshot (see the module docstring)
+    """
+
+    def __init__(self, directory: str, key: str, columns: Sequence[str]):
+        """
+        :param directory: the directory of the history files (created when the first version is written)
+        :param key: the column identifying a row
+        :param columns: the value columns, including the key, that are fingerprinted and kept
+        """
+        self.directory = Path(directory)
+        self.key = key
+        self.columns = list(columns)
+
+    def files(self) -> List[Path]:
+        """
+        :return: the history files, oldest first
+        """
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.parquet"), key=_history_file_versions)
+
+    @property
+    def latest_version(self) -> int:
+        """The version of the latest snapshot, or 0 if there is none"""
+        files = self.files()
+        return _history_file_versions(files[-1])[1] if files else 0
+
+    def read(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        :param columns: the columns to read (defaults to all of them)
+        :return: every change, oldest first
+        """
+        files = self.files()
+        if not files:
+            return pd.DataFrame(columns=list(columns) if columns is not None else [])
+        return pd.concat([pd.read_parquet(path, columns=columns) for path in files], ignore_index=True)
+
+    def snapshot(self, version: Optional[int] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        :param version: the version (defaults to the latest)
+        :param columns: the columns to read, which must include the key and change columns (defaults to all of them)
+        :return: the rows of the snapshot, in the order they were last changed
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys([*columns, VERSION_COLUMN]))
+        changes = self.read(columns)
+        if changes.empty:
+            return changes
+        if version is not None:
+            changes = changes[changes[VERSION_COLUMN] <= version]
+        latest = changes.drop_duplicates(subset=self.key, keep="last")
+        return latest[latest[CHANGE_COLUMN] != REMOVED].reset_index(drop=True)
+
+    def diff(self, current: pd.DataFrame) -> SnapshotDelta:
+        """
+        :param current: the new snapshot, with the value columns. Rows with the same key as a later row are dropped
+        :return: the changes since the latest snapshot, with fingerprints
+        """
+        current = current[self.columns].drop_duplicates(subset=self.key, keep="last").reset_index(drop=True)
+        current[FINGERPRINT_COLUMN] = fingerprint_rows(current, self.columns).to_numpy()
+        previous = self.snapshot(columns=[*self.columns, FINGERPRINT_COLUMN, CHANGE_COLUMN])
+        if previous.empty:
+            previous = current.iloc[:0]
+        return diff_snapshots(current, previous[[*self.columns, FINGERPRINT_COLUMN]], self.key)
+
+    def append(self, delta: SnapshotDelta, snapshot_time: Optional[datetime] = None) -> int:
+        """
+        Record the changes as a new version. Nothing is written if there are no changes.
+        :param delta: the changes since the latest snapshot (from diff)
+        :param snapshot_time: when the new snapshot was taken (defaults to now)
+        :return: the new version, or the latest version if there were no changes
+        """
+        version = self.latest_version
+        if not len(delta):
+            return version
+        version += 1
+        snapshot_time = snapshot_time or datetime.now(timezone.utc)
+        changes = delta.to_frame().assign(
+            **{VERSION_COLUMN: version, SNAPSHOT_TIME_COLUMN: snapshot_time.isoformat(timespec="seconds")}
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._write(changes, _history_file_name(version, version))
+        return version
+
+    def _write(self, changes: pd.DataFrame, file_name: str) -> None:
+        # written under a temporary name, so a failed write leaves no partial version
+        temporary_path = self.directory / f"{file_name}.tmp"
+        pq.write_table(pa.Table.from_pandas(changes, preserve_index=False), temporary_path)
+        temporary_path.replace(self.directory / file_name)
+
+    def compact(self, max_files: int = DEFAULT_MAX_FILES) -> bool:
+        """
+        Merge the history files into one, keeping every change, if there are more than max_files of them
+        :param max_files: the number of files to allow
+        :return: whether the files were merged
+        """
+        files = self.files()
+        if len(files) <= max_files:
+            return False
+        merged_name = _history_file_name(_history_file_versions(files[0])[0], _history_file_versions(files[-1])[1])
+        self._write(self.read(), merged_name)
+        for path in files:
+            if path.name != merged_name:
+                path.unlink()
+        return True
@@ -0,0 +1,101 @@
+"""
+Fast detection of the text encoding of third-party files (e.g. downloaded CSVs).
+"""
+import codecs
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from chardet.universaldetector import UniversalDetector
+
+BLOCK_SIZE = 2 ** 20
+# chardet is slow (pure Python), so it is fed small blocks, to stop as soon as it is confident, and at most
+# MAX_DETECTION_BYTES of the file
+DETECTION_BLOCK_SIZE = 2 ** 16
+MAX_DETECTION_BYTES = 2 * 2 ** 20
+
+CACHE_FILE_NAME = ".encoding-cache.json"
+
+
+def _cache_path(file_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_FILE_NAME)
+
+
+def _load_cache(file_path: str) -> Dict[str, str]:
+    try:
+        with open(_cache_path(file_path), encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_to_cache(file_path: str, file_hash: str, encoding: str) -> None:
+    cache = _load_cache(file_path)
+    cache[file_hash] = encoding
+    with open(_cache_path(file_path), "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=2)
+
+
+def _detect_with_chardet(file_path: str, offset: int) -> Optional[str]:
+    detector = UniversalDetector()
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        bytes_read = 0
+        while not detector.done and bytes_read < MAX_DETECTION_BYTES:
+            block = file.read(DETECTION_BLOCK_SIZE)
+            if not block:
+                break
+            detector.feed(block)
+            bytes_read += len(block)
+    detector.close()
+    return detector.result["encoding"]
+
+
+def detect_encoding(file_path: str) -> str:
+    """
+    Get the encoding of a file.
+    The file is read once, in blocks, to hash it and check whether it is valid UTF-8 (which is fast and covers most
+    files). Only if it is not is chardet used, fed incrementally until it is confident, starting from the block
+    where the first non-UTF-8 data was found (an ASCII prefix tells it nothing). Its result is cached against the
+    hash of the file contents in a ".encoding-cache.json" file alongside it, so unchanged files are not re-detected.
+    :param file_path: the file to inspect
+    :return: the name of the encoding, suitable for pandas.read_csv / open
+    """
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="strict")
+    is_utf8 = True
+    first_invalid_block_offset = 0
+    has_bom = False
+    offset = 0
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+            digest.update(block)
+            if offset == 0:
+                has_bom = block.startswith(codecs.BOM_UTF8)
+            if is_utf8:
+                try:
+                    decoder.decode(block)
+                except UnicodeDecodeError:
+                    is_utf8 = False
+                    first_invalid_block_offset = offset
+            offset += len(block)
+    if is_utf8:
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            is_utf8 = False
+            first_invalid_block_offset = max(0, offset - BLOCK_SIZE)
+
+    if is_utf8:
+        return "utf-8-sig" if has_bom else "utf-8"
+
+    file_hash = digest.hexdigest()
+    cached_encoding = _load_cache(file_path).get(file_hash)
+    if cached_encoding is not None:
+        return cached_encoding
+
+    encoding = _detect_with_chardet(file_path, first_invalid_block_offset) or "utf-8"
+    print(f"Detected encoding {encoding} for {file_path}")
+    _save_to_cache(file_path, file_hash, encoding)
+    return encoding
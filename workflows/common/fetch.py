@@ -0,0 +1,263 @@
+"""
+Streamed, restartable download of source datasets.
+
+Downloads are written to disk in chunks as they arrive. An interrupted download is resumed with an HTTP range
+request, and a file that is already present is only downloaded again if the server reports that it has changed
+(using the ETag / Last-Modified validators from the previous download). The validators and a SHA-256 checksum of
+each file are recorded next to it in "<file>.fetch.json".
+
+DVC removes the outputs of a stage before running it, so the download outputs are declared with "persist: true" in
+the dvc.yaml files, leaving the previous download in place for the conditional request.
+
+The download scripts use this as a command line tool, fetching all their files over one pooled session:
+
+    python ../common/fetch.py URL OUTPUT_FILE [URL OUTPUT_FILE ...] [--header "accept: application/json"]
+        [--metrics STAGE]
+
+This module only depends on the standard library, requests and metrics.py, so it can be run directly as a script.
+"""
+import argparse
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from .metrics import span, stage_metrics
+except ImportError:
+    # run as a script, with this directory on the path
+    from metrics import span, stage_metrics  # type: ignore
+
+CHUNK_SIZE = 2 ** 20
+TIMEOUT_SECONDS = 60
+# number of times an interrupted transfer is resumed before giving up
+MAX_RESUMES = 5
+
+METADATA_SUFFIX = ".fetch.json"
+PARTIAL_SUFFIX = ".part"
+
+NOT_MODIFIED = "not-modified"
+DOWNLOADED = "downloaded"
+RESUMED = "resumed"
+
+
+@dataclass
+class FetchRecord:
+    """What is recorded about a downloaded file"""
+
+    url: str
+    size: int
+    sha256: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: str
+
+
+def _metadata_path(path: str) -> str:
+    return path + METADATA_SUFFIX
+
+
+def load_record(path: str) -> Optional[FetchRecord]:
+    """
+    :param path: a downloaded file
+    :return: the record of how the file was downloaded, or None if there isn't one
+    """
+    try:
+        with open(_metadata_path(path), encoding="utf-8") as file:
+            return FetchRecord(**json.load(file))
+    except (FileNotFoundError, TypeError, ValueError):
+        return None
+
+
+def _save_record(path: str, record: FetchRecord) -> None:
+    with open(_metadata_path(path), "w", encoding="utf-8") as file:
+        json.dump(asdict(record), file, indent=2)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _complete_length(response: requests.Response) -> Optional[int]:
+    # the length of the whole file, from a "Content-Range: bytes */<length>" header
+    _, _, length = response.headers.get("Content-Range", "").rpartition("/")
+    return int(length) if length.isdigit() else None
+
+
+def file_sha256(path: str) -> str:
+    """
+    :param path: the file to hash
+    :return: the hex SHA-256 digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def create_session(pool_size: int = 4, retries: int = 5) -> requests.Session:
+    """
+    Create a session with a connection pool and retries (with exponential backoff) for failed connections and
+    transient server errors
+    :param pool_size: the number of connections kept open per host
+    :param retries: the number of times a request is retried
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Fetcher:
+    """
+    Downloads files over a shared, pooled session. See the module docstring for the behaviour.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        headers: Optional[Dict[str, str]] = None,
+        chunk_size: int = CHUNK_SIZE,
+        timeout: float = TIMEOUT_SECONDS,
+    ):
+        """
+        :param session: the session to use (e.g. one pointed at a local stand-in server). Defaults to a new
+            pooled session with retries
+        :param headers: extra headers sent with every request
+        :param chunk_size: the number of bytes read from the response and written to disk at a time
+        :param timeout: connect/read timeout in seconds
+        """
+        self.session = session if session is not None else create_session()
+        self.headers = headers or {}
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def _request(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        # ask for the raw bytes, so ranges and checksums refer to the file rather than a compressed transfer
+        request_headers = {"Accept-Encoding": "identity", **self.headers, **headers}
+        response = self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout)
+        if response.status_code not in (200, 206, 304, 416):
+            response.raise_for_status()
+        return response
+
+    def fetch(self, url: str, path: str) -> str:
+        """
+        Download url to path, unless the file at path is already up to date
+        :param url: the URL to download
+        :param path: where to save the file
+        :return: one of "downloaded", "resumed" (an earlier partial download was completed) or "not-modified"
+        """
+        with span("download"):
+            return self._fetch(url, path)
+
+    def _fetch(self, url: str, path: str) -> str:
+        record = load_record(path)
+        headers = {}
+        if record is not None and record.url == url and os.path.isfile(path):
+            if record.etag:
+                headers["If-None-Match"] = record.etag
+            if record.last_modified:
+                headers["If-Modified-Since"] = record.last_modified
+
+        partial_path = path + PARTIAL_SUFFIX
+        status = DOWNLOADED
+        for _ in range(MAX_RESUMES + 1):
+            partial_record = load_record(partial_path)
+            range_headers = {}
+            if partial_record is not None and partial_record.url == url and os.path.isfile(partial_path):
+                validator = partial_record.etag or partial_record.last_modified
+                if validator:
+                    # If-Range makes the server send the whole file if it has changed since the partial download
+                    range_headers = {"Range": f"bytes={os.path.getsize(partial_path)}-", "If-Range": validator}
+
+            with self._request(url, {**headers, **range_headers}) as response:
+                if response.status_code == 304:
+                    print(f"{path} is up to date")
+                    return NOT_MODIFIED
+                if response.status_code == 416:
+                    if range_headers and _complete_length(response) == os.path.getsize(partial_path):
+                        # the range starts at the end of the file, so the partial download is already complete
+                        status = RESUMED
+                        break
+                    # the server can't send the rest of the partial file (e.g. the file has been replaced with a
+                    # shorter one), so start again
+                    _remove(partial_path)
+                    _remove(_metadata_path(partial_path))
+                    continue
+
+                resuming = response.status_code == 206
+                partial_record = FetchRecord(
+                    url=url,
+                    size=0,
+                    sha256="",
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    fetched_at=datetime.now(timezone.utc).isoformat(),
+                )
+                _save_record(partial_path, partial_record)
+                try:
+                    with open(partial_path, "ab" if resuming else "wb") as file:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            file.write(chunk)
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as error:
+                    print(f"Download of {url} was interrupted ({error}), resuming")
+                    status = RESUMED
+                    continue
+                status = RESUMED if resuming else status
+                break
+        else:
+            raise RuntimeError(f"Download of {url} failed after {MAX_RESUMES} resumes")
+
+        os.replace(partial_path, path)
+        _remove(_metadata_path(partial_path))
+        partial_record.size = os.path.getsize(path)
+        partial_record.sha256 = file_sha256(path)
+        _save_record(path, partial_record)
+        print(f"{status.capitalize()} {url} to {path} ({partial_record.size} bytes, sha256 {partial_record.sha256})")
+        return status
+
+    def fetch_all(self, downloads: List[List[str]]) -> None:
+        """
+        :param downloads: (url, path) pairs to download in turn over the shared session
+        """
+        for url, path in downloads:
+            self.fetch(url, path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Streamed, restartable download of one or more files")
+    parser.add_argument("downloads", nargs="+", help="URL OUTPUT_FILE pairs")
+    parser.add_argument("--header", action="append", default=[], help='extra request header, e.g. "accept: */*"')
+    parser.add_argument("--metrics", metavar="STAGE", help='write the download metrics to "<STAGE>-metrics.json"')
+    args = parser.parse_args()
+
+    if len(args.downloads) % 2 != 0:
+        parser.error("expected pairs of URL and OUTPUT_FILE")
+    headers = dict(header.split(":", maxsplit=1) for header in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+
+    downloads = [args.downloads[i : i + 2] for i in range(0, len(args.downloads), 2)]
+    if args.metrics:
+        with stage_metrics(args.metrics):
+            Fetcher(headers=headers).fetch_all(downloads)
+    else:
+        Fetcher(headers=headers).fetch_all(downloads)
+
+
+if __name__ == "__main__":
+    main()
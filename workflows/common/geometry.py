@@ -0,0 +1,40 @@
+"""
+Vectorized geometry operations on whole GeoSeries, using pygeos (the geopandas backend) rather than per-geometry
+shapely calls.
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+from geopandas.array import GeometryArray
+
+
+def to_pygeos(geoseries: gpd.GeoSeries) -> np.ndarray:
+    """
+    :param geoseries: the geometries
+    :return: an array of pygeos geometries (without copying them when geopandas uses pygeos)
+    """
+    if gpd.options.use_pygeos:
+        return geoseries.values.data
+    return pygeos.from_shapely(np.asarray(geoseries.values.data))
+
+
+def from_pygeos(geometries: np.ndarray, index: pd.Index, crs=None) -> gpd.GeoSeries:
+    """
+    :param geometries: an array of pygeos geometries
+    :param index: the index of the GeoSeries
+    :param crs: the CRS of the geometries
+    :return: a GeoSeries of the geometries
+    """
+    if not gpd.options.use_pygeos:
+        geometries = pygeos.to_shapely(geometries)
+    return gpd.GeoSeries(GeometryArray(geometries, crs=crs), index=index)
+
+
+def force_2d(geoseries: gpd.GeoSeries) -> gpd.GeoSeries:
+    """
+    Drop the Z coordinate of every geometry in one vectorized call
+    :param geoseries: the geometries, which may have Z coordinates
+    :return: the same geometries with only X and Y coordinates
+    """
+    return from_pygeos(pygeos.force_2d(to_pygeos(geoseries)), geoseries.index, geoseries.crs)
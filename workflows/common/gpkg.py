@@ -0,0 +1,184 @@
+"""
+Chunked reading of large GeoPackage layers (e.g. the OS OpenMap Local buildings written by the land-use workflow).
+
+geopandas.read_file reads a whole layer into memory and builds a shapely geometry for each feature through fiona.
+Here the layer table is read straight from the SQLite database in chunks of rows, and the geometry blobs of each
+chunk are decoded with one vectorized pygeos call, so a layer of tens of millions of features can be streamed. The
+features within some bounds can be read on their own, found through the R*Tree spatial index GDAL creates with each
+layer.
+"""
+import sqlite3
+from contextlib import closing
+from typing import Iterator, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+from .geometry import from_pygeos
+from .metrics import span
+
+DEFAULT_CHUNK_SIZE = 250_000
+
+# A GeoPackage geometry blob is a header (the magic "GP", a version, a flags byte and an SRS id) followed by an
+# optional envelope, whose size is given by bits 1-3 of the flags, then the geometry as WKB
+HEADER_SIZE = 8
+ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+
+def gpkg_blob_to_wkb(blob: Optional[bytes]) -> Optional[bytes]:
+    """
+    :param blob: a GeoPackage geometry blob
+    :return: the WKB of the geometry, or None for a missing geometry
+    """
+    if blob is None:
+        return None
+    envelope_indicator = (blob[3] >> 1) & 0b111
+    return blob[HEADER_SIZE + ENVELOPE_SIZES[envelope_indicator] :]
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _layer_table(connection: sqlite3.Connection, layer: Optional[str]) -> Tuple[str, str, Optional[str]]:
+    query = "SELECT table_name, column_name, srs_id FROM gpkg_geometry_columns"
+    rows = connection.execute(query + " WHERE table_name = ?", (layer,)) if layer else connection.execute(query)
+    tables = rows.fetchall()
+    if len(tables) != 1:
+        raise ValueError(f"Expected one geometry layer named {layer!r}, found {[table[0] for table in tables]}")
+    table_name, geometry_column, srs_id = tables[0]
+    organization, organization_id, definition = connection.execute(
+        "SELECT organization, organization_coordsys_id, definition FROM gpkg_spatial_ref_sys WHERE srs_id = ?",
+        (srs_id,),
+    ).fetchone()
+    if organization.upper() == "EPSG":
+        crs = f"EPSG:{organization_id}"
+    else:
+        # the undefined cartesian and geographic systems have no definition
+        crs = definition if definition != "undefined" else None
+    return table_name, geometry_column, crs
+
+
+def _spatial_index(connection: sqlite3.Connection, table_name: str, geometry_column: str) -> Optional[str]:
+    # the R*Tree of the layer, which GDAL names rtree_<table>_<geometry column>
+    index_name = f"rtree_{table_name}_{geometry_column}"
+    exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (index_name,)).fetchone()
+    return index_name if exists else None
+
+
+def _primary_key(connection: sqlite3.Connection, table_name: str) -> str:
+    columns = connection.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()
+    return next(column[1] for column in columns if column[5])
+
+
+def gpkg_extent(
+    path: str, layer: Optional[str] = None
+) -> Tuple[Optional[Tuple[float, float, float, float]], Optional[str]]:
+    """
+    :param path: the GeoPackage file
+    :param layer: the layer. May be omitted if the file has a single layer
+    :return: the bounds of the features of the layer (None if it has none), and the CRS of the layer
+    """
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+        table_name, geometry_column, crs = _layer_table(connection, layer)
+        index_name = _spatial_index(connection, table_name, geometry_column)
+        if index_name is not None:
+            bounds = connection.execute(
+                f"SELECT min(minx), min(miny), max(maxx), max(maxy) FROM {_quote(index_name)}"
+            ).fetchone()
+            return (bounds if bounds[0] is not None else None), crs
+    # without a spatial index, the bounds of every chunk of the layer
+    chunk_bounds = np.array([chunk.total_bounds for chunk in iter_gpkg_chunks(path, layer=layer)]).reshape(-1, 4)
+    if np.isnan(chunk_bounds).all():
+        return None, crs
+    return (*np.nanmin(chunk_bounds[:, :2], axis=0), *np.nanmax(chunk_bounds[:, 2:], axis=0)), crs
+
+
+def iter_gpkg_chunks(
+    path: str,
+    columns: Sequence[str] = (),
+    layer: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    bounds: Optional[Tuple[float, float, float, float]] = None,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Read a GeoPackage layer in chunks of rows
+    :param path: the GeoPackage file
+    :param columns: the attribute columns to read (the geometry is always read)
+    :param layer: the layer to read. May be omitted if the file has a single layer
+    :param chunk_size: the number of features in each chunk
+    :param bounds: only read the features whose bounding box intersects these bounds (minx, miny, maxx, maxy), in
+        the CRS of the layer. They are found through the spatial index of the layer; without one, the whole layer is
+        read and filtered
+    :return: an iterator over the chunks, each a GeoDataFrame with the columns and the geometry
+    """
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+        table_name, geometry_column, crs = _layer_table(connection, layer)
+        selected_columns = ", ".join(_quote(column) for column in [*columns, geometry_column])
+        query = f"SELECT {selected_columns} FROM {_quote(table_name)}"
+        index_name = _spatial_index(connection, table_name, geometry_column) if bounds is not None else None
+        if index_name is not None:
+            query += (
+                f" WHERE {_quote(_primary_key(connection, table_name))} IN (SELECT id FROM {_quote(index_name)}"
+                " WHERE maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?)"
+            )
+            cursor = connection.execute(query, (bounds[0], bounds[2], bounds[1], bounds[3]))
+        else:
+            cursor = connection.execute(query)
+        while True:
+            with span("read") as read_span:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                df = pd.DataFrame(rows, columns=[*columns, geometry_column])
+                wkbs = np.array([gpkg_blob_to_wkb(blob) for blob in df.pop(geometry_column)], dtype=object)
+                geometries = pygeos.from_wkb(wkbs)
+                if bounds is not None and index_name is None:
+                    envelopes = pygeos.bounds(geometries)
+                    inside = (
+                        (envelopes[:, 2] >= bounds[0])
+                        & (envelopes[:, 0] <= bounds[2])
+                        & (envelopes[:, 3] >= bounds[1])
+                        & (envelopes[:, 1] <= bounds[3])
+                    )
+                    df, geometries = df[inside].reset_index(drop=True), geometries[inside]
+                chunk = gpd.GeoDataFrame(df, geometry=from_pygeos(geometries, df.index, crs))
+                read_span.rows_in += len(chunk)
+            yield chunk
+
+
+def index_gpkg_column(path: str, column: str, layer: Optional[str] = None) -> None:
+    """
+    Index an attribute column of a GeoPackage layer, e.g. so its features can be deleted by that column quickly
+    :param path: the GeoPackage file
+    :param column: the column to index
+    :param layer: the layer. May be omitted if the file has a single layer
+    """
+    with closing(sqlite3.connect(path)) as connection:
+        table_name, _, _ = _layer_table(connection, layer)
+        with connection:
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(f'{table_name}_{column}')} "
+                f"ON {_quote(table_name)} ({_quote(column)})"
+            )
+
+
+def delete_gpkg_features(path: str, column: str, values: Sequence, layer: Optional[str] = None) -> int:
+    """
+    Delete the features of a GeoPackage layer with any of the values in a column, in place. The spatial index and
+    feature count of the layer are kept up to date by the triggers GDAL created with the layer.
+    :param path: the GeoPackage file
+    :param column: the column to match
+    :param values: the values of the features to delete
+    :param layer: the layer. May be omitted if the file has a single layer
+    :return: the number of features deleted
+    """
+    with closing(sqlite3.connect(path)) as connection:
+        table_name, _, _ = _layer_table(connection, layer)
+        with connection:
+            cursor = connection.executemany(
+                f"DELETE FROM {_quote(table_name)} WHERE {_quote(column)} = ?", [(value,) for value in values]
+            )
+        return cursor.rowcount
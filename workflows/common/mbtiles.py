@@ -0,0 +1,67 @@
+"""
+Writing of MBTiles archives (https://github.com/mapbox/mbtiles-spec/blob/master/1.3/spec.md): a single SQLite file
+holding every tile of a tileset, which a tile server (or a browser, with a range-request reader) serves tile by tile.
+
+MBTiles numbers the rows of tiles from the south (the TMS scheme), whereas web maps number them from the north (the
+XYZ scheme), so tiles are written here by their XYZ coordinates and flipped on the way in.
+"""
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict
+
+
+def tms_row(zoom: int, y: int) -> int:
+    """
+    :param zoom: the zoom level of the tile
+    :param y: the row of the tile, numbered from the north
+    :return: the row of the tile, numbered from the south
+    """
+    return (1 << zoom) - 1 - y
+
+
+class MBTilesWriter:
+    """Writes tiles to a new MBTiles file, replacing any existing file"""
+
+    def __init__(self, path: str, metadata: Dict[str, Any]):
+        """
+        :param path: the file to write
+        :param metadata: the metadata of the tileset (name, format, bounds, minzoom, maxzoom, json...). Values that
+            are not strings are written as JSON
+        """
+        Path(path).unlink(missing_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        self.connection.execute(
+            "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)"
+        )
+        self.connection.executemany(
+            "INSERT INTO metadata (name, value) VALUES (?, ?)",
+            [(name, value if isinstance(value, str) else json.dumps(value)) for name, value in metadata.items()],
+        )
+        self.n_tiles = 0
+
+    def __enter__(self) -> "MBTilesWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, zoom: int, x: int, y: int, data: bytes) -> None:
+        """
+        :param zoom: the zoom level of the tile
+        :param x: the column of the tile
+        :param y: the row of the tile, numbered from the north
+        :param data: the encoded tile (gzip-compressed, for vector tiles)
+        """
+        self.connection.execute(
+            "INSERT INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+            (zoom, x, tms_row(zoom, y), sqlite3.Binary(data)),
+        )
+        self.n_tiles += 1
+
+    def close(self) -> None:
+        """Index the tiles and close the file"""
+        self.connection.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,220 @@
+"""
+Lightweight instrumentation of the workflow stages: named spans recording their wall time, peak memory, rows in and
+out, and bytes read and written, written to a JSON metrics file per stage (declared as DVC metrics, so
+`dvc metrics show -R` / `dvc metrics diff` compare runs).
+
+A stage wraps its main function in stage_metrics("<stage>"), and its steps (and the shared readers and writers in
+common) in span("<step>"). Spans may be nested, and spans with the same name are summed. Outside stage_metrics, spans
+are measured but not recorded. Spans may run in several threads at once (e.g. downloads in a thread pool), in which
+case their times and bytes overlap, so may add up to more than those of the stage.
+
+    with stage_metrics("charge-points"):
+        with span("parse") as parse_span:
+            df = read_csv(...)
+            parse_span.rows_in += len(df)
+
+Each span records:
+    seconds                        the wall time
+    peak_rss_mb                    the peak resident memory of the stage's process during the span (on Linux; where
+                                   the peak cannot be reset, the peak of the process so far)
+    peak_child_rss_mb              the peak resident memory of the largest worker process that has exited so far
+    rows_in, rows_out              counted by the stage, and the rows per second of whichever is larger
+    bytes_read, bytes_written      the bytes read and written by the stage's process, including from the network
+                                   (Linux only)
+    disk_bytes_read, disk_bytes_written  the part of those that reached the disk (Linux only)
+"""
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+PROC_STATUS = Path("/proc/self/status")
+PROC_IO = Path("/proc/self/io")
+PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+# writing this to clear_refs resets the peak resident memory (VmHWM) of the process
+RESET_PEAK_RSS = "5"
+# the /proc/self/io counters, and the metrics they are recorded as
+IO_COUNTERS = {
+    "rchar": "bytes_read",
+    "wchar": "bytes_written",
+    "read_bytes": "disk_bytes_read",
+    "write_bytes": "disk_bytes_written",
+}
+METRICS_FILE_TEMPLATE = "{stage}-metrics.json"
+TOTAL_SPAN = "total"
+BYTES_PER_MB = 2 ** 20
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss() -> int:
+    """
+    :return: the peak resident memory of this process since it started or the peak was last reset, in bytes
+    """
+    try:
+        for line in PROC_STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT
+
+
+def reset_peak_rss() -> None:
+    """Reset the peak resident memory of this process to its current resident memory, where the OS allows it"""
+    try:
+        PROC_CLEAR_REFS.write_text(RESET_PEAK_RSS)
+    except OSError:
+        pass
+
+
+def io_counters() -> Dict[str, int]:
+    """
+    :return: the bytes read and written by this process so far, keyed by metric name (empty if not available)
+    """
+    try:
+        lines = PROC_IO.read_text().splitlines()
+    except OSError:
+        return {}
+    counters = dict(line.split(": ") for line in lines)
+    return {metric: int(counters[counter]) for counter, metric in IO_COUNTERS.items() if counter in counters}
+
+
+@dataclass
+class Span:
+    """
+    A step of a stage, being measured. The stage counts the rows the step reads and writes
+    """
+
+    name: str
+    rows_in: int = 0
+    rows_out: int = 0
+    seconds: float = 0.0
+    peak_rss: int = 0
+
+
+class StageMetrics:
+    """The spans recorded in a stage, summed by name"""
+
+    def __init__(self, stage: str, path: Optional[str] = None):
+        """
+        :param stage: the name of the stage
+        :param path: the metrics file (by default "<stage>-metrics.json")
+        """
+        self.stage = stage
+        self.path = path or METRICS_FILE_TEMPLATE.format(stage=stage)
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, span: Span, io_bytes: Dict[str, int]) -> None:
+        """
+        :param span: a span that has ended
+        :param io_bytes: the bytes read and written during the span
+        """
+        with self._lock:
+            self._record(span, io_bytes)
+
+    def _record(self, span: Span, io_bytes: Dict[str, int]) -> None:
+        totals = self.spans.setdefault(span.name, {"calls": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0})
+        totals["calls"] += 1
+        totals["seconds"] += span.seconds
+        totals["rows_in"] += span.rows_in
+        totals["rows_out"] += span.rows_out
+        totals["peak_rss_mb"] = max(totals.get("peak_rss_mb", 0), span.peak_rss / BYTES_PER_MB)
+        child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * MAXRSS_UNIT / BYTES_PER_MB
+        if child_peak:
+            totals["peak_child_rss_mb"] = child_peak
+        for metric, value in io_bytes.items():
+            totals[metric] = totals.get(metric, 0) + value
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: the metrics of each span, by name
+        """
+        report = {}
+        for name, totals in self.spans.items():
+            metrics = {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()}
+            rows = max(totals["rows_in"], totals["rows_out"])
+            if rows and totals["seconds"] > 0:
+                metrics["rows_per_second"] = round(rows / totals["seconds"], 1)
+            report[name] = metrics
+        return report
+
+    def write(self) -> None:
+        """Write the metrics file"""
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+
+# the metrics of the running stage, and the spans that have started and not yet ended in any thread (in the order
+# they started). Spans are opened and closed from worker threads, so the list is only used with the lock held
+_STAGE: Optional[StageMetrics] = None
+_OPEN_SPANS: List[Span] = []
+_OPEN_SPANS_LOCK = threading.Lock()
+
+
+def _observe_peak_rss() -> None:
+    # the peak since the last reset is the peak of part of every open span; resetting it after each observation
+    # gives each span the peak of its own part of the run. Called with _OPEN_SPANS_LOCK held
+    peak = peak_rss()
+    for open_span in _OPEN_SPANS:
+        open_span.peak_rss = max(open_span.peak_rss, peak)
+    reset_peak_rss()
+
+
+def _close_span(current: Span) -> None:
+    # by identity, as Span compares by value and another thread may have an equal span open
+    with _OPEN_SPANS_LOCK:
+        _observe_peak_rss()
+        for i, open_span in enumerate(_OPEN_SPANS):
+            if open_span is current:
+                del _OPEN_SPANS[i]
+                break
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    """
+    Measure a step of the running stage
+    :param name: the name of the step (e.g. "download", "parse", "write")
+    :return: the span, whose rows_in and rows_out the step may add to
+    """
+    with _OPEN_SPANS_LOCK:
+        _observe_peak_rss()
+        current = Span(name, peak_rss=peak_rss())
+        _OPEN_SPANS.append(current)
+    io_start = io_counters()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        io_end = io_counters()
+        _close_span(current)
+        if _STAGE is not None:
+            _STAGE.record(current, {metric: io_end[metric] - io_start.get(metric, 0) for metric in io_end})
+
+
+@contextmanager
+def stage_metrics(stage: str, path: Optional[str] = None) -> Iterator[StageMetrics]:
+    """
+    Record the spans of a stage, and the stage as a whole (as the "total" span), and write them to its metrics file
+    when it ends, even if it fails
+    :param stage: the name of the stage
+    :param path: the metrics file (by default "<stage>-metrics.json")
+    :return: the metrics of the stage
+    """
+    global _STAGE  # pylint: disable=global-statement
+    previous, _STAGE = _STAGE, StageMetrics(stage, path)
+    metrics = _STAGE
+    try:
+        with span(TOTAL_SPAN):
+            yield metrics
+    finally:
+        _STAGE = previous
+        metrics.write()
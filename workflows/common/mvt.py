@@ -0,0 +1,278 @@
+"""
+Encoding of Mapbox Vector Tiles (MVT 2.1, https://github.com/mapbox/vector-tile-spec/tree/master/2.1).
+
+A tile is a protocol buffer message, written here directly rather than with a protobuf library. Geometries must
+already be in tile coordinates: integers from 0 to the extent, with y pointing down. Each geometry is encoded as
+MoveTo / LineTo / ClosePath commands with zigzag-encoded coordinate deltas, and polygon rings are re-oriented as the
+specification requires (exterior rings clockwise, interior rings anticlockwise, on screen).
+"""
+import math
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pygeos
+
+DEFAULT_EXTENT = 4096
+MVT_VERSION = 2
+
+# field numbers of the messages, see vector_tile.proto in the specification
+TILE_LAYERS = 3
+LAYER_VERSION, LAYER_NAME, LAYER_FEATURES, LAYER_KEYS, LAYER_VALUES, LAYER_EXTENT = 15, 1, 2, 3, 4, 5
+FEATURE_TAGS, FEATURE_TYPE, FEATURE_GEOMETRY = 2, 3, 4
+VALUE_STRING, VALUE_DOUBLE, VALUE_UINT, VALUE_SINT, VALUE_BOOL = 1, 3, 5, 6, 7
+
+WIRE_VARINT, WIRE_FIXED64, WIRE_LENGTH_DELIMITED = 0, 1, 2
+
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+# the MVT geometry type of each pygeos geometry type
+GEOMETRY_TYPES = {
+    pygeos.GeometryType.POINT: POINT,
+    pygeos.GeometryType.MULTIPOINT: POINT,
+    pygeos.GeometryType.LINESTRING: LINESTRING,
+    pygeos.GeometryType.LINEARRING: LINESTRING,
+    pygeos.GeometryType.MULTILINESTRING: LINESTRING,
+    pygeos.GeometryType.POLYGON: POLYGON,
+    pygeos.GeometryType.MULTIPOLYGON: POLYGON,
+}
+
+
+@dataclass
+class MvtLayer:
+    """
+    :param name: the name of the layer
+    :param geometries: pygeos geometries, in tile coordinates
+    :param properties: the properties of each geometry (None / NaN values are left out)
+    :param extent: the size of the tile, in tile coordinates
+    """
+
+    name: str
+    geometries: np.ndarray
+    properties: pd.DataFrame
+    extent: int = DEFAULT_EXTENT
+
+
+def varints(values: np.ndarray) -> bytes:
+    """
+    :param values: non-negative integers
+    :return: the concatenated protobuf varint encodings of the values
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        n_bytes += remaining > 0
+        remaining >>= np.uint64(7)
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.empty(n_bytes.sum(), dtype=np.uint8)
+    remaining = values.copy()
+    for i in range(n_bytes.max(initial=0)):
+        active = n_bytes > i
+        has_more = (n_bytes[active] > i + 1).astype(np.uint8) << 7
+        out[starts[active] + i] = (remaining[active] & np.uint64(0x7F)).astype(np.uint8) | has_more
+        remaining[active] >>= np.uint64(7)
+    return out.tobytes()
+
+
+def _varint(value: int) -> bytes:
+    return varints(np.array([value]))
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint(field << 3 | wire_type)
+
+
+def _message(field: int, payload: bytes) -> bytes:
+    return _key(field, WIRE_LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def _uint(field: int, value: int) -> bytes:
+    return _key(field, WIRE_VARINT) + _varint(value)
+
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    """
+    :param values: signed integers
+    :return: the zigzag encoding of the values (0, -1, 1, -2... as 0, 1, 2, 3...)
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _command(command_id: int, count: int) -> int:
+    return command_id & 0x7 | count << 3
+
+
+def _drop_repeated_points(coordinates: np.ndarray) -> np.ndarray:
+    if len(coordinates) < 2:
+        return coordinates
+    repeated = np.all(coordinates[1:] == coordinates[:-1], axis=1)
+    return coordinates[np.concatenate([[True], ~repeated])]
+
+
+def _ring_area(coordinates: np.ndarray) -> float:
+    # the formula of the specification, which is positive for clockwise rings in tile coordinates (y down)
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)) / 2
+
+
+class _GeometryEncoder:
+    """Collects the commands and parameters of one geometry, with the cursor position carried between parts"""
+
+    def __init__(self):
+        self.commands: List[np.ndarray] = []
+        self.cursor = np.zeros(2, dtype=np.int64)
+
+    def path(self, coordinates: np.ndarray, close: bool) -> None:
+        deltas = np.diff(np.vstack([self.cursor, coordinates]), axis=0)
+        self.cursor = coordinates[-1]
+        parameters = zigzag(deltas).ravel()
+        self.commands.append(np.array([_command(MOVE_TO, 1)], dtype=np.uint64))
+        self.commands.append(parameters[:2])
+        if len(coordinates) > 1:
+            self.commands.append(np.array([_command(LINE_TO, len(coordinates) - 1)], dtype=np.uint64))
+            self.commands.append(parameters[2:])
+        if close:
+            self.commands.append(np.array([_command(CLOSE_PATH, 1)], dtype=np.uint64))
+
+    def points(self, coordinates: np.ndarray) -> None:
+        deltas = np.diff(np.vstack([self.cursor, coordinates]), axis=0)
+        self.cursor = coordinates[-1]
+        self.commands.append(np.array([_command(MOVE_TO, len(coordinates))], dtype=np.uint64))
+        self.commands.append(zigzag(deltas).ravel())
+
+    def encode(self) -> Optional[bytes]:
+        if not self.commands:
+            return None
+        return varints(np.concatenate(self.commands))
+
+
+def _coordinates(geometry: pygeos.Geometry) -> np.ndarray:
+    return np.rint(pygeos.get_coordinates(geometry)).astype(np.int64)
+
+
+def _polygon_rings(polygon: pygeos.Geometry) -> Iterable[Tuple[np.ndarray, bool]]:
+    yield _coordinates(pygeos.get_exterior_ring(polygon)), True
+    for i in range(pygeos.get_num_interior_rings(polygon)):
+        yield _coordinates(pygeos.get_interior_ring(polygon, i)), False
+
+
+def encode_geometry(geometry: pygeos.Geometry) -> Optional[Tuple[int, bytes]]:
+    """
+    :param geometry: a geometry in tile coordinates (which are rounded to integers)
+    :return: the MVT geometry type and the encoded commands, or None if nothing is left of the geometry once rounded
+    """
+    geometry_type = GEOMETRY_TYPES.get(pygeos.get_type_id(geometry))
+    if geometry_type is None or pygeos.is_empty(geometry):
+        return None
+    encoder = _GeometryEncoder()
+    if geometry_type == POINT:
+        encoder.points(_coordinates(geometry))
+    elif geometry_type == LINESTRING:
+        for part in pygeos.get_parts(geometry):
+            coordinates = _drop_repeated_points(_coordinates(part))
+            if len(coordinates) >= 2:
+                encoder.path(coordinates, close=False)
+    else:
+        for polygon in pygeos.get_parts(geometry):
+            for i, (coordinates, is_exterior) in enumerate(_polygon_rings(polygon)):
+                # the ring without its closing point, which ClosePath implies
+                coordinates = _drop_repeated_points(coordinates[:-1])
+                area = _ring_area(coordinates) if len(coordinates) >= 3 else 0
+                if area == 0:
+                    if i == 0:
+                        # the polygon has collapsed, so its holes are dropped with it
+                        break
+                    continue
+                if (area > 0) != is_exterior:
+                    coordinates = coordinates[::-1]
+                encoder.path(coordinates, close=True)
+    encoded = encoder.encode()
+    return (geometry_type, encoded) if encoded else None
+
+
+class _ValueTable:
+    """The keys and values of a layer, each stored once and referred to by index from the features"""
+
+    def __init__(self):
+        self.keys: Dict[str, int] = {}
+        self.values: Dict[Tuple[type, Any], int] = {}
+
+    def tags(self, properties: Dict[str, Any]) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            value = _python_value(value)
+            if value is None:
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        return tags
+
+    def encode(self) -> bytes:
+        encoded_keys = b"".join(_message(LAYER_KEYS, key.encode("utf-8")) for key in self.keys)
+        encoded_values = b"".join(_message(LAYER_VALUES, _encode_value(value)) for _, value in self.values)
+        return encoded_keys + encoded_values
+
+
+def _python_value(value: Any) -> Any:
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return _python_value(value.item())
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, str):
+        return _message(VALUE_STRING, value.encode("utf-8"))
+    if isinstance(value, bool):
+        return _uint(VALUE_BOOL, int(value))
+    if isinstance(value, int):
+        return _uint(VALUE_UINT, value) if value >= 0 else _key(VALUE_SINT, WIRE_VARINT) + varints(zigzag([value]))
+    return _key(VALUE_DOUBLE, WIRE_FIXED64) + struct.pack("<d", value)
+
+
+def encode_layer(layer: MvtLayer) -> Optional[bytes]:
+    """
+    :param layer: the layer
+    :return: the encoded layer, or None if none of its geometries are left once rounded to tile coordinates
+    """
+    value_table = _ValueTable()
+    features = []
+    records = layer.properties.to_dict("records") if len(layer.properties.columns) else [{}] * len(layer.geometries)
+    for geometry, properties in zip(layer.geometries, records):
+        encoded_geometry = encode_geometry(geometry) if geometry is not None else None
+        if encoded_geometry is None:
+            continue
+        geometry_type, commands = encoded_geometry
+        tags = value_table.tags(properties)
+        feature = _uint(FEATURE_TYPE, geometry_type) + _message(FEATURE_GEOMETRY, commands)
+        if tags:
+            feature = _message(FEATURE_TAGS, varints(np.array(tags))) + feature
+        features.append(_message(LAYER_FEATURES, feature))
+    if not features:
+        return None
+    return (
+        _uint(LAYER_VERSION, MVT_VERSION)
+        + _message(LAYER_NAME, layer.name.encode("utf-8"))
+        + b"".join(features)
+        + value_table.encode()
+        + _uint(LAYER_EXTENT, layer.extent)
+    )
+
+
+def encode_tile(layers: Iterable[MvtLayer]) -> Optional[bytes]:
+    """
+    :param layers: the layers of the tile
+    :return: the encoded tile, or None if the tile has no features
+    """
+    encoded_layers = [encoded for encoded in map(encode_layer, layers) if encoded is not None]
+    if not encoded_layers:
+        return None
+    return b"".join(_message(TILE_LAYERS, encoded) for encoded in encoded_layers)
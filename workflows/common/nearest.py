@@ -0,0 +1,135 @@
+"""
+Bulk nearest-k queries from many features to a small layer of sites (e.g. from every charge point to the primary
+substations), in the British National Grid (EPSG:27700), so distances are in metres.
+
+There are only around a thousand primary substations, so rather than searching a tree point by point, the distances
+from a chunk of query points to every site are computed at once with numpy, and the k nearest taken from each row.
+The chunks are sized so that each distance matrix has at most chunk_cells entries, which bounds the memory used
+whatever the number of query points. Polygons (e.g. car parks) are measured from a point inside them.
+"""
+from typing import Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+
+from .area_index import representative_points
+from .geometry import to_pygeos
+from .outputs import read_geoparquet
+
+DISTANCE_CRS = "EPSG:27700"
+POINT_CRS = "EPSG:4326"
+RANK_COLUMN = "rank"
+DISTANCE_COLUMN = "distance"
+# 2 ** 22 distances (32 MB) per chunk
+DEFAULT_CHUNK_CELLS = 2 ** 22
+
+
+def projected_coordinates(geoseries: gpd.GeoSeries) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param geoseries: the geometries
+    :return: the x and y of a point on each geometry in EPSG:27700 (NaN for missing or empty geometries)
+    """
+    points = to_pygeos(representative_points(geoseries).to_crs(DISTANCE_CRS))
+    return pygeos.get_x(points), pygeos.get_y(points)
+
+
+class NearestSites:
+    """
+    The sites (e.g. primary substations) that the nearest-k queries find, with the attributes reported for each
+    """
+
+    def __init__(self, sites: gpd.GeoDataFrame, columns: Sequence[str], chunk_cells: int = DEFAULT_CHUNK_CELLS):
+        """
+        :param sites: the sites. Sites without a geometry are left out
+        :param columns: the attributes of the sites to report (e.g. "Site Name", "Demand Headroom (MVA)")
+        :param chunk_cells: the maximum number of distances computed at once
+        """
+        x, y = projected_coordinates(sites.geometry)
+        located = ~(np.isnan(x) | np.isnan(y))
+        self.x = x[located]
+        self.y = y[located]
+        self.attributes = sites.loc[located, list(columns)].reset_index(drop=True)
+        self.chunk_cells = chunk_cells
+
+    @classmethod
+    def from_file(cls, path: str, columns: Sequence[str], chunk_cells: int = DEFAULT_CHUNK_CELLS) -> "NearestSites":
+        """
+        :param path: a GeoParquet output (e.g. dnos-primary-substations.parquet)
+        :param columns: the attributes of the sites to report
+        :param chunk_cells: the maximum number of distances computed at once
+        """
+        return cls(read_geoparquet(path, columns=list(columns)), columns, chunk_cells)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def query(self, x: np.ndarray, y: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param x: the x of the query points, in EPSG:27700
+        :param y: the y of the query points, in EPSG:27700
+        :param k: the number of sites to find for each point (at most the number of sites)
+        :return: the positions of the k nearest sites to each point (-1 for points without coordinates) and their
+            distances in metres (NaN for those points), as (points, k) arrays, nearest first
+        """
+        n_sites = len(self)
+        k = min(k, n_sites)
+        positions = np.full((len(x), k), -1, dtype=np.int64)
+        distances = np.full((len(x), k), np.nan)
+        if k == 0:
+            return positions, distances
+        chunk_size = max(1, self.chunk_cells // n_sites)
+        for start in range(0, len(x), chunk_size):
+            stop = min(start + chunk_size, len(x))
+            chunk_distances = np.hypot(x[start:stop, None] - self.x, y[start:stop, None] - self.y)
+            if k < n_sites:
+                nearest = np.argpartition(chunk_distances, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(n_sites), (stop - start, k))
+            nearest_distances = np.take_along_axis(chunk_distances, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1, kind="stable")
+            positions[start:stop] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:stop] = np.take_along_axis(nearest_distances, order, axis=1)
+        missing = np.isnan(distances)
+        positions[missing] = -1
+        return positions, distances
+
+    def nearest(self, geoseries: gpd.GeoSeries, k: int = 1, keys: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        :param geoseries: the features to find the nearest sites to
+        :param k: the number of sites to find for each feature
+        :param keys: columns identifying the features (e.g. "chargeDeviceID"), with the index of geoseries
+        :return: a row for each of the k nearest sites to each feature, with the keys of the feature, the rank of
+            the site (1 for the nearest), its attributes and its distance in metres. The rows are indexed by the
+            index of the feature in geoseries
+        """
+        x, y = projected_coordinates(geoseries)
+        positions, distances = self.query(x, y, k)
+        n_features, k = positions.shape
+        flat_positions = positions.ravel()
+        attributes = self.attributes.reindex(np.where(flat_positions >= 0, flat_positions, len(self)))
+        nearest_df = pd.concat(
+            [
+                pd.DataFrame({RANK_COLUMN: np.tile(np.arange(1, k + 1), n_features)}),
+                attributes.reset_index(drop=True),
+                pd.DataFrame({DISTANCE_COLUMN: distances.ravel()}),
+            ],
+            axis=1,
+        )
+        if keys is not None:
+            repeated_keys = keys.iloc[np.repeat(np.arange(n_features), k)].reset_index(drop=True)
+            nearest_df = pd.concat([repeated_keys, nearest_df], axis=1)
+        nearest_df.index = np.repeat(geoseries.index.to_numpy(), k)
+        return nearest_df
+
+    def nearest_to_points(self, longitudes: Sequence[float], latitudes: Sequence[float], k: int = 1) -> pd.DataFrame:
+        """
+        Find the nearest sites to ad-hoc points (e.g. candidate sites)
+        :param longitudes: the longitudes of the points
+        :param latitudes: the latitudes of the points
+        :param k: the number of sites to find for each point
+        :return: a row for each of the k nearest sites to each point (see nearest), indexed by the position of the
+            point
+        """
+        return self.nearest(gpd.GeoSeries(gpd.points_from_xy(longitudes, latitudes), crs=POINT_CRS), k)
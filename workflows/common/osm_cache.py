@@ -0,0 +1,306 @@
+"""
+Persistent, content-addressed cache for the results of OpenStreetMap queries (Overpass / Nominatim via osmnx).
+
+Results are keyed on the query and its parameters (e.g. the place and tags), and stored as GeoParquet (WKB
+geometries) in the cache directory with a JSON index. Entries expire after a time to live and the least recently
+used entries are evicted when the cache grows over its size limit.
+
+Looking up a result makes no network requests: the most recent result of the query within the time to live is used.
+Each result records the version of the OSM data it was computed from, the time stamp of the Overpass database (its
+"timestamp_osm_base"), which is only asked for when a result is stored. The version can be pinned with the
+OSM_DATA_VERSION environment variable, e.g. to rebuild outputs from the same cached data: only results of that version
+are then used, and new results are stored against it.
+
+In offline mode (OSM_CACHE_OFFLINE=1) the most recent cached result of each query is used whatever its age, and a
+query that is not cached raises OfflineCacheMiss.
+
+Configuration (environment variables):
+    OSM_CACHE_DIR        the cache directory (default workflows/.osm-cache)
+    OSM_CACHE_TTL_DAYS   the number of days entries are kept (default 30)
+    OSM_CACHE_MAX_MB     the maximum size of the cache (default 2048)
+    OSM_CACHE_OFFLINE    "1" to only read from the cache
+    OSM_DATA_VERSION     the data version to use instead of asking Overpass
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import geopandas as gpd
+import osmnx as ox
+import requests
+
+from .metrics import span
+from .outputs import read_geoparquet, write_geoparquet
+
+CACHE_DIR_ENV_VAR = "OSM_CACHE_DIR"
+TTL_DAYS_ENV_VAR = "OSM_CACHE_TTL_DAYS"
+MAX_MB_ENV_VAR = "OSM_CACHE_MAX_MB"
+OFFLINE_ENV_VAR = "OSM_CACHE_OFFLINE"
+DATA_VERSION_ENV_VAR = "OSM_DATA_VERSION"
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[1] / ".osm-cache"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 2048
+INDEX_FILE_NAME = "index.json"
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class OfflineCacheMiss(LookupError):
+    """A query is not in the cache and the cache is offline"""
+
+
+@dataclass
+class CacheEntry:
+    """What the index records about a cached result"""
+
+    query_key: str
+    data_version: str
+    created: float
+    last_used: float
+    size: int
+    index_names: List[str]
+
+
+@dataclass
+class CacheMetrics:
+    """Counts of cache operations since the cache was opened"""
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    fetch_seconds: float = 0.0
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def overpass_data_version() -> str:
+    """
+    :return: the time stamp of the data in the Overpass database (e.g. "2021-11-19T21:24:02Z")
+    """
+    response = requests.get(
+        ox.settings.overpass_endpoint.rstrip("/") + "/interpreter",
+        params={"data": "[out:json];out;"},
+        timeout=ox.settings.timeout,
+    )
+    response.raise_for_status()
+    return response.json()["osm3s"]["timestamp_osm_base"]
+
+
+class OsmCache:
+    """
+    The cache. Safe to use from several threads of one process.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl_days: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        offline: Optional[bool] = None,
+        data_version: Optional[str] = None,
+    ):
+        """
+        Each argument defaults to its environment variable (see the module docstring), then to the default value
+        :param cache_dir: the directory holding the cached results
+        :param ttl_days: the number of days results are kept
+        :param max_bytes: the maximum total size of the cached results
+        :param offline: only use cached results
+        :param data_version: the version of the OSM data to pin (by default the Overpass data time stamp when a
+            result is stored)
+        """
+        self.cache_dir = Path(cache_dir or os.environ.get(CACHE_DIR_ENV_VAR) or DEFAULT_CACHE_DIR)
+        self.ttl_seconds = (
+            ttl_days if ttl_days is not None else float(os.environ.get(TTL_DAYS_ENV_VAR, DEFAULT_TTL_DAYS))
+        ) * SECONDS_PER_DAY
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else int(os.environ.get(MAX_MB_ENV_VAR, DEFAULT_MAX_MB)) * 2 ** 20
+        )
+        self.offline = offline if offline is not None else os.environ.get(OFFLINE_ENV_VAR, "") == "1"
+        self.pinned_version = data_version or os.environ.get(DATA_VERSION_ENV_VAR)
+        self._data_version = self.pinned_version
+        self.metrics = CacheMetrics()
+        self._lock = threading.RLock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._entries = self._load_index()
+
+    @property
+    def data_version(self) -> str:
+        """The version of the OSM data that new results are stored against (asking Overpass the first time)"""
+        with self._lock:
+            if self._data_version is None:
+                self._data_version = overpass_data_version()
+            return self._data_version
+
+    def _index_path(self) -> Path:
+        return self.cache_dir / INDEX_FILE_NAME
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def _load_index(self) -> Dict[str, CacheEntry]:
+        try:
+            with open(self._index_path(), encoding="utf-8") as file:
+                return {key: CacheEntry(**entry) for key, entry in json.load(file).items()}
+        except (FileNotFoundError, TypeError, ValueError):
+            return {}
+
+    def _save_index(self) -> None:
+        temporary_path = self._index_path().with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({key: asdict(entry) for key, entry in self._entries.items()}, file, indent=2)
+        os.replace(temporary_path, self._index_path())
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self._entry_path(key).unlink(missing_ok=True)
+
+    def _find(self, query_key: str) -> Optional[str]:
+        candidates = [
+            key
+            for key, entry in self._entries.items()
+            if entry.query_key == query_key and self.pinned_version in (None, entry.data_version)
+        ]
+        if not self.offline:
+            now = time.time()
+            expired = [key for key in candidates if now - self._entries[key].created > self.ttl_seconds]
+            for key in expired:
+                self._remove(key)
+            candidates = [key for key in candidates if key not in expired]
+        return max(candidates, key=lambda key: self._entries[key].created, default=None)
+
+    def get(self, query: str, params: Dict[str, Any]) -> Optional[gpd.GeoDataFrame]:
+        """
+        :param query: the name of the query (e.g. "geometries_from_place")
+        :param params: the parameters of the query (anything JSON serializable)
+        :return: the cached result, or None if it is not cached
+        """
+        query_key = _hash([query, params])
+        with self._lock:
+            key = self._find(query_key)
+            if key is None or not self._entry_path(key).exists():
+                return None
+            entry = self._entries[key]
+            entry.last_used = time.time()
+            self.metrics.hits += 1
+            self.metrics.bytes_read += entry.size
+        gdf = read_geoparquet(str(self._entry_path(key)))
+        if entry.index_names:
+            gdf = gdf.set_index(entry.index_names)
+        return gdf
+
+    def put(self, query: str, params: Dict[str, Any], gdf: gpd.GeoDataFrame) -> None:
+        """
+        Store the result of a query (against the current data version), replacing its results of other versions
+        unless the version is pinned
+        :param query: the name of the query
+        :param params: the parameters of the query
+        :param gdf: the result. Its index is kept if it is named
+        """
+        query_key = _hash([query, params])
+        data_version = self.data_version
+        key = _hash([query_key, data_version])
+        index_names = [name for name in gdf.index.names if name is not None]
+        gdf = gdf.reset_index(drop=not index_names)
+        write_geoparquet(gdf, str(self._entry_path(key)))
+        size = self._entry_path(key).stat().st_size
+        now = time.time()
+        with self._lock:
+            if self.pinned_version is None:
+                for superseded_key in [
+                    other_key
+                    for other_key, entry in self._entries.items()
+                    if entry.query_key == query_key and other_key != key
+                ]:
+                    self._remove(superseded_key)
+            self._entries[key] = CacheEntry(query_key, data_version, now, now, size, index_names)
+            self.metrics.stores += 1
+            self.metrics.bytes_written += size
+            self._evict()
+            self._save_index()
+
+    def discard(self, query: str, params_list: Iterable[Dict[str, Any]]) -> None:
+        """
+        Remove the cached results of some queries (e.g. checkpoints that are no longer needed)
+        :param query: the name of the queries
+        :param params_list: the parameters of each query
+        """
+        query_keys = {_hash([query, params]) for params in params_list}
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.query_key in query_keys]
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self._save_index()
+
+    def get_or_fetch(
+        self, query: str, params: Dict[str, Any], fetch: Callable[[], gpd.GeoDataFrame]
+    ) -> gpd.GeoDataFrame:
+        """
+        Get the result of a query from the cache, or fetch and cache it
+        :param query: the name of the query
+        :param params: the parameters of the query, which must determine its result (with the data version). The
+            data version is only asked for if the result is not cached
+        :param fetch: runs the query
+        :return: the result of the query
+        """
+        gdf = self.get(query, params)
+        if gdf is not None:
+            return gdf
+        if self.offline:
+            raise OfflineCacheMiss(f"{query} {params} is not in the OSM cache at {self.cache_dir}")
+        with self._lock:
+            self.metrics.misses += 1
+        start = time.perf_counter()
+        with span("download"):
+            gdf = fetch()
+        with self._lock:
+            self.metrics.fetch_seconds += time.perf_counter() - start
+        self.put(query, params, gdf)
+        return gdf
+
+    def _evict(self) -> None:
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now - entry.created > self.ttl_seconds]:
+            self._remove(key)
+            self.metrics.evictions += 1
+        total_size = sum(entry.size for entry in self._entries.values())
+        for key in sorted(self._entries, key=lambda key: self._entries[key].last_used):
+            if total_size <= self.max_bytes:
+                break
+            total_size -= self._entries[key].size
+            self._remove(key)
+            self.metrics.evictions += 1
+
+    def close(self) -> None:
+        """Save the last-used times of the entries read, so eviction is least-recently-used"""
+        with self._lock:
+            self._save_index()
+
+    def __enter__(self) -> "OsmCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+        print(self.summary())
+
+    def summary(self) -> str:
+        """
+        :return: a description of the cache hits and misses
+        """
+        lookups = self.metrics.hits + self.metrics.misses
+        hit_rate = self.metrics.hits / lookups if lookups else 0.0
+        return (
+            f"OSM cache: {self.metrics.hits} hits, {self.metrics.misses} misses ({hit_rate:.0%} hit rate), "
+            f"{self.metrics.evictions} evictions, {self.metrics.bytes_read / 2 ** 20:.1f} MB read, "
+            f"{self.metrics.bytes_written / 2 ** 20:.1f} MB written, {self.metrics.fetch_seconds:.1f}s fetching"
+        )
@@ -0,0 +1,160 @@
+"""
+Extraction of tag-filtered OpenStreetMap features from a local .osm.pbf extract (e.g. Great Britain from Geofabrik).
+
+This is an alternative to querying the Overpass API with osmnx: all the queries are answered in one streaming pass
+over the file. The results have the same layout as osmnx.geometries_from_place (after reset_index), i.e. an
+"element_type" and "osmid" column, one column per tag and the geometry, so the workflows can select the same
+properties from either source. Only the tags asked for are kept as the file is read, as over Great Britain the matching
+features have thousands of distinct tags between them.
+
+libosmium decodes the blocks of the file in a pool of worker threads (OSMIUM_POOL_THREADS sets its size) while the
+matching and geometry building run in the handler.
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Union
+
+import geopandas as gpd
+import osmium
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .outputs import read_geoparquet, select_columns
+
+# tags in the osmnx format: {key: True} matches any value, {key: "value"} or {key: ["v1", "v2"]} specific values.
+# An element matches if any of its tags match
+Tags = Dict[str, Union[bool, str, List[str]]]
+
+ELEMENT_TYPE_COLUMN = "element_type"
+OSM_ID_COLUMN = "osmid"
+CRS = "EPSG:4326"
+POOL_THREADS_ENV_VAR = "OSMIUM_POOL_THREADS"
+
+
+class _Query:
+    """The features matching one set of tags, as they are collected"""
+
+    def __init__(self, tags: Tags, columns: Optional[Sequence[str]] = None):
+        # None means any value
+        self.tags = {
+            key: None if value is True else {value} if isinstance(value, str) else set(value)
+            for key, value in tags.items()
+        }
+        # the tags kept for each feature (None for all of them)
+        self.columns = list(columns) if columns is not None else None
+        self._kept_keys = frozenset(self.columns) if self.columns is not None else None
+        self.element_types: List[str] = []
+        self.osm_ids: List[int] = []
+        self.tag_records: List[Dict[str, str]] = []
+        self.wkbs: List[str] = []
+
+    def matches(self, tags: osmium.osm.TagList) -> bool:
+        for key, values in self.tags.items():
+            value = tags.get(key)
+            if value is not None and (values is None or value in values):
+                return True
+        return False
+
+    def add(self, element_type: str, osm_id: int, tags: osmium.osm.TagList, wkb: str) -> None:
+        self.element_types.append(element_type)
+        self.osm_ids.append(osm_id)
+        if self._kept_keys is None:
+            self.tag_records.append({tag.k: tag.v for tag in tags})
+        else:
+            self.tag_records.append({tag.k: tag.v for tag in tags if tag.k in self._kept_keys})
+        self.wkbs.append(wkb)
+
+    def to_geodataframe(self) -> gpd.GeoDataFrame:
+        # the kept tags are all columns, even if no feature has them
+        df = pd.DataFrame(self.tag_records, index=pd.RangeIndex(len(self.tag_records)), columns=self.columns)
+        df.insert(0, ELEMENT_TYPE_COLUMN, self.element_types)
+        df.insert(1, OSM_ID_COLUMN, pd.array(self.osm_ids, dtype="int64"))
+        geometry = gpd.GeoSeries.from_wkb(pd.Series(self.wkbs, dtype=object).map(bytes.fromhex), crs=CRS)
+        return gpd.GeoDataFrame(df, geometry=geometry)
+
+
+class _FeatureHandler(osmium.SimpleHandler):
+    """
+    Nodes become points, unclosed ways line strings, and closed ways and multipolygon/boundary relations (multi)
+    polygons, which libosmium assembles once their member ways have been read
+    """
+
+    def __init__(self, queries: Dict[str, _Query]):
+        super().__init__()
+        self.queries = queries
+        self.wkb_factory = osmium.geom.WKBFactory()
+
+    def _matching(self, tags: osmium.osm.TagList) -> List[_Query]:
+        if len(tags) == 0:
+            return []
+        return [query for query in self.queries.values() if query.matches(tags)]
+
+    def node(self, node: osmium.osm.Node) -> None:
+        queries = self._matching(node.tags)
+        if queries:
+            wkb = self.wkb_factory.create_point(node)
+            for query in queries:
+                query.add("node", node.id, node.tags, wkb)
+
+    def way(self, way: osmium.osm.Way) -> None:
+        # closed ways are passed to area() as polygons
+        if way.is_closed():
+            return
+        queries = self._matching(way.tags)
+        if queries:
+            try:
+                wkb = self.wkb_factory.create_linestring(way)
+            except (osmium.InvalidLocationError, RuntimeError):
+                # the way references nodes missing from the extract or has fewer than two distinct locations
+                return
+            for query in queries:
+                query.add("way", way.id, way.tags, wkb)
+
+    def area(self, area: osmium.osm.Area) -> None:
+        queries = self._matching(area.tags)
+        if queries:
+            try:
+                wkb = self.wkb_factory.create_multipolygon(area)
+            except RuntimeError:
+                # invalid geometry (e.g. a relation that is cut by the edge of the extract)
+                return
+            element_type = "way" if area.from_way() else "relation"
+            for query in queries:
+                query.add(element_type, area.orig_id(), area.tags, wkb)
+
+
+def features_from_pbf(
+    pbf_path: str,
+    queries: Dict[str, Tags],
+    threads: Optional[int] = None,
+    columns: Optional[Dict[str, Sequence[str]]] = None,
+) -> Dict[str, gpd.GeoDataFrame]:
+    """
+    Extract the features matching each query from an .osm.pbf file in a single pass
+    :param pbf_path: the .osm.pbf file
+    :param queries: named tag queries, e.g. {"car-parks": {"amenity": "parking"}}
+    :param threads: the number of threads decoding the file (defaults to the libosmium default)
+    :param columns: the tags to keep as columns for each query, e.g. {"car-parks": ["fee", "capacity"]}. The other
+        tags are dropped as the file is read. Queries without columns keep all the tags of their features
+    :return: a GeoDataFrame (in the osmnx layout) for each query
+    """
+    if threads is not None:
+        # read by libosmium when its thread pool is first used
+        os.environ[POOL_THREADS_ENV_VAR] = str(threads)
+    columns = columns or {}
+    collected = {name: _Query(tags, columns.get(name)) for name, tags in queries.items()}
+    handler = _FeatureHandler(collected)
+    handler.apply_file(pbf_path, locations=True, idx="flex_mem")
+    return {name: query.to_geodataframe() for name, query in collected.items()}
+
+
+def read_osm_extract(path: str, columns: List[str]) -> gpd.GeoDataFrame:
+    """
+    Read some of the tag columns of features extracted by features_from_pbf and saved as GeoParquet.
+    Tags that no extracted feature has are not in the file, so they are added as empty columns.
+    :param path: the GeoParquet file
+    :param columns: the tag columns to read (the geometry is always read)
+    :return: a GeoDataFrame with the columns and the geometry
+    """
+    available_columns = set(pq.read_schema(path).names)
+    gdf = read_geoparquet(path, columns=[column for column in columns if column in available_columns])
+    return select_columns(gdf, [*columns, gdf.geometry.name])
@@ -0,0 +1,226 @@
+"""
+Concurrent, resumable download of OSM features for large areas (e.g. a whole country) from the Overpass API.
+
+Rather than asking osmnx for the features in one enormous polygon, which it subdivides and fetches sequentially, the
+area is covered with a grid of square tiles which are fetched concurrently by a bounded pool of threads, with
+retries and exponential backoff for network and server errors. The grid is aligned to whole multiples of the tile
+size, so the tiles are the same on every run.
+
+Each completed tile is checkpointed in the OSM cache (see osm_cache.py), keyed on the place, the tags, the bounds of
+the tile and the id of the run (see TiledRun): an interrupted run is resumed by the next one, whenever it is, which
+fetches only the tiles that had not completed. Once every tile has been fetched the checkpoints are removed, so the
+next run fetches the features again, unless the OSM data version is pinned (OSM_DATA_VERSION), in which case the
+version is the run id and the tiles are kept (e.g. to run again offline).
+
+Features that cross a tile seam are returned by each tile they intersect, so they are de-duplicated on
+(element_type, osmid). Only features intersecting the area itself are kept.
+
+To test against a local stand-in Overpass server, point ox.settings.overpass_endpoint at it.
+"""
+import hashlib
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import geopandas as gpd
+import numpy as np
+import osmnx as ox
+import pandas as pd
+import pygeos
+import requests
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
+from tqdm import tqdm
+
+from .dedup import DuplicateFilter, hash_ids
+from .geometry import to_pygeos
+from .osm_cache import OsmCache
+
+# in degrees
+DEFAULT_TILE_SIZE = 0.5
+# the public Overpass server runs at most two queries at a time for each client
+DEFAULT_WORKERS = 2
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 15
+# digits kept in the tile coordinates, so the tiles (and so their cache keys) are the same on every run
+TILE_COORDINATE_DIGITS = 6
+# the directory of the cache holding the record of each run that has not completed
+RUNS_DIR_NAME = "tiled-runs"
+TILE_QUERY = "geometries_from_polygon"
+
+
+def grid_tiles(area: BaseGeometry, tile_size: float = DEFAULT_TILE_SIZE) -> List[BaseGeometry]:
+    """
+    :param area: the area to cover, in EPSG:4326
+    :param tile_size: the width and height of the tiles, in degrees
+    :return: the square tiles of a grid aligned to multiples of the tile size that intersect the area
+    """
+    min_x, min_y, max_x, max_y = area.bounds
+    xs = np.arange(math.floor(min_x / tile_size), math.ceil(max_x / tile_size)) * tile_size
+    ys = np.arange(math.floor(min_y / tile_size), math.ceil(max_y / tile_size)) * tile_size
+    x, y = (grid.ravel().round(TILE_COORDINATE_DIGITS) for grid in np.meshgrid(xs, ys))
+    tiles = pygeos.box(
+        x, y, (x + tile_size).round(TILE_COORDINATE_DIGITS), (y + tile_size).round(TILE_COORDINATE_DIGITS)
+    )
+    area_geometry = pygeos.from_shapely(area)
+    pygeos.prepare(area_geometry)
+    return [box(*pygeos.bounds(tile)) for tile in tiles[pygeos.intersects(area_geometry, tiles)]]
+
+
+def feature_keys(gdf: gpd.GeoDataFrame) -> np.ndarray:
+    """
+    :param gdf: features in the osmnx layout, with element_type and osmid as index levels (as returned by osmnx) or
+        as columns (after reset_index)
+    :return: a stable 64-bit hash of the (element_type, osmid) of each feature
+    """
+    keys = gdf.index.to_frame(index=False) if "osmid" in gdf.index.names else gdf
+    return hash_ids(keys["element_type"].astype(str) + "/" + keys["osmid"].astype(str))
+
+
+def _empty_features() -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(geometry=gpd.GeoSeries([], crs=ox.settings.default_crs))
+
+
+def _is_transient(error: Exception) -> bool:
+    # osmnx raises a plain Exception (rather than a subclass) when Overpass returns an unexpected status
+    return isinstance(error, requests.RequestException) or error.__class__ is Exception
+
+
+def _fetch_tile(tile: BaseGeometry, tags: Dict) -> gpd.GeoDataFrame:
+    attempt = 0
+    while True:
+        try:
+            gdf = ox.geometries_from_polygon(tile, tags)
+            # osmnx returns a frame with an untyped geometry column when there are no features
+            return gdf if not gdf.empty else _empty_features()
+        except Exception as error:  # pylint: disable=broad-except
+            attempt += 1
+            if not _is_transient(error) or attempt == MAX_ATTEMPTS:
+                raise
+            delay = BACKOFF_SECONDS * 2 ** (attempt - 1)
+            tqdm.write(f"Fetching tile {tile.bounds} failed ({error}), retrying in {delay}s")
+            time.sleep(delay)
+
+
+class TiledRun:
+    """
+    The checkpoints of one download of the features in an area. The id of the run is written to the cache directory
+    when the run starts and removed when it completes, so a run that is interrupted is resumed by the next one.
+    """
+
+    def __init__(self, cache: OsmCache, place: str, tags: Dict, tile_size: float):
+        """
+        :param cache: the cache the tiles are checkpointed to
+        :param place: the name of the area
+        :param tags: the tags of the features, in the osmnx format
+        :param tile_size: the width and height of the tiles, in degrees
+        """
+        self.cache = cache
+        self.place = place
+        self.tags = tags
+        run_key = hashlib.sha256(json.dumps([place, tags, tile_size], sort_keys=True).encode("utf-8")).hexdigest()
+        self.path = cache.cache_dir / RUNS_DIR_NAME / f"{run_key}.json"
+        self.run_id = cache.pinned_version or self._start()
+
+    def _start(self) -> str:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                run_id = json.load(file)["run"]
+            tqdm.write(f"Resuming the download of the features in {self.place} started at {run_id}")
+            return run_id
+        except (FileNotFoundError, KeyError, ValueError):
+            run_id = datetime.now(timezone.utc).isoformat()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as file:
+                json.dump({"run": run_id, "place": self.place, "tags": self.tags}, file)
+            return run_id
+
+    def _tile_params(self, tile: BaseGeometry) -> Dict:
+        return {"place": self.place, "tags": self.tags, "bounds": list(tile.bounds), "run": self.run_id}
+
+    def fetch_tile(self, tile: BaseGeometry) -> gpd.GeoDataFrame:
+        """
+        Get the features in one tile, from its checkpoint or the Overpass API
+        :param tile: the tile
+        :return: the features in the osmnx layout (empty, without an index, if there are none)
+        """
+        return self.cache.get_or_fetch(TILE_QUERY, self._tile_params(tile), lambda: _fetch_tile(tile, self.tags))
+
+    def complete(self, tiles: List[BaseGeometry]) -> None:
+        """
+        Remove the record of the run, and the checkpoints of its tiles unless the data version is pinned
+        :param tiles: the tiles of the run
+        """
+        if self.cache.pinned_version is None:
+            self.cache.discard(TILE_QUERY, [self._tile_params(tile) for tile in tiles])
+        self.path.unlink(missing_ok=True)
+
+
+def iter_tiled_features(
+    area: BaseGeometry,
+    tags: Dict,
+    cache: OsmCache,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    duplicates: Optional[DuplicateFilter] = None,
+    source: str = "",
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Fetch the features in an area tile by tile
+    :param area: the area, in EPSG:4326
+    :param tags: the tags of the features, in the osmnx format
+    :param cache: the cache the tiles are checkpointed to
+    :param tile_size: the width and height of the tiles, in degrees
+    :param workers: the number of tiles fetched at the same time
+    :param duplicates: the filter of features already returned (e.g. for another area), which are skipped.
+        Updated with the features returned
+    :param source: the name of the area in the report of duplicates and the checkpoints (defaults to a hash of
+        the area)
+    :return: an iterator over the new features of each tile, indexed by (element_type, osmid)
+    """
+    duplicates = duplicates if duplicates is not None else DuplicateFilter()
+    tiles = grid_tiles(area, tile_size)
+    run = TiledRun(cache, source or hashlib.sha256(area.wkb).hexdigest(), tags, tile_size)
+    area_geometry = pygeos.from_shapely(area)
+    pygeos.prepare(area_geometry)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tile_gdfs = executor.map(run.fetch_tile, tiles)
+        for tile_gdf in tqdm(tile_gdfs, total=len(tiles), desc="Fetching tiles"):
+            if tile_gdf.empty:
+                continue
+            tile_gdf = tile_gdf[pygeos.intersects(area_geometry, to_pygeos(tile_gdf.geometry))]
+            yield duplicates.filter(tile_gdf, feature_keys(tile_gdf), source)
+    run.complete(tiles)
+
+
+def geocode_area(place: str, cache: OsmCache) -> BaseGeometry:
+    """
+    :param place: a name recognized by the Nominatim database (e.g. "England")
+    :param cache: the cache of Nominatim results
+    :return: the boundary of the place
+    """
+    place_gdf = cache.get_or_fetch("geocode_to_gdf", {"query": place}, lambda: ox.geocode_to_gdf(place))
+    return place_gdf.geometry.iloc[0]
+
+
+def features_from_place(
+    place: str,
+    tags: Dict,
+    cache: OsmCache,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    duplicates: Optional[DuplicateFilter] = None,
+) -> gpd.GeoDataFrame:
+    """
+    The tiled equivalent of osmnx.geometries_from_place. See iter_tiled_features for the parameters
+    :param place: a name recognized by the Nominatim database (e.g. "England")
+    :return: the features, indexed by (element_type, osmid)
+    """
+    area = geocode_area(place, cache)
+    gdfs = list(iter_tiled_features(area, tags, cache, tile_size, workers, duplicates, source=place))
+    if not gdfs:
+        return _empty_features()
+    return gpd.GeoDataFrame(pd.concat(gdfs), crs=gdfs[0].crs)
@@ -0,0 +1,184 @@
+"""
+Writing and reading of workflow outputs in the configured formats (GeoJSON and/or GeoParquet).
+
+Every stage writes its outputs in the formats listed in the GEO_OUTPUT_FORMATS environment variable
+(a comma-separated list, by default "geojson,parquet"). The DVC pipelines declare both formats as outputs.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+from .metrics import span
+from .sinks import (
+    BBOX_COLUMN,
+    DEFAULT_ROW_GROUP_SIZE,
+    FeatureSink,
+    GeoParquetSink,
+    decategorize,
+    geodataframe_to_arrow,
+)
+
+OUTPUT_FORMATS_ENV_VAR = "GEO_OUTPUT_FORMATS"
+
+GEOJSON = "geojson"
+PARQUET = "parquet"
+
+FORMAT_EXTENSIONS = {GEOJSON: ".geojson", PARQUET: ".parquet"}
+DEFAULT_OUTPUT_FORMATS = (GEOJSON, PARQUET)
+
+Sink = Union[FeatureSink, GeoParquetSink]
+
+
+def get_output_formats() -> Tuple[str, ...]:
+    """
+    :return: the output formats configured by the GEO_OUTPUT_FORMATS environment variable
+    """
+    value = os.environ.get(OUTPUT_FORMATS_ENV_VAR)
+    if not value:
+        return DEFAULT_OUTPUT_FORMATS
+    formats = tuple(f.strip().lower() for f in value.split(",") if f.strip())
+    unknown_formats = set(formats) - set(FORMAT_EXTENSIONS)
+    if unknown_formats:
+        raise ValueError(f"Unknown output format(s) {sorted(unknown_formats)} in {OUTPUT_FORMATS_ENV_VAR}")
+    return formats
+
+
+def output_path(stem: str, output_format: str) -> str:
+    """
+    :param stem: the output file name without extension (e.g. "charge-points")
+    :param output_format: one of the supported formats
+    :return: the file name for the output in the given format
+    """
+    return stem + FORMAT_EXTENSIONS[output_format]
+
+
+def select_columns(
+    gdf: gpd.GeoDataFrame, columns: Sequence[str], dtypes: Optional[Dict[str, str]] = None
+) -> gpd.GeoDataFrame:
+    """
+    Select columns, adding any that are missing as empty columns, so that every frame written to a sink has the same
+    schema (e.g. OSM tags that no feature of a tile has)
+    :param gdf: the frame
+    :param columns: the columns to select, including the geometry
+    :param dtypes: types to give columns, e.g. "string" for tags, so that a column with no values has the same type
+        as one with values
+    :return: a GeoDataFrame with the columns
+    """
+    missing_columns = [column for column in columns if column not in gdf.columns]
+    gdf = gdf[[column for column in columns if column in gdf.columns]]
+    if missing_columns:
+        gdf = gdf.assign(**{column: None for column in missing_columns})[list(columns)]
+    return gdf.astype(dtypes) if dtypes else gdf
+
+
+def write_geoparquet(gdf: gpd.GeoDataFrame, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> None:
+    """
+    Write a GeoDataFrame to a GeoParquet file with a bbox covering column
+    :param gdf: the GeoDataFrame to write. The index is not kept
+    :param path: the file to write
+    :param row_group_size: the number of rows in each row group
+    """
+    pq.write_table(geodataframe_to_arrow(gdf), path, row_group_size=row_group_size)
+
+
+def write_outputs(gdf: gpd.GeoDataFrame, stem: str, formats: Optional[Sequence[str]] = None) -> None:
+    """
+    Write a GeoDataFrame in each of the output formats
+    :param gdf: the GeoDataFrame to write
+    :param stem: the output file name without extension (e.g. "charge-points")
+    :param formats: the formats to write (defaults to the configured output formats)
+    """
+    with span("write") as write_span:
+        for output_format in formats if formats is not None else get_output_formats():
+            path = output_path(stem, output_format)
+            if output_format == PARQUET:
+                write_geoparquet(gdf, path)
+            else:
+                decategorize(gdf).to_file(path, driver="GeoJSON")
+        write_span.rows_out += len(gdf)
+
+
+class OutputSink:
+    """
+    Writes a stream of GeoDataFrames (e.g. CSV chunks) in each of the output formats.
+    Has the same interface as FeatureSink.
+    """
+
+    def __init__(self, stem: str, formats: Optional[Sequence[str]] = None):
+        """
+        :param stem: the output file name without extension (e.g. "wpd-substation-data")
+        :param formats: the formats to write (defaults to the configured output formats)
+        """
+        self.sinks: List[Sink] = []
+        for output_format in formats if formats is not None else get_output_formats():
+            path = output_path(stem, output_format)
+            if output_format == PARQUET:
+                self.sinks.append(GeoParquetSink(path))
+            else:
+                self.sinks.append(FeatureSink(path, driver="GeoJSON"))
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        """
+        :param gdf: the features to write. May be empty
+        """
+        with span("write") as write_span:
+            for sink in self.sinks:
+                sink.write(gdf)
+            write_span.rows_out += len(gdf)
+
+    def close(self) -> None:
+        """Write any buffered features and close all the outputs"""
+        for sink in self.sinks:
+            sink.close()
+
+
+def read_geoparquet(
+    path: str, columns: Optional[Sequence[str]] = None, filters: Optional[List[Any]] = None
+) -> gpd.GeoDataFrame:
+    """
+    Read a GeoParquet file written by write_geoparquet or GeoParquetSink.
+    Column selection and filters are pushed down to the Parquet reader, so unused columns are never decoded and
+    row groups that cannot match the filters are skipped.
+    :param path: the file to read
+    :param columns: the attribute columns to read (the geometry is always read). Defaults to all of them
+    :param filters: row filters in the pyarrow.parquet format, e.g. [("LSOA11CD", "in", codes)]
+    :return: a GeoDataFrame without the bbox covering column
+    """
+    schema = pq.read_schema(path)
+    geo_metadata = json.loads(schema.metadata[b"geo"])
+    geometry_name = geo_metadata["primary_column"]
+    if columns is None:
+        columns = [name for name in schema.names if name not in (geometry_name, BBOX_COLUMN)]
+    with span("read") as read_span:
+        table = pq.read_table(path, columns=[*columns, geometry_name], filters=filters)
+        df = table.to_pandas()
+        crs = geo_metadata["columns"][geometry_name].get("crs")
+        geometry = gpd.GeoSeries.from_wkb(df.pop(geometry_name), crs=json.dumps(crs) if crs is not None else None)
+        read_span.rows_in += len(df)
+    return gpd.GeoDataFrame(df, geometry=geometry)
+
+
+def read_geodataframe(path: str, columns: Optional[Sequence[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Read a workflow output, in any of the output formats
+    :param path: the file to read
+    :param columns: the attribute columns to read (the geometry is always read). Defaults to all of them
+    """
+    if Path(path).suffix == FORMAT_EXTENSIONS[PARQUET]:
+        return read_geoparquet(path, columns=columns)
+    with span("read") as read_span:
+        gdf = gpd.read_file(path)
+        read_span.rows_in += len(gdf)
+    if columns is not None:
+        gdf = gdf[[*columns, gdf.geometry.name]]
+    return gdf
@@ -0,0 +1,195 @@
+"""
+A static R-tree over the bounding boxes of a layer's features, packed with the Sort-Tile-Recursive (STR) algorithm
+and persisted as plain numpy arrays, so it can be memory-mapped by any process rather than rebuilt.
+
+pygeos.STRtree cannot be saved, so a query service would otherwise rebuild the tree of every layer it opens. Here the
+boxes are sorted into runs of NODE_SIZE neighbouring boxes (by x into vertical slices, then by y within each slice);
+each run becomes a node whose box covers them, and the nodes are packed the same way into the level above, up to a
+single root. Every level is a contiguous block of one (n, 4) array, and the children of the i-th node of a level are
+the entries i * NODE_SIZE to (i + 1) * NODE_SIZE - 1 of the level below, so no child pointers are stored.
+"""
+import heapq
+import json
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NODE_SIZE = 16
+BOUNDS_FILE = "bounds.npy"
+LEVELS_FILE = "levels.npy"
+ORDER_FILE = "order.npy"
+META_FILE = "rtree.json"
+
+
+def box_distances(bounds: np.ndarray, x: float, y: float) -> np.ndarray:
+    """
+    :param bounds: boxes (minx, miny, maxx, maxy), as an (n, 4) array
+    :param x: the x of a point
+    :param y: the y of a point
+    :return: the distance from the point to each box (0 for boxes containing it)
+    """
+    dx = np.maximum(np.maximum(bounds[:, 0] - x, x - bounds[:, 2]), 0)
+    dy = np.maximum(np.maximum(bounds[:, 1] - y, y - bounds[:, 3]), 0)
+    return np.hypot(dx, dy)
+
+
+def _str_order(bounds: np.ndarray, node_size: int) -> np.ndarray:
+    centres_x = (bounds[:, 0] + bounds[:, 2]) / 2
+    centres_y = (bounds[:, 1] + bounds[:, 3]) / 2
+    n_nodes = -(-len(bounds) // node_size)
+    slice_size = node_size * int(np.ceil(np.sqrt(n_nodes)))
+    by_x = np.argsort(centres_x, kind="stable")
+    slices = np.arange(len(bounds)) // slice_size
+    return by_x[np.lexsort((centres_y[by_x], slices))]
+
+
+def _parent_bounds(bounds: np.ndarray, node_size: int) -> np.ndarray:
+    # fmin / fmax skip the NaN boxes of missing geometries
+    starts = np.arange(0, len(bounds), node_size)
+    return np.column_stack(
+        [
+            np.fmin.reduceat(bounds[:, 0], starts),
+            np.fmin.reduceat(bounds[:, 1], starts),
+            np.fmax.reduceat(bounds[:, 2], starts),
+            np.fmax.reduceat(bounds[:, 3], starts),
+        ]
+    )
+
+
+class PackedRTree:
+    """An STR-packed R-tree, answering box and nearest-neighbour queries with the positions of the boxes"""
+
+    def __init__(self, bounds: np.ndarray, levels: np.ndarray, order: np.ndarray, node_size: int = NODE_SIZE):
+        """
+        :param bounds: the boxes of every level, from the leaves (the boxes of the items, in STR order) to the root
+        :param levels: the offset of each level in bounds, and the total number of boxes
+        :param order: the position of the item of each leaf
+        :param node_size: the number of children of each node
+        """
+        self.bounds = bounds
+        self.levels = levels
+        self.order = order
+        self.node_size = node_size
+
+    @classmethod
+    def build(cls, bounds: np.ndarray, node_size: int = NODE_SIZE) -> "PackedRTree":
+        """
+        :param bounds: the box (minx, miny, maxx, maxy) of each item, as an (n, 4) array. Items with missing
+            geometries should have NaN boxes, which never match a query
+        :param node_size: the number of children of each node
+        :return: the tree of the items
+        """
+        order = _str_order(bounds, node_size) if len(bounds) else np.empty(0, dtype=np.int64)
+        level_bounds = [np.asarray(bounds, dtype=np.float64)[order]]
+        while len(level_bounds[-1]) > 1:
+            level_bounds.append(_parent_bounds(level_bounds[-1], node_size))
+        levels = np.cumsum([0] + [len(level) for level in level_bounds])
+        return cls(np.concatenate(level_bounds).reshape(-1, 4), levels, order.astype(np.int64), node_size)
+
+    def save(self, directory: str) -> None:
+        """
+        :param directory: the directory to write the arrays of the tree to
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / BOUNDS_FILE, self.bounds)
+        np.save(path / LEVELS_FILE, self.levels)
+        np.save(path / ORDER_FILE, self.order)
+        (path / META_FILE).write_text(json.dumps({"node_size": self.node_size}))
+
+    @classmethod
+    def load(cls, directory: str) -> "PackedRTree":
+        """
+        :param directory: a directory written by save
+        :return: the tree, with its arrays memory-mapped (so only the pages that queries touch are read)
+        """
+        path = Path(directory)
+        node_size = json.loads((path / META_FILE).read_text())["node_size"]
+        return cls(
+            np.load(path / BOUNDS_FILE, mmap_mode="r"),
+            np.load(path / LEVELS_FILE),
+            np.load(path / ORDER_FILE, mmap_mode="r"),
+            node_size,
+        )
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _level(self, level: int) -> np.ndarray:
+        return self.bounds[self.levels[level] : self.levels[level + 1]]
+
+    def _children(self, nodes: np.ndarray, level: int) -> np.ndarray:
+        # the entries of the level below the nodes of the given level
+        children = (nodes[:, np.newaxis] * self.node_size + np.arange(self.node_size)).ravel()
+        return children[children < self.levels[level] - self.levels[level - 1]]
+
+    def query(self, box: Sequence[float]) -> np.ndarray:
+        """
+        :param box: a box (minx, miny, maxx, maxy)
+        :return: the positions of the items whose boxes intersect the box, in ascending order
+        """
+        min_x, min_y, max_x, max_y = box
+        n_levels = len(self.levels) - 1
+        if n_levels == 0:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(len(self._level(n_levels - 1)))
+        for level in range(n_levels - 1, -1, -1):
+            bounds = self._level(level)[nodes]
+            hits = (bounds[:, 0] <= max_x) & (bounds[:, 2] >= min_x) & (bounds[:, 1] <= max_y) & (bounds[:, 3] >= min_y)
+            nodes = nodes[hits]
+            if level > 0:
+                nodes = self._children(nodes, level)
+        return np.sort(self.order[nodes])
+
+    def nearest(
+        self,
+        x: float,
+        y: float,
+        k: int,
+        distances: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        max_distance: float = np.inf,
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the nearest items to a point, by a best-first search of the tree
+        :param x: the x of the point
+        :param y: the y of the point
+        :param k: the number of items to find
+        :param distances: the exact distances from the point to the items at some positions, e.g. to their
+            geometries. Defaults to the distances to their boxes (exact for points)
+        :param max_distance: items further away than this are not returned
+        :return: the position of each of the (up to) k nearest items and its distance, nearest first
+        """
+        n_levels = len(self.levels) - 1
+        if n_levels == 0 or k <= 0:
+            return []
+        # entries are (distance, level, index): a node of a level, or an item (level -1) with its exact distance.
+        # The distance of a node is a lower bound of the distances of everything under it, so items are popped in
+        # order of distance
+        top = n_levels - 1
+        top_distances = box_distances(self._level(top), x, y).tolist()
+        heap = [(d, top, i) for i, d in enumerate(top_distances) if not np.isnan(d)]
+        heapq.heapify(heap)
+        nearest: List[Tuple[int, float]] = []
+        while heap and len(nearest) < k:
+            distance, level, index = heapq.heappop(heap)
+            if distance > max_distance:
+                break
+            if level < 0:
+                nearest.append((index, distance))
+                continue
+            if level > 1:
+                children = self._children(np.array([index]), level)
+                child_distances = box_distances(self._level(level - 1)[children], x, y)
+                for child, child_distance in zip(children.tolist(), child_distances.tolist()):
+                    if not np.isnan(child_distance):
+                        heapq.heappush(heap, (child_distance, level - 1, child))
+                continue
+            leaves = np.array([index]) if level == 0 else self._children(np.array([index]), level)
+            boxes = self._level(0)[leaves]
+            valid = ~np.isnan(boxes[:, 0])
+            items = np.asarray(self.order[leaves[valid]])
+            item_distances = distances(items) if distances is not None else box_distances(boxes[valid], x, y)
+            for item, item_distance in zip(items.tolist(), np.asarray(item_distances).tolist()):
+                heapq.heappush(heap, (item_distance, -1, item))
+        return nearest
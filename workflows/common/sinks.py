@@ -0,0 +1,251 @@
+"""
+Incremental writing of GeoDataFrames to a single open dataset.
+"""
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import fiona
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from geopandas.io.file import infer_schema
+
+DEFAULT_BATCH_SIZE = 100_000
+
+# Rows per Parquet row group. Readers can skip whole row groups using the column statistics (including the bbox
+# covering column), so smaller groups give finer-grained filtering at the cost of some compression.
+DEFAULT_ROW_GROUP_SIZE = 65_536
+
+GEOPARQUET_VERSION = "1.1.0"
+BBOX_COLUMN = "bbox"
+
+
+def decategorize(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Convert any categorical columns to the type of their categories. fiona cannot infer a schema for categorical
+    columns, and the frames in a stream may each have different categories
+    """
+    categorical_columns = [column for column, dtype in gdf.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if not categorical_columns:
+        return gdf
+    return gdf.astype({column: gdf[column].cat.categories.dtype for column in categorical_columns})
+
+
+class FeatureSink:
+    """
+    Writes a stream of GeoDataFrames (e.g. one per tile or CSV chunk) to one dataset, which is held open until the
+    sink is closed. Compared with calling GeoDataFrame.to_file(..., mode="a") for each frame, this avoids reopening
+    the datasource and re-validating its schema for every frame and writes features in large batches.
+
+    The schema (and CRS) are taken from the first non-empty frame, so empty frames can be written at any point. If no
+    features are written at all, the dataset is created empty from the schema passed to the sink, or without one,
+    closing the sink raises a ValueError. Either way no output of a previous run is left in place.
+    For GeoPackages the layer is created and populated in the same session, so GDAL builds the spatial index once,
+    when the sink is closed, rather than updating it for every batch.
+
+    Use as a context manager:
+
+        with FeatureSink("roads.gpkg", driver="GPKG") as sink:
+            for gdf in frames:
+                sink.write(gdf)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        driver: str = "GPKG",
+        layer: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        mode: str = "w",
+    ):
+        """
+        :param path: the file to write. Any existing file is removed, unless appending
+        :param driver: the OGR driver to write with (e.g. "GPKG", "GeoJSON")
+        :param layer: the layer name (defaults to the file name without extension for the GPKG driver)
+        :param schema: a fiona schema to use instead of inferring it from the first non-empty frame (and to create
+            an empty dataset with if no features are written)
+        :param batch_size: the number of features buffered before they are written
+        :param mode: "w" to write a new dataset, or "a" to append to an existing layer (with the same schema)
+        """
+        self.path = path
+        self.mode = mode
+        self.driver = driver
+        self.layer = layer if layer is not None or driver != "GPKG" else Path(path).stem
+        self.schema = schema
+        self.batch_size = batch_size
+        self.features_written = 0
+        self._collection: Optional[fiona.Collection] = None
+        self._buffer: List[gpd.GeoDataFrame] = []
+        self._buffered_rows = 0
+        self._closed = False
+        if mode == "w":
+            # removed now rather than when the first features are written, so a run that writes none cannot leave the
+            # previous output in place
+            Path(path).unlink(missing_ok=True)
+
+    def __enter__(self) -> "FeatureSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _open(self, gdf: Optional[gpd.GeoDataFrame]) -> None:
+        if self.mode == "a":
+            self._collection = fiona.open(self.path, "a", driver=self.driver, layer=self.layer)
+            return
+        schema = self.schema if self.schema is not None else infer_schema(decategorize(gdf))
+        crs_wkt = gdf.crs.to_wkt() if gdf is not None and gdf.crs is not None else None
+        self._collection = fiona.open(
+            self.path, "w", driver=self.driver, schema=schema, crs_wkt=crs_wkt, layer=self.layer
+        )
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        """
+        Queue a frame for writing. Frames must all have the same columns
+        :param gdf: the features to write. May be empty
+        """
+        if len(gdf) == 0:
+            return
+        self._buffer.append(gdf)
+        self._buffered_rows += len(gdf)
+        if self._buffered_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write any buffered features to the dataset"""
+        if not self._buffer:
+            return
+        if self._collection is None:
+            self._open(self._buffer[0])
+        assert self._collection is not None
+        self._collection.writerecords(itertools.chain.from_iterable(gdf.iterfeatures() for gdf in self._buffer))
+        self.features_written += self._buffered_rows
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self) -> None:
+        """Write any buffered features and close the dataset"""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        if self._collection is None and self.mode == "w":
+            if self.schema is None:
+                raise ValueError(f"No features were written to {self.path}, and there is no schema to create it with")
+            self._open(None)
+        if self._collection is not None:
+            self._collection.close()
+
+
+def _geo_metadata(gdf: gpd.GeoDataFrame) -> Dict[str, Any]:
+    geometry_name = gdf.geometry.name
+    return {
+        "version": GEOPARQUET_VERSION,
+        "primary_column": geometry_name,
+        "columns": {
+            geometry_name: {
+                "encoding": "WKB",
+                # the geometry types of later row groups are not known when the schema is written
+                "geometry_types": [],
+                "crs": gdf.crs.to_json_dict() if gdf.crs is not None else None,
+                "covering": {
+                    "bbox": {key: [BBOX_COLUMN, key] for key in ("xmin", "ymin", "xmax", "ymax")},
+                },
+            }
+        },
+    }
+
+
+def geodataframe_to_arrow(gdf: gpd.GeoDataFrame) -> pa.Table:
+    """
+    Convert a GeoDataFrame to an Arrow table following the GeoParquet specification: the geometry is WKB encoded
+    and a "bbox" struct column holds the bounds of each geometry, so readers can filter rows (and skip whole row
+    groups) spatially without decoding the geometries.
+    :param gdf: the GeoDataFrame to convert. The index is not kept
+    :return: an Arrow table with GeoParquet metadata
+    """
+    gdf = decategorize(gdf)
+    geometry = gdf.geometry
+    bounds = geometry.bounds
+    table = pa.Table.from_pandas(pd.DataFrame(gdf.drop(columns=[geometry.name])), preserve_index=False)
+    table = table.append_column(geometry.name, pa.array(geometry.to_wkb(), type=pa.binary()))
+    bbox = pa.StructArray.from_arrays(
+        [pa.array(bounds[column].to_numpy(), type=pa.float64()) for column in ("minx", "miny", "maxx", "maxy")],
+        names=["xmin", "ymin", "xmax", "ymax"],
+    )
+    table = table.append_column(BBOX_COLUMN, bbox)
+    metadata = {**(table.schema.metadata or {}), b"geo": json.dumps(_geo_metadata(gdf)).encode("utf-8")}
+    return table.replace_schema_metadata(metadata)
+
+
+class GeoParquetSink:
+    """
+    Writes a stream of GeoDataFrames to a GeoParquet file, one row group per row_group_size rows.
+    The Arrow schema is taken from the first row group, so all frames must have the same columns and types, and
+    closing the sink raises a ValueError if no features were written. Has the same interface as FeatureSink.
+    """
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        """
+        :param path: the file to write. Any existing file is removed
+        :param row_group_size: the number of rows in each row group
+        """
+        self.path = path
+        self.row_group_size = row_group_size
+        self.features_written = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._buffer: List[gpd.GeoDataFrame] = []
+        self._buffered_rows = 0
+        self._closed = False
+        # as for FeatureSink, so a run that writes no features cannot leave the previous output in place
+        Path(path).unlink(missing_ok=True)
+
+    def __enter__(self) -> "GeoParquetSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        """
+        Queue a frame for writing
+        :param gdf: the features to write. May be empty
+        """
+        if len(gdf) == 0:
+            return
+        self._buffer.append(gdf)
+        self._buffered_rows += len(gdf)
+        while self._buffered_rows >= self.row_group_size:
+            self._write_row_group(self.row_group_size)
+
+    def _write_row_group(self, num_rows: int) -> None:
+        gdf = gpd.GeoDataFrame(pd.concat(self._buffer, ignore_index=True), crs=self._buffer[0].crs)
+        row_group, rest = gdf.iloc[:num_rows], gdf.iloc[num_rows:]
+        table = geodataframe_to_arrow(row_group)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table, row_group_size=num_rows)
+        self.features_written += len(row_group)
+        self._buffer = [rest] if len(rest) > 0 else []
+        self._buffered_rows = len(rest)
+
+    def flush(self) -> None:
+        """Write any buffered features as a (possibly short) row group"""
+        if self._buffered_rows > 0:
+            self._write_row_group(self._buffered_rows)
+
+    def close(self) -> None:
+        """Write any buffered features and close the file"""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        if self._writer is None:
+            raise ValueError(f"No features were written to {self.path}")
+        self._writer.close()
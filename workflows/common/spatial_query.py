@@ -0,0 +1,310 @@
+"""
+Spatial queries (features within a radius, within a polygon, or nearest to a point) over the workflow outputs, answered
+from indexes persisted on disk rather than by reading and indexing whole outputs.
+
+The index of a layer is a directory holding a packed R-tree of its features (see rtree.py) and their geometries as
+WKB in the British National Grid (EPSG:27700), so distances are in metres; all of it is memory-mapped, so opening a
+layer reads almost nothing and a query reads only the pages of the tree and the geometries it touches. The
+attributes of the results are taken from the GeoParquet output itself, reading only the row groups that hold them
+(each is decoded once and kept for later queries). A layer is only opened when it is first queried, and its index is
+rebuilt if the contents of its output have changed since it was built.
+
+e.g.
+    service = SpatialQueryService()
+    service.layer("charge-points").within_radius(-1.2577, 51.7520, 2000)
+    service.layer("dnos-primary-substations").nearest(-1.2577, 51.7520, k=3)
+"""
+import hashlib
+import json
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pygeos
+from pyproj import Transformer
+
+from .geometry import from_pygeos, to_pygeos
+from .outputs import read_geoparquet
+from .rtree import PackedRTree
+from .sinks import BBOX_COLUMN
+
+WORKFLOWS_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_INDEX_DIR = WORKFLOWS_DIR / "query" / "indexes"
+
+INDEX_CRS = "EPSG:27700"
+QUERY_CRS = "EPSG:4326"
+DISTANCE_COLUMN = "distance"
+
+GEOMETRIES_FILE = "geometries.wkb"
+OFFSETS_FILE = "offsets.npy"
+SOURCE_FILE = "source.json"
+
+# the outputs that can be queried, relative to the workflows directory
+LAYERS = {
+    "charge-points": "charge-points/charge-points.parquet",
+    "dnos-primary-substations": "dnos/merge/dnos-primary-substations.parquet",
+    "car-parks": "car-parks/car-parks.parquet",
+    "bus-stops-and-stations": "bus-stops-stations/bus-stops-and-stations.parquet",
+    "imd": "demographics/gb-imd.parquet",
+    "ev-registrations": "ev-registrations/ev-registrations.parquet",
+}
+
+
+@lru_cache(maxsize=None)
+def _transformer(from_crs: str, to_crs: str) -> Transformer:
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def transform(geometries: np.ndarray, from_crs: str, to_crs: str) -> np.ndarray:
+    """
+    Reproject geometries with a cached transformer (GeoSeries.to_crs creates one on each call, which takes longer
+    than a query)
+    :param geometries: pygeos geometries
+    :param from_crs: their CRS
+    :param to_crs: the CRS to reproject them to
+    :return: the reprojected geometries
+    """
+    coordinates = pygeos.get_coordinates(geometries)
+    x, y = _transformer(from_crs, to_crs).transform(coordinates[:, 0], coordinates[:, 1])
+    return pygeos.set_coordinates(np.array(geometries, dtype=object, copy=True), np.column_stack([x, y]))
+
+
+def to_index_crs(geometry: pygeos.Geometry) -> pygeos.Geometry:
+    """
+    :param geometry: a geometry in EPSG:4326 (longitude, latitude)
+    :return: the geometry in the CRS of the indexes
+    """
+    return transform(np.array([geometry], dtype=object), QUERY_CRS, INDEX_CRS)[0]
+
+
+def _source_signature(source_path: Path) -> Dict[str, Union[int, str]]:
+    # the Parquet footer holds the schema and the row count, offsets, sizes and statistics of every column chunk, so
+    # its hash changes with the contents of the file but not with its modification time (e.g. on "dvc checkout")
+    with open(source_path, "rb") as file:
+        size = file.seek(0, 2)
+        file.seek(size - 8)
+        footer_length, magic = struct.unpack("<i4s", file.read(8))
+        if magic != b"PAR1":
+            raise ValueError(f"{source_path} is not a Parquet file")
+        file.seek(size - 8 - footer_length)
+        footer = file.read(footer_length)
+    return {"size": size, "footer_sha256": hashlib.sha256(footer).hexdigest()}
+
+
+def build_index(source_path: Union[str, Path], index_dir: Union[str, Path]) -> None:
+    """
+    Build the index of a GeoParquet output
+    :param source_path: the output
+    :param index_dir: the directory to write the index to
+    """
+    source_path, index_dir = Path(source_path), Path(index_dir)
+    gdf = read_geoparquet(str(source_path), columns=[])
+    geometries = to_pygeos(gdf.geometry.to_crs(INDEX_CRS))
+    bounds = pygeos.bounds(geometries)
+    PackedRTree.build(bounds).save(str(index_dir))
+    wkbs = [wkb or b"" for wkb in pygeos.to_wkb(geometries)]
+    offsets = np.cumsum([0] + [len(wkb) for wkb in wkbs]).astype(np.int64)
+    with open(index_dir / GEOMETRIES_FILE, "wb") as f:
+        for wkb in wkbs:
+            f.write(wkb)
+    np.save(index_dir / OFFSETS_FILE, offsets)
+    # written last, so an index left incomplete by an error is rebuilt
+    (index_dir / SOURCE_FILE).write_text(json.dumps({"path": str(source_path), **_source_signature(source_path)}))
+
+
+def index_is_current(source_path: Union[str, Path], index_dir: Union[str, Path]) -> bool:
+    """
+    :param source_path: an output
+    :param index_dir: the directory of its index
+    :return: whether the index exists and was built from the output as it is now
+    """
+    source_file = Path(index_dir) / SOURCE_FILE
+    if not source_file.exists():
+        return False
+    built_from = json.loads(source_file.read_text())
+    return all(built_from.get(key) == value for key, value in _source_signature(Path(source_path)).items())
+
+
+class QueryLayer:
+    """The features of one output, and its index, opened on the first query"""
+
+    def __init__(self, name: str, source_path: Union[str, Path], index_dir: Union[str, Path]):
+        """
+        :param name: the name of the layer
+        :param source_path: the GeoParquet output
+        :param index_dir: the directory of its index (built there if it is missing or out of date)
+        """
+        self.name = name
+        self.source_path = Path(source_path)
+        self.index_dir = Path(index_dir)
+        self._tree: Optional[PackedRTree] = None
+        self._wkb: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._parquet_file: Optional[pq.ParquetFile] = None
+        self._attribute_columns: List[str] = []
+        self._row_group_starts: Optional[np.ndarray] = None
+        self._row_groups: Dict[int, pa.Table] = {}
+
+    def open(self) -> None:
+        """Open the index, building it first if it is missing or out of date. Queries call this"""
+        if self._tree is not None:
+            return
+        if not index_is_current(self.source_path, self.index_dir):
+            print(f"Building the index of {self.name}")
+            build_index(self.source_path, self.index_dir)
+        self._tree = PackedRTree.load(str(self.index_dir))
+        self._offsets = np.load(self.index_dir / OFFSETS_FILE, mmap_mode="r")
+        if self._offsets[-1] > 0:
+            self._wkb = np.memmap(self.index_dir / GEOMETRIES_FILE, dtype=np.uint8, mode="r")
+        else:
+            self._wkb = np.empty(0, dtype=np.uint8)
+
+    @property
+    def tree(self) -> PackedRTree:
+        self.open()
+        return self._tree
+
+    def geometries(self, positions: np.ndarray) -> np.ndarray:
+        """
+        :param positions: the positions of features in the output
+        :return: their geometries, in the CRS of the index
+        """
+        self.open()
+        starts, ends = self._offsets[positions], self._offsets[np.asarray(positions) + 1]
+        wkbs = np.array([self._wkb[start:end].tobytes() or None for start, end in zip(starts, ends)], dtype=object)
+        return pygeos.from_wkb(wkbs)
+
+    def _open_attributes(self) -> None:
+        if self._parquet_file is not None:
+            return
+        parquet_file = pq.ParquetFile(self.source_path, memory_map=True)
+        schema = parquet_file.schema_arrow
+        geometry_name = json.loads(schema.metadata[b"geo"])["primary_column"]
+        self._attribute_columns = [name for name in schema.names if name not in (geometry_name, BBOX_COLUMN)]
+        row_group_sizes = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+        self._row_group_starts = np.cumsum([0] + row_group_sizes).astype(np.int64)
+        self._parquet_file = parquet_file
+
+    def _row_group(self, row_group: int) -> pa.Table:
+        if row_group not in self._row_groups:
+            self._row_groups[row_group] = self._parquet_file.read_row_group(
+                row_group, columns=self._attribute_columns
+            )
+        return self._row_groups[row_group]
+
+    def attributes(self, positions: np.ndarray) -> pd.DataFrame:
+        """
+        :param positions: the positions of features in the output
+        :return: their attributes, indexed by position. Only the row groups holding the features are read
+        """
+        self._open_attributes()
+        positions = np.asarray(positions, dtype=np.int64)
+        row_groups = np.searchsorted(self._row_group_starts, positions, side="right") - 1
+        read_row_groups = np.unique(row_groups)
+        if len(read_row_groups) > 0:
+            tables = [self._row_group(row_group) for row_group in read_row_groups]
+            table = pa.concat_tables(tables)
+            # the position of each feature in the concatenated row groups
+            table_starts = np.cumsum([0] + [t.num_rows for t in tables[:-1]]).astype(np.int64)
+            rows = table_starts[np.searchsorted(read_row_groups, row_groups)] + positions
+            rows -= self._row_group_starts[row_groups]
+        else:
+            schema = self._parquet_file.schema_arrow
+            table = pa.schema([schema.field(name) for name in self._attribute_columns]).empty_table()
+            rows = positions
+        df = table.take(pa.array(rows)).to_pandas()
+        df.index = pd.Index(positions)
+        return df
+
+    def _results(
+        self, positions: np.ndarray, geometries: np.ndarray, distances: Optional[np.ndarray] = None
+    ) -> gpd.GeoDataFrame:
+        df = self.attributes(positions)
+        if distances is not None:
+            df[DISTANCE_COLUMN] = distances
+        geometries = transform(geometries, INDEX_CRS, QUERY_CRS)
+        return gpd.GeoDataFrame(df, geometry=from_pygeos(geometries, df.index, QUERY_CRS))
+
+    def within_radius(self, longitude: float, latitude: float, metres: float) -> gpd.GeoDataFrame:
+        """
+        :param longitude: the longitude of the centre
+        :param latitude: the latitude of the centre
+        :param metres: the radius
+        :return: the features within the radius of the centre, nearest first, with their distance in metres
+        """
+        centre = to_index_crs(pygeos.points(longitude, latitude))
+        x, y = pygeos.get_x(centre), pygeos.get_y(centre)
+        positions = self.tree.query((x - metres, y - metres, x + metres, y + metres))
+        geometries = self.geometries(positions)
+        distances = pygeos.distance(geometries, centre)
+        order = np.argsort(distances, kind="stable")
+        order = order[distances[order] <= metres]
+        return self._results(positions[order], geometries[order], distances[order])
+
+    def within_polygon(self, polygon: pygeos.Geometry) -> gpd.GeoDataFrame:
+        """
+        :param polygon: a polygon, in EPSG:4326
+        :return: the features intersecting the polygon
+        """
+        polygon = to_index_crs(polygon)
+        positions = self.tree.query(pygeos.bounds(polygon))
+        geometries = self.geometries(positions)
+        pygeos.prepare(polygon)
+        hits = pygeos.intersects(geometries, polygon)
+        return self._results(positions[hits], geometries[hits])
+
+    def nearest(
+        self, longitude: float, latitude: float, k: int = 1, max_distance: float = np.inf
+    ) -> gpd.GeoDataFrame:
+        """
+        :param longitude: the longitude of the point
+        :param latitude: the latitude of the point
+        :param k: the number of features to find
+        :param max_distance: the maximum distance of the features, in metres
+        :return: the k features nearest the point, nearest first, with their distance in metres
+        """
+        point = to_index_crs(pygeos.points(longitude, latitude))
+        nearest = self.tree.nearest(
+            pygeos.get_x(point),
+            pygeos.get_y(point),
+            k,
+            lambda positions: pygeos.distance(self.geometries(positions), point),
+            max_distance,
+        )
+        positions = np.array([position for position, _ in nearest], dtype=np.int64)
+        distances = np.array([distance for _, distance in nearest], dtype=float)
+        return self._results(positions, self.geometries(positions), distances)
+
+
+class SpatialQueryService:
+    """The queryable outputs, each opened when it is first asked for"""
+
+    def __init__(self, layers: Optional[Dict[str, str]] = None, index_dir: Union[str, Path] = DEFAULT_INDEX_DIR):
+        """
+        :param layers: the GeoParquet output of each layer, relative to the workflows directory (defaults to LAYERS)
+        :param index_dir: the directory of the indexes, with one subdirectory per layer
+        """
+        self.layer_paths = dict(LAYERS if layers is None else layers)
+        self.index_dir = Path(index_dir)
+        self._layers: Dict[str, QueryLayer] = {}
+
+    @property
+    def layer_names(self) -> List[str]:
+        return list(self.layer_paths)
+
+    def layer(self, name: str) -> QueryLayer:
+        """
+        :param name: the name of a layer
+        :return: the layer
+        """
+        if name not in self._layers:
+            if name not in self.layer_paths:
+                raise KeyError(f"Unknown layer {name}, expected one of {self.layer_names}")
+            self._layers[name] = QueryLayer(name, WORKFLOWS_DIR / self.layer_paths[name], self.index_dir / name)
+        return self._layers[name]
@@ -0,0 +1,110 @@
+"""
+Column-projected, typed reading of large third-party CSV files in memory-bounded chunks.
+"""
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from .metrics import span
+
+PANDAS_ENGINE = "pandas"
+PYARROW_ENGINE = "pyarrow"
+CSV_ENGINES = (PANDAS_ENGINE, PYARROW_ENGINE)
+
+DEFAULT_MEMORY_BUDGET = 256 * 2 ** 20
+# rows parsed to estimate the in-memory size of a row
+SAMPLE_ROWS = 1_000
+MIN_CHUNK_SIZE = 1_000
+# parsing needs extra memory on top of the resulting frame (parser buffers, the copy made when building a
+# GeoDataFrame from a chunk, ...) so only this fraction of the budget is used for the chunk itself
+BUDGET_FRACTION = 0.25
+
+_ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "str": pa.string(),
+    "float64": pa.float64(),
+    "int64": pa.int64(),
+    "bool": pa.bool_(),
+}
+
+
+def chunksize_for_budget(
+    file_path: str,
+    columns: List[str],
+    dtypes: Dict[str, str],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    **read_csv_kwargs,
+) -> int:
+    """
+    Estimate how many rows can be parsed at a time within a memory budget, by parsing a sample of the file with the
+    same column selection and types
+    :param file_path: the CSV file
+    :param columns: the columns that will be read
+    :param dtypes: the types of the columns (pandas dtype names)
+    :param memory_budget: the memory, in bytes, available for parsing
+    :param read_csv_kwargs: any other arguments that will be passed to pandas.read_csv (e.g. encoding)
+    :return: the number of rows per chunk
+    """
+    sample = pd.read_csv(file_path, usecols=columns, dtype=dtypes, nrows=SAMPLE_ROWS, **read_csv_kwargs)
+    bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+    return max(MIN_CHUNK_SIZE, int(memory_budget * BUDGET_FRACTION / max(bytes_per_row, 1)))
+
+
+def _read_csv_chunks(
+    file_path: str,
+    columns: List[str],
+    dtypes: Dict[str, str],
+    encoding: Optional[str] = None,
+    engine: str = PANDAS_ENGINE,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Iterator[pd.DataFrame]:
+    if engine == PYARROW_ENGINE:
+        read_options = pa_csv.ReadOptions(
+            encoding=encoding or "utf8", block_size=max(2 ** 20, int(memory_budget * BUDGET_FRACTION))
+        )
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=columns, column_types={column: _ARROW_TYPES[dtypes[column]] for column in columns}
+        )
+        with pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options) as reader:
+            for batch in reader:
+                yield batch.to_pandas()
+        return
+
+    if engine != PANDAS_ENGINE:
+        raise ValueError(f"Unknown CSV engine {engine}, expected one of {CSV_ENGINES}")
+    chunksize = chunksize_for_budget(file_path, columns, dtypes, memory_budget, encoding=encoding)
+    with pd.read_csv(file_path, usecols=columns, dtype=dtypes, encoding=encoding, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def read_csv_chunks(
+    file_path: str,
+    columns: List[str],
+    dtypes: Dict[str, str],
+    encoding: Optional[str] = None,
+    engine: str = PANDAS_ENGINE,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read only the given columns of a CSV file, with explicit types, in chunks sized to fit a memory budget.
+    Pushing the column selection and types into the parser avoids materialising (and type-inferring) columns that
+    are then thrown away, and makes the types of every chunk the same.
+    :param file_path: the CSV file
+    :param columns: the columns to read
+    :param dtypes: the type of each column, one of "category", "str", "float64", "int64" or "bool"
+    :param encoding: the encoding of the file (defaults to UTF-8)
+    :param engine: "pandas" (the C parser) or "pyarrow" (multi-threaded)
+    :param memory_budget: the memory, in bytes, available for parsing each chunk
+    :return: an iterator over the chunks
+    """
+    chunks = _read_csv_chunks(file_path, columns, dtypes, encoding, engine, memory_budget)
+    while True:
+        # the parsing of each chunk is measured, but not the work done on it by the caller
+        with span("parse") as parse_span:
+            chunk = next(chunks, None)
+            parse_span.rows_in += len(chunk) if chunk is not None else 0
+        if chunk is None:
+            return
+        yield chunk
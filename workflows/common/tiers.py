@@ -0,0 +1,157 @@
+"""
+Simplified, reduced-precision tiers of boundary outputs, for drawing on maps.
+
+Boundary outputs (e.g. the LSOA or postcode district polygons) keep every vertex of the source data at full
+coordinate precision. Each tier simplifies the geometries with a tolerance, keeping them valid (preserve_topology),
+then rounds their coordinates to a grid (so GeoJSON is written with fewer digits), so both the files and the work of
+drawing them shrink. The geometries are split into chunks which are processed in a pool of worker processes, with one
+vectorized pygeos call per chunk.
+
+Each geometry is simplified on its own, so the shared edge of two neighbouring areas may be simplified differently
+for each of them, leaving slivers between them at the coarser tolerances.
+
+The tiers of an output "<stem>" are written to "<stem>-tiers/<stem>-<tier>" in each output format.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import pygeos
+
+from .geometry import from_pygeos, to_pygeos
+from .metrics import span
+from .outputs import write_outputs
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# geometries per task sent to the worker processes
+CHUNK_SIZE = 2_000
+TIERS_DIRECTORY_SUFFIX = "-tiers"
+
+
+@dataclass(frozen=True)
+class Tier:
+    """
+    :param name: the name of the tier, used in its file names
+    :param tolerance: the simplification tolerance, in degrees (0 to keep every vertex)
+    :param grid_size: the size of the grid coordinates are rounded to, in degrees
+    """
+
+    name: str
+    tolerance: float
+    grid_size: float
+
+
+# in Great Britain, 0.00001 degrees is about 1m (less in longitude)
+TIERS: Dict[str, Tier] = {
+    tier.name: tier
+    for tier in [
+        Tier(name="precise", tolerance=0.0, grid_size=0.000001),
+        Tier(name="fine", tolerance=0.00005, grid_size=0.00001),
+        Tier(name="medium", tolerance=0.0002, grid_size=0.00001),
+        Tier(name="coarse", tolerance=0.001, grid_size=0.0001),
+    ]
+}
+
+
+def simplify_geometries(geometries: np.ndarray, tolerance: float, grid_size: float) -> np.ndarray:
+    """
+    :param geometries: pygeos geometries, in EPSG:4326
+    :param tolerance: the simplification tolerance
+    :param grid_size: the size of the grid coordinates are rounded to
+    :return: the simplified geometries, with rounded coordinates
+    """
+    if tolerance > 0:
+        geometries = pygeos.simplify(geometries, tolerance, preserve_topology=True)
+    # pygeos.set_precision snap-rounds each geometry as a whole, which is slower and fails (TopologyException) on
+    # some polygons, so the coordinates are rounded one by one and the few geometries this makes invalid repaired
+    coordinates = pygeos.get_coordinates(geometries)
+    geometries = pygeos.set_coordinates(geometries.copy(), np.round(coordinates / grid_size) * grid_size)
+    invalid = ~pygeos.is_valid(geometries) & ~pygeos.is_missing(geometries)
+    geometries[invalid] = pygeos.make_valid(geometries[invalid])
+    return geometries
+
+
+def simplify_tiers(
+    gdf: gpd.GeoDataFrame, tiers: Sequence[Tier], workers: int = DEFAULT_WORKERS
+) -> Dict[str, gpd.GeoDataFrame]:
+    """
+    :param gdf: the features, in EPSG:4326
+    :param tiers: the tiers to compute
+    :param workers: the number of worker processes
+    :return: the features of each tier, with simplified geometries, keyed by tier name
+    """
+    geometries = to_pygeos(gdf.geometry)
+    chunks = np.array_split(geometries, max(1, -(-len(geometries) // CHUNK_SIZE)))
+    tasks = [(tier, chunk) for tier in tiers for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                simplify_geometries,
+                [chunk for _, chunk in tasks],
+                [tier.tolerance for tier, _ in tasks],
+                [tier.grid_size for tier, _ in tasks],
+            )
+        )
+    tier_gdfs = {}
+    for i, tier in enumerate(tiers):
+        simplified = np.concatenate(results[i * len(chunks) : (i + 1) * len(chunks)])
+        tier_gdfs[tier.name] = gdf.set_geometry(from_pygeos(simplified, gdf.index, gdf.crs))
+    return tier_gdfs
+
+
+def tier_stem(stem: str, tier_name: str) -> str:
+    """
+    :param stem: the output file name without extension (e.g. "uk-postcode-districts")
+    :param tier_name: the name of the tier
+    :return: the file name of the tier without extension, e.g. "uk-postcode-districts-tiers/uk-postcode-districts-fine"
+    """
+    path = Path(stem)
+    return str(path.parent / f"{path.name}{TIERS_DIRECTORY_SUFFIX}" / f"{path.name}-{tier_name}")
+
+
+def write_tiers(gdf: gpd.GeoDataFrame, stem: str, tiers: Sequence[Tier], workers: int = DEFAULT_WORKERS) -> None:
+    """
+    Write the tiers of an output in each of the output formats
+    :param gdf: the features of the output
+    :param stem: the output file name without extension
+    :param tiers: the tiers to write
+    :param workers: the number of worker processes
+    """
+    if not tiers:
+        return
+    with span("tiers") as tiers_span:
+        tier_gdfs = simplify_tiers(gdf.to_crs("EPSG:4326"), tiers, workers)
+        tiers_span.rows_in += len(gdf)
+    for tier_name, tier_gdf in tier_gdfs.items():
+        path = tier_stem(stem, tier_name)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        write_outputs(tier_gdf, path)
+
+
+def add_tiers_argument(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the --tiers option of the stages that write boundary outputs
+    :param parser: the parser of the stage's arguments
+    """
+    parser.add_argument(
+        "--tiers",
+        nargs="*",
+        choices=list(TIERS),
+        default=None,
+        help="also write simplified tiers of the outputs (all tiers if none are given)",
+    )
+
+
+def selected_tiers(tier_names: Optional[List[str]]) -> List[Tier]:
+    """
+    :param tier_names: the value of the --tiers option
+    :return: the tiers to write: none if the option was not given, all if it was given without names
+    """
+    if tier_names is None:
+        return []
+    return [TIERS[name] for name in tier_names or TIERS]
@@ -22,6 +22,6 @@ cd "$(dirname "$0")"
 IMD_DOWNLOAD_URL="https://www.arcgis.com/sharing/rest/content/items/5e1c399d787e48c0902e5fe4fc1ccfe3/data"
 OUT_FILE="england-imd"
 
-curl -SL -X "GET" $IMD_DOWNLOAD_URL -o "${OUT_FILE}.zip"
-unzip "${OUT_FILE}.zip" -d "./${OUT_FILE}"
-rm "${OUT_FILE}.zip"
+# the zip file is kept so that later runs only download it again if it has changed
+python ../../common/fetch.py "$IMD_DOWNLOAD_URL" "${OUT_FILE}.zip" --metrics england-imd-download
+unzip -o "${OUT_FILE}.zip" -d "./${OUT_FILE}"
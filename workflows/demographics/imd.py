@@ -0,0 +1,183 @@
+"""
+Builds the Great Britain indices of multiple deprivation (IMD) dataset from the English, Scottish and Welsh indices.
+
+Each nation publishes its own index: England with deciles for its LSOAs, Scotland with ranks and an overall decile
+for its data zones, and Wales with ranks for its LSOAs. The deciles that are not published are computed from the
+ranks, all at once. The English and Welsh LSOAs share the geometry of the LSOA boundaries, which is read once,
+with only the rows of the LSOAs in the indices. LSOAs missing from the boundaries are kept, without a geometry. The
+Scottish data zones have their own geometry.
+
+Writes a dataset for Great Britain and one for each nation, all with the same columns and int8 deciles (float32, with
+NaN for the missing deciles, if an area of the nation has no rank).
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tiers import (  # noqa: E402 pylint: disable=wrong-import-position
+    add_tiers_argument,
+    selected_tiers,
+    write_tiers,
+)
+
+LSOA_BOUNDARIES_FILE = "../boundaries-lsoa/lsoa-boundaries.parquet"
+ENGLAND_IMD_SHAPEFILE = "england/england-imd/IMD_2019.shp"
+SCOTLAND_IMD_SHAPEFILE = "scotland/scotland-imd/SG_SIMD_2020.shp"
+WALES_IMD_FILE = "wales/wales-imd/wales-imd-raw.csv"
+
+GB_OUTPUT = "gb-imd"
+NATION_OUTPUTS = {
+    "England": "england/england-imd",
+    "Scotland": "scotland/scotland-imd",
+    "Wales": "wales/wales-imd",
+}
+
+CRS = "EPSG:4326"
+AREA_CODE_COLUMN = "areaCode"
+NATION_COLUMN = "nation"
+DECILE_COLUMNS = ["OverallDecile", "IncomeDecile", "EducationDecile", "CrimeDecile", "HealthDecile"]
+DECILE_DTYPE = "int8"
+MISSING_DECILE_DTYPE = "float32"
+
+# the columns of the English index, and the decile columns they hold
+ENGLAND_CODE_COLUMN = "lsoa11cd"
+ENGLAND_DECILES = {
+    "IMD_Decile": "OverallDecile",
+    "IncDec": "IncomeDecile",
+    "EduDec": "EducationDecile",
+    "CriDec": "CrimeDecile",
+    "HDDDec": "HealthDecile",
+}
+# the Scottish index only has an overall decile; the others are computed from the ranks
+SCOTLAND_CODE_COLUMN = "DataZone"
+SCOTLAND_DECILES = {"Decilev2": "OverallDecile"}
+SCOTLAND_RANKS = {
+    "IncRankv2": "IncomeDecile",
+    "EduRank": "EducationDecile",
+    "CrimeRank": "CrimeDecile",
+    "HlthRank": "HealthDecile",
+}
+# the Welsh index only has ranks. Wales doesn't have a separate 'Crime' score; community safety takes into
+# account crime and a few other factors
+WALES_CODE_COLUMN = "Local Area (2011 LSOA)"
+WALES_RANKS = {
+    "Overall rank(2019)": "OverallDecile",
+    "Income(2019)": "IncomeDecile",
+    "Education(2019)": "EducationDecile",
+    "Community Safety(2019)": "CrimeDecile",
+    "Health(2019)": "HealthDecile",
+}
+
+
+def rank_deciles(ranks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the decile of each rank of each column, as pd.qcut(column, 10, labels=False) + 1 would, for all the
+    columns in one vectorized pass
+    note: rank 1 is the most deprived, so decile 1 is the most deprived
+    :param ranks: columns of ranks
+    :return: the deciles (1.0 to 10.0) of the ranks, with the same columns (NaN for missing ranks)
+    """
+    values = ranks.to_numpy(dtype=float)
+    # the 9 inner decile edges of each column, ignoring missing ranks: an array of shape (9, number of columns)
+    edges = np.nanquantile(values, np.linspace(0.1, 0.9, 9), axis=0)
+    # each bin includes its upper edge
+    deciles = (values[:, :, np.newaxis] > edges.T[np.newaxis, :, :]).sum(axis=2) + 1.0
+    deciles[np.isnan(values)] = np.nan
+    return pd.DataFrame(deciles, index=ranks.index, columns=ranks.columns)
+
+
+def _index_frame(codes: pd.Series, deciles: pd.DataFrame, nation: str) -> pd.DataFrame:
+    df = pd.DataFrame({AREA_CODE_COLUMN: codes.to_numpy(), NATION_COLUMN: nation}, index=deciles.index)
+    deciles = deciles[DECILE_COLUMNS]
+    return pd.concat(
+        [df, deciles.astype(MISSING_DECILE_DTYPE if deciles.isna().any(axis=None) else DECILE_DTYPE)], axis=1
+    )
+
+
+def read_england_imd() -> pd.DataFrame:
+    # the geometry is that of the LSOA boundaries, so only the attributes are read
+    df = gpd.read_file(ENGLAND_IMD_SHAPEFILE, ignore_geometry=True)
+    return _index_frame(df[ENGLAND_CODE_COLUMN], df[list(ENGLAND_DECILES)].rename(columns=ENGLAND_DECILES), "England")
+
+
+def read_wales_imd() -> pd.DataFrame:
+    df = pd.read_csv(WALES_IMD_FILE, usecols=[WALES_CODE_COLUMN, *WALES_RANKS])
+    return _index_frame(df[WALES_CODE_COLUMN], rank_deciles(df[list(WALES_RANKS)].rename(columns=WALES_RANKS)), "Wales")
+
+
+def read_scotland_imd() -> gpd.GeoDataFrame:
+    gdf = gpd.read_file(SCOTLAND_IMD_SHAPEFILE).to_crs(CRS)
+    deciles = pd.concat(
+        [
+            gdf[list(SCOTLAND_DECILES)].rename(columns=SCOTLAND_DECILES),
+            rank_deciles(gdf[list(SCOTLAND_RANKS)].rename(columns=SCOTLAND_RANKS)),
+        ],
+        axis=1,
+    )
+    return gpd.GeoDataFrame(
+        _index_frame(gdf[SCOTLAND_CODE_COLUMN], deciles, "Scotland"), geometry=gdf.geometry.to_numpy(), crs=CRS
+    )
+
+
+def add_lsoa_geometry(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    :param df: indices of LSOAs
+    :return: the indices with the geometry of their LSOA, in the same order. LSOAs missing from the boundaries are
+        kept, without a geometry
+    """
+    lsoa_gdf = read_geoparquet(
+        LSOA_BOUNDARIES_FILE, columns=["LSOA11CD"], filters=[("LSOA11CD", "in", df[AREA_CODE_COLUMN].tolist())]
+    ).to_crs(CRS)
+    gdf = lsoa_gdf.merge(df, how="right", left_on="LSOA11CD", right_on=AREA_CODE_COLUMN).drop(columns=["LSOA11CD"])
+    missing = gdf.geometry.isna()
+    if missing.any():
+        print(
+            f"{missing.sum()} LSOAs of the indices are not in {LSOA_BOUNDARIES_FILE}, so have no geometry: "
+            f"{gdf.loc[missing, AREA_CODE_COLUMN].head(10).tolist()}"
+        )
+    return gdf[[*df.columns, gdf.geometry.name]]
+
+
+def build_gb_imd() -> gpd.GeoDataFrame:
+    """
+    :return: the indices of every LSOA (England and Wales) and data zone (Scotland) in Great Britain
+    """
+    lsoa_gdf = add_lsoa_geometry(pd.concat([read_england_imd(), read_wales_imd()], ignore_index=True))
+    return gpd.GeoDataFrame(pd.concat([lsoa_gdf, read_scotland_imd()], ignore_index=True), crs=CRS)
+
+
+def split_nations(gb_gdf: gpd.GeoDataFrame) -> Dict[str, gpd.GeoDataFrame]:
+    """
+    :param gb_gdf: the indices of Great Britain
+    :return: the indices of each nation
+    """
+    return {nation: nation_gdf.reset_index(drop=True) for nation, nation_gdf in gb_gdf.groupby(NATION_COLUMN)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_tiers_argument(parser)
+    tiers = selected_tiers(parser.parse_args().tiers)
+
+    with stage_metrics("imd"):
+        with span("build") as build_span:
+            gb_gdf = build_gb_imd()
+            build_span.rows_out += len(gb_gdf)
+        write_outputs(gb_gdf, GB_OUTPUT)
+        write_tiers(gb_gdf, GB_OUTPUT, tiers)
+        for nation, nation_gdf in split_nations(gb_gdf).items():
+            print(f"{nation}: {len(nation_gdf)} areas")
+            write_outputs(nation_gdf, NATION_OUTPUTS[nation])
+            write_tiers(nation_gdf, NATION_OUTPUTS[nation], tiers)
+
+
+if __name__ == "__main__":
+    main()
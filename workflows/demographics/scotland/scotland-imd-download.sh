@@ -9,6 +9,6 @@ cd "$(dirname "$0")"
 IMD_DOWNLOAD_URL="https://maps.gov.scot/ATOM/shapefiles/SG_SIMD_2020.zip"
 OUT_FILE="scotland-imd"
 
-curl -SL -X "GET" $IMD_DOWNLOAD_URL -o "${OUT_FILE}.zip"
-unzip "${OUT_FILE}.zip" -d "./${OUT_FILE}"
-rm "${OUT_FILE}.zip"
+# the zip file is kept so that later runs only download it again if it has changed
+python ../../common/fetch.py "$IMD_DOWNLOAD_URL" "${OUT_FILE}.zip" --metrics scotland-imd-download
+unzip -o "${OUT_FILE}.zip" -d "./${OUT_FILE}"
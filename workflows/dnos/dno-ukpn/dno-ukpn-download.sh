@@ -10,6 +10,8 @@ UKPN_GRID_AND_PRIMARY_SITES_CSV_FILE="grid-and-primary-sites.csv"
 UKPN_NETWORK_HEADROOM_CSV_FILE="network-headroom.csv"
 
 
-curl -SL -X "GET" "$UKPN_GRID_AND_PRIMARY_SITES_CSV_URL" -o $UKPN_GRID_AND_PRIMARY_SITES_CSV_FILE
-curl -SL -X "GET" "$UKPN_NETWORK_HEADROOM_CSV_URL" -o $UKPN_NETWORK_HEADROOM_CSV_FILE
+python ../../common/fetch.py \
+  "$UKPN_GRID_AND_PRIMARY_SITES_CSV_URL" "$UKPN_GRID_AND_PRIMARY_SITES_CSV_FILE" \
+  "$UKPN_NETWORK_HEADROOM_CSV_URL" "$UKPN_NETWORK_HEADROOM_CSV_FILE" \
+  --metrics dno-upn-download-data
 
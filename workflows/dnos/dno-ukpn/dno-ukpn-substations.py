@@ -1,8 +1,14 @@
 import sys
+from pathlib import Path
 
 import geopandas as gpd
 import pandas as pd
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.encoding import detect_encoding  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
 SITE_ID = "SiteFunctionalLocation"
 
 PROPERTIES_TO_RETAIN_GRID_AND_PRIMARY = [
@@ -22,8 +28,14 @@ DNO_UKPN = "UKPN"
 def main():
     grid_and_primary_sites_file_name = sys.argv[1]
     headroom_capacity_file_name = sys.argv[2]
-    grid_and_primary_sites_df: pd.DataFrame = pd.read_csv(grid_and_primary_sites_file_name)
-    headroom_capacity_df: pd.DataFrame = pd.read_csv(headroom_capacity_file_name)
+    with span("parse") as parse_span:
+        grid_and_primary_sites_df: pd.DataFrame = pd.read_csv(
+            grid_and_primary_sites_file_name, encoding=detect_encoding(grid_and_primary_sites_file_name)
+        )
+        headroom_capacity_df: pd.DataFrame = pd.read_csv(
+            headroom_capacity_file_name, encoding=detect_encoding(headroom_capacity_file_name)
+        )
+        parse_span.rows_in += len(grid_and_primary_sites_df) + len(headroom_capacity_df)
     # fetch the headroom capacity for the current year (e.g. 2021) or the closest year available preceding the current
     curr_headroom_capacity_df = headroom_capacity_df[
         (headroom_capacity_df["Year"] == CURRENT_YEAR) & (headroom_capacity_df["Scenario"] == "Planning Scenario")
@@ -61,9 +73,9 @@ def main():
     )
     # add a column with DNO name (useful after merging all DNO datasets)
     ps_gdf["DNO"] = DNO_UKPN
-    # save to GeoJSON
-    ps_gdf.to_file("ukpn-primary-substations.geojson", driver="GeoJSON")
+    write_outputs(ps_gdf, "ukpn-primary-substations")
 
 
 if __name__ == "__main__":
-    main()
+    with stage_metrics("dno-upn-process-data"):
+        main()
@@ -1,10 +1,21 @@
-import os
-from typing import Any
+import argparse
+import sys
+from pathlib import Path
 
-import chardet
 import geopandas as gpd
 import pandas as pd
-import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.encoding import detect_encoding  # noqa: E402 pylint: disable=wrong-import-position
+from common.fetch import Fetcher  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import OutputSink, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+from common.tabular import (  # noqa: E402 pylint: disable=wrong-import-position
+    CSV_ENGINES,
+    DEFAULT_MEMORY_BUDGET,
+    PANDAS_ENGINE,
+    read_csv_chunks,
+)
 
 WPD_SUBSTATION_DATASET_URL = "https://connecteddata.westernpower.co.uk/dataset/29d435c2-0cbe-442d-96fe-a229a0307fba/resource/619e5534-090d-4aa8-abcd-74d1dd1a31cf/download/distribution_substation_details.csv"
 WPD_GRID_AND_PRIMARY_SUBSTATIONS_DATASET_URL = "resources/WPD-Network-Capacity-Map-19-11-2021.csv"
@@ -29,6 +40,30 @@ PROPERTIES_TO_RETAIN_SUBSTATION_DATASET = [
     "CUSTOMERS COUNT",
 ]
 
+# types of the columns read from the substation dataset (including the coordinates used for the geometry).
+# Counts are read as floats because they have missing values
+SUBSTATION_DATASET_DTYPES = {
+    "DNO": "category",
+    "PRIMARY SUBSTATION NAME": "str",
+    "PRIMARY SUBSTATION NUMBER": "str",
+    "HV FEEDER": "str",
+    "SUBSTATION TYPE": "category",
+    "SUBSTATION NAME": "str",
+    "SUBSTATION NUMBER": "str",
+    "GRID REFERENCE": "str",
+    "DAY_MAX_DEMAND": "float64",
+    "NIGHT_MAX_DEMAND": "float64",
+    "SUBSTATION_RATING": "float64",
+    "LCT Count": "float64",
+    "Energy Storage": "float64",
+    "EV Charge Point": "float64",
+    "Heat Pump": "float64",
+    "Photovoltaic": "float64",
+    "CUSTOMERS COUNT": "float64",
+    "LATITUDE": "float64",
+    "LONGITUDE": "float64",
+}
+
 
 # retaining the attributes visualized on the WPD Network Capacity Map (https://www.westernpower.co.uk/our-network/network-capacity-map-application)
 PROPERTIES_TO_RETAIN_NETWORK_CAPACITY_DATASET = [
@@ -44,34 +79,23 @@ PROPERTIES_TO_RETAIN_NETWORK_CAPACITY_DATASET = [
 DNO_WPD = "WPD"
 
 
-def get_file_encoding_chardet(file_path: str) -> Any:
-    """
-    Get the encoding of a file using chardet package
-    :param file_path:
-    :return:
-    """
-    with open(file_path, "rb") as file:
-
-        result = chardet.detect(file.read())
-        return result["encoding"]
-
-
 def download_data(file_name: str) -> None:
     """
-    Download the CSV dataset. This could be optimised as a streamed download.
-    Pandas complains if the file is downloaded using curl or similar commands so this approach was followed
+    Download the CSV dataset as a streamed, restartable download.
+    The file is only downloaded again if it has changed on the server since the last download.
+    The file is saved as served, so its encoding has to be detected when it is read
     :param file_name: the name of the downloaded CSV file
     """
-    res = requests.get(WPD_SUBSTATION_DATASET_URL)
-    with open(file_name, "w", encoding="utf-8") as file:
-        file.write(res.text)
+    Fetcher().fetch(WPD_SUBSTATION_DATASET_URL, file_name)
 
 
 def generate_primary_substation_data() -> None:
     """
-    Generate a GeoJSON file containing the WPD network capacity data
+    Generate GeoJSON/GeoParquet files containing the WPD network capacity data
     """
-    ps_df: pd.DataFrame = pd.read_csv(WPD_GRID_AND_PRIMARY_SUBSTATIONS_DATASET_URL)
+    with span("parse") as parse_span:
+        ps_df: pd.DataFrame = pd.read_csv(WPD_GRID_AND_PRIMARY_SUBSTATIONS_DATASET_URL)
+        parse_span.rows_in += len(ps_df)
     # We are only interested in Primary Substations (filter out Grid/Bulk Substations)
     ps_df = ps_df[ps_df["Asset Type"] == "Primary"]
     ps_df = ps_df.drop(columns=["Asset Type"])
@@ -93,34 +117,49 @@ def generate_primary_substation_data() -> None:
         }
     )
     ps_df["DNO"] = DNO_WPD
-    ps_gdf.to_file("wpd-primary-substations.geojson", driver="GeoJSON")
+    write_outputs(ps_gdf, "wpd-primary-substations")
 
 
-def generate_all_substation_data():
+def generate_all_substation_data(csv_engine: str = PANDAS_ENGINE, memory_budget: int = DEFAULT_MEMORY_BUDGET):
     """
-    Generate a GeoJSON file containing the substation data for the WPD network
+    Generate GeoJSON/GeoParquet files containing the substation data for the WPD network
+    :param csv_engine: the CSV parser to use, "pandas" or "pyarrow"
+    :param memory_budget: the memory, in bytes, to use for each chunk of the CSV file
     """
     file_name = WPD_SUBSTATION_DATASET_URL.rsplit("/", maxsplit=1)[-1]
-    if not os.path.isfile(file_name):
-        download_data(file_name)
-    encoding = get_file_encoding_chardet(file_name)
-    with pd.read_csv(file_name, encoding=encoding, chunksize=10 ** 4) as reader:
-        for index, chunk in enumerate(reader):
+    download_data(file_name)
+    encoding = detect_encoding(file_name)
+    chunks = read_csv_chunks(
+        file_name,
+        columns=list(SUBSTATION_DATASET_DTYPES),
+        dtypes=SUBSTATION_DATASET_DTYPES,
+        encoding=encoding,
+        engine=csv_engine,
+        memory_budget=memory_budget,
+    )
+    with OutputSink("wpd-substation-data") as sink:
+        for chunk in chunks:
             geometry = gpd.points_from_xy(chunk["LONGITUDE"], chunk["LATITUDE"])
             geo_df = gpd.GeoDataFrame(
                 chunk[PROPERTIES_TO_RETAIN_SUBSTATION_DATASET], geometry=geometry, crs="EPSG:4326"
             )
-            if index == 0:
-                # have to do this because GeoDataFrame.to_file does not seem to
-                # create the file if mode is "a" (i.e. "append")
-                geo_df.to_file("wpd-substation-data.geojson", driver="GeoJSON")
-            else:
-                geo_df.to_file("wpd-substation-data.geojson", driver="GeoJSON", mode="a")
+            sink.write(geo_df)
 
 
 def main():
-    generate_all_substation_data()
-    generate_primary_substation_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv-engine", choices=CSV_ENGINES, default=PANDAS_ENGINE, help="CSV parser to use")
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=DEFAULT_MEMORY_BUDGET // 2 ** 20,
+        help="memory (in MB) to use for each chunk of the substation CSV file",
+    )
+    args = parser.parse_args()
+
+    with stage_metrics("dno-wpd"):
+        generate_all_substation_data(csv_engine=args.csv_engine, memory_budget=args.memory_budget * 2 ** 20)
+        generate_primary_substation_data()
 
 
 if __name__ == "__main__":
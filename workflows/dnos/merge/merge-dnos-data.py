@@ -1,14 +1,20 @@
+import sys
 from glob import glob
+from pathlib import Path
 
 import geopandas as gpd
 import pandas as pd
 
-PRIMARY_SUBSTATIONS_GEOJSON_FILES_PATTERN = "../dno-*/*-primary-substations.geojson"
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
+PRIMARY_SUBSTATIONS_FILES_PATTERN = "../dno-*/*-primary-substations.parquet"
 
 
 def merge_primary_substation_data() -> None:
     """
-    Merge all the DNOs Primary Substation data into one GeoDataFrame to be saved to GeoJSON
+    Merge all the DNOs Primary Substation data into one GeoDataFrame to be saved to GeoJSON/GeoParquet
     The columns of the GeoDataFrame are:
     - "DNO": string representing the name of the DNO
     - "Site Name": string, name of the primary substation
@@ -20,13 +26,14 @@ def merge_primary_substation_data() -> None:
     - "Demand Headroom RAG": string, one of Red, Green, Amber. Color-code for the demand headroom. Only available for WPD
     - "Generation Headroom RAG": string, one of Red, Green, Amber. Color-code for the demand headroom. Only available for WPD
     """
-    files_to_merge = glob(PRIMARY_SUBSTATIONS_GEOJSON_FILES_PATTERN)
+    files_to_merge = sorted(glob(PRIMARY_SUBSTATIONS_FILES_PATTERN))
     print(files_to_merge)
     gdf: gpd.GeoDataFrame = gpd.GeoDataFrame(
-        pd.concat((gpd.read_file(file) for file in files_to_merge), ignore_index=True), crs="EPSG:4326"
+        pd.concat((read_geoparquet(file) for file in files_to_merge), ignore_index=True), crs="EPSG:4326"
     )
-    gdf.to_file("dnos-primary-substations.geojson", driver="GeoJSON")
+    write_outputs(gdf, "dnos-primary-substations")
 
 
 if __name__ == "__main__":
-    merge_primary_substation_data()
+    with stage_metrics("merge-substations"):
+        merge_primary_substation_data()
@@ -1,11 +1,17 @@
-import geopandas as gpd
+import sys
+from pathlib import Path
+
 import pandas as pd
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
 EV_REGISTRATION_FILE = "veh0134.ods"
-OUTPUT_FILE = "ev-registrations.geojson"
+OUTPUT = "ev-registrations"
 
 # Postcode district boundary details
-POSTCODE_DISTRICTS_FILE = "../boundaries-postcode-district/uk-postcode-districts.geojson"
+POSTCODE_DISTRICTS_FILE = "../boundaries-postcode-district/uk-postcode-districts.parquet"
 POSTCODE_DISTRICT_KEY = "Name"
 
 # There are separate sheets for EV and hybrids. This sheet has registration data for both
@@ -18,7 +24,9 @@ LAST_POSTCODE = "ZE2"
 
 
 def create_ev_registration_data() -> None:
-    ev_df = pd.read_excel(EV_REGISTRATION_FILE, sheet_name=SHEET, skiprows=ROWS_TO_SKIP, engine="odf")
+    with span("parse") as parse_span:
+        ev_df = pd.read_excel(EV_REGISTRATION_FILE, sheet_name=SHEET, skiprows=ROWS_TO_SKIP, engine="odf")
+        parse_span.rows_in += len(ev_df)
 
     # Get the index of the row with the last postcode so we can skip the footer
     index = ev_df.index[ev_df["Postcode District 2"] == LAST_POSTCODE][0]
@@ -35,11 +43,13 @@ def create_ev_registration_data() -> None:
     ev_df = ev_df.rename(columns=column_name_map)
 
     # add in the boundary polygons for the postcode
-    postcodes_df = gpd.read_file(POSTCODE_DISTRICTS_FILE)
-    result = postcodes_df.merge(ev_df, how="left", on=POSTCODE_DISTRICT_KEY)
-    result = result.fillna(0)
-    result.to_file(OUTPUT_FILE, driver="GeoJSON")
+    postcodes_df = read_geoparquet(POSTCODE_DISTRICTS_FILE)
+    with span("join"):
+        result = postcodes_df.merge(ev_df, how="left", on=POSTCODE_DISTRICT_KEY)
+        result = result.fillna(0)
+    write_outputs(result, OUTPUT)
 
 
 if __name__ == "__main__":
-    create_ev_registration_data()
+    with stage_metrics("ev-registrations"):
+        create_ev_registration_data()
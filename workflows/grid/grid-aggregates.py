@@ -0,0 +1,322 @@
+"""
+Aggregates the point, land-use and area datasets onto square grids of several resolutions over the British National
+Grid, so the candidate-site scoring can look up the values of the cells around a site rather than compute them from
+the raw features.
+
+The grids are hierarchical: a cell is identified by its integer column and row (its coordinates divided by the cell
+size), and each coarser cell size is a multiple of the finest, so the values of a coarse cell are the sums of the
+values of the fine cells in it. Everything is summed once on the finest grid, with the large land-use layers
+streamed in chunks, then rolled up.
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.area_index import representative_points  # noqa: E402 pylint: disable=wrong-import-position
+from common.geometry import from_pygeos, to_pygeos  # noqa: E402 pylint: disable=wrong-import-position
+from common.gpkg import DEFAULT_CHUNK_SIZE, iter_gpkg_chunks  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
+CHARGE_POINTS_FILE = "../charge-points/charge-points.parquet"
+CAR_PARKS_FILE = "../car-parks/car-parks.parquet"
+BUS_STOPS_FILE = "../bus-stops-stations/bus-stops-and-stations.parquet"
+BUILDINGS_FILE = "../land-use/buildings.gpkg"
+ROADS_FILE = "../land-use/roads.gpkg"
+IMD_FILE = "../demographics/gb-imd.parquet"
+IMD_DECILE_COLUMNS = ["OverallDecile", "IncomeDecile", "EducationDecile", "CrimeDecile", "HealthDecile"]
+EV_REGISTRATIONS_FILE = "../ev-registrations/ev-registrations.parquet"
+
+# in metres. Each must be a multiple of the smallest
+DEFAULT_CELL_SIZES = [1000, 4000, 16000]
+OUTPUT_TEMPLATE = "grid-{cell_size}m"
+
+GRID_CRS = "EPSG:27700"
+OUTPUT_CRS = "EPSG:4326"
+# the extent of the British National Grid. Features outside it (e.g. in the Channel Islands) are not aggregated
+GRID_BOUNDS = (0, 0, 700_000, 1_300_000)
+
+# a cell id packs the column of the cell into the high 32 bits and its row into the low 32 bits
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+# the partial sums of the chunks are merged after this many chunks
+MERGE_EVERY = 32
+SQUARE_METRES_PER_SQUARE_KM = 1_000_000
+UNCLASSIFIED_ROAD = "Unclassified"
+
+
+def cell_ids(columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    :param columns: the columns of the cells
+    :param rows: the rows of the cells
+    :return: the id of each cell
+    """
+    return (columns.astype(np.int64) << ROW_BITS) | rows.astype(np.int64)
+
+
+def cell_columns_rows(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param ids: cell ids
+    :return: the column and row of each cell
+    """
+    return ids >> ROW_BITS, ids & ROW_MASK
+
+
+def coarsen(ids: np.ndarray, factor: int) -> np.ndarray:
+    """
+    :param ids: the ids of cells of one size
+    :param factor: the ratio of the coarser cell size to the size of the cells
+    :return: the id of the coarser cell each cell is in
+    """
+    columns, rows = cell_columns_rows(ids)
+    return cell_ids(columns // factor, rows // factor)
+
+
+def _grid_shape(cell_size: int) -> Tuple[int, int]:
+    min_x, min_y, max_x, max_y = GRID_BOUNDS
+    return -(-(max_x - min_x) // cell_size), -(-(max_y - min_y) // cell_size)
+
+
+def point_cells(points: np.ndarray, cell_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param points: pygeos points, in the grid CRS
+    :param cell_size: the size of the cells
+    :return: the positions of the points in the grid and the id of the cell each is in
+    """
+    min_x, min_y, _, _ = GRID_BOUNDS
+    n_columns, n_rows = _grid_shape(cell_size)
+    columns = np.floor((pygeos.get_x(points) - min_x) / cell_size)
+    rows = np.floor((pygeos.get_y(points) - min_y) / cell_size)
+    # also drops missing points, whose coordinates are NaN
+    in_grid = (columns >= 0) & (columns < n_columns) & (rows >= 0) & (rows < n_rows)
+    positions = np.flatnonzero(in_grid)
+    return positions, cell_ids(columns[positions], rows[positions])
+
+
+def clip_to_cells(geometries: np.ndarray, cell_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cut lines or polygons along the cell edges
+    :param geometries: pygeos geometries, in the grid CRS
+    :param cell_size: the size of the cells
+    :return: for each part of a geometry in a cell: the position of the geometry, the id of the cell, and the part
+    """
+    min_x, min_y, _, _ = GRID_BOUNDS
+    n_columns, n_rows = _grid_shape(cell_size)
+    bounds = pygeos.bounds(geometries)
+    first_columns = np.clip(np.floor((bounds[:, 0] - min_x) / cell_size), 0, n_columns - 1)
+    first_rows = np.clip(np.floor((bounds[:, 1] - min_y) / cell_size), 0, n_rows - 1)
+    last_columns = np.clip(np.floor((bounds[:, 2] - min_x) / cell_size), -1, n_columns - 1)
+    last_rows = np.clip(np.floor((bounds[:, 3] - min_y) / cell_size), -1, n_rows - 1)
+    widths = np.nan_to_num(last_columns - first_columns + 1).clip(0).astype(np.int64)
+    heights = np.nan_to_num(last_rows - first_rows + 1).clip(0).astype(np.int64)
+
+    # one (geometry, cell) pair for every cell in the bounding box of each geometry
+    counts = widths * heights
+    positions = np.repeat(np.arange(len(geometries)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    columns = first_columns[positions].astype(np.int64) + offsets % widths[positions]
+    rows = first_rows[positions].astype(np.int64) + offsets // widths[positions]
+
+    # most geometries are within one cell, and only those crossing cell edges need cutting
+    parts = geometries[positions]
+    crossing = counts[positions] > 1
+    x = min_x + columns[crossing] * cell_size
+    y = min_y + rows[crossing] * cell_size
+    parts[crossing] = pygeos.intersection(parts[crossing], pygeos.box(x, y, x + cell_size, y + cell_size))
+    non_empty = ~pygeos.is_empty(parts)
+    return positions[non_empty], cell_ids(columns[non_empty], rows[non_empty]), parts[non_empty]
+
+
+class GridAccumulator:
+    """
+    Sums of values over the cells of the finest grid, accumulated from chunks of features
+    """
+
+    def __init__(self, cell_size: int):
+        """
+        :param cell_size: the size of the cells of the finest grid
+        """
+        self.cell_size = cell_size
+        self._partial_sums: List[pd.DataFrame] = []
+
+    def add(self, ids: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """
+        :param ids: the cell of each value
+        :param values: named values to sum over each cell
+        """
+        self._partial_sums.append(pd.DataFrame(values).groupby(ids).sum())
+        if len(self._partial_sums) >= MERGE_EVERY:
+            self._merge()
+
+    def _merge(self) -> None:
+        # cells with no value for a column (e.g. no roads of a classification) have NaN for it, which sum() skips
+        self._partial_sums = [pd.concat(self._partial_sums).groupby(level=0).sum()]
+
+    def totals(self) -> pd.DataFrame:
+        """
+        :return: the sums, indexed by cell id, for the cells with any value
+        """
+        if not self._partial_sums:
+            return pd.DataFrame(index=pd.Index([], dtype=np.int64))
+        self._merge()
+        return self._partial_sums[0].fillna(0)
+
+
+def _grid_geometries(gdf: gpd.GeoDataFrame) -> np.ndarray:
+    return to_pygeos(gdf.geometry.to_crs(GRID_CRS))
+
+
+def add_charge_points(grid: GridAccumulator) -> None:
+    gdf = read_geoparquet(CHARGE_POINTS_FILE, columns=["connector1RatedOutputKW"])
+    positions, ids = point_cells(_grid_geometries(gdf), grid.cell_size)
+    kw = gdf["connector1RatedOutputKW"].fillna(0).to_numpy()[positions]
+    grid.add(ids, {"chargePoints": np.ones(len(ids)), "chargePointKW": kw})
+
+
+def add_car_parks(grid: GridAccumulator) -> None:
+    gdf = read_geoparquet(CAR_PARKS_FILE, columns=["capacity"])
+    points = _grid_geometries(gdf.set_geometry(representative_points(gdf.geometry)))
+    positions, ids = point_cells(points, grid.cell_size)
+    # capacity is a free-text tag, which is usually but not always a number
+    capacity = pd.to_numeric(gdf["capacity"], errors="coerce").fillna(0).to_numpy()[positions]
+    grid.add(ids, {"carParks": np.ones(len(ids)), "carParkCapacity": capacity})
+
+
+def add_bus_stops(grid: GridAccumulator) -> None:
+    gdf = read_geoparquet(BUS_STOPS_FILE, columns=["isStation"])
+    points = _grid_geometries(gdf.set_geometry(representative_points(gdf.geometry)))
+    positions, ids = point_cells(points, grid.cell_size)
+    is_station = gdf["isStation"].to_numpy(dtype=bool)[positions]
+    grid.add(ids, {"busStops": (~is_station).astype(float), "busStations": is_station.astype(float)})
+
+
+def add_buildings(grid: GridAccumulator, chunk_size: int) -> None:
+    for chunk in tqdm(iter_gpkg_chunks(BUILDINGS_FILE, chunk_size=chunk_size), desc="Buildings"):
+        # buildings are small, so each is counted in the cell its representative point is in
+        polygons = _grid_geometries(chunk)
+        positions, ids = point_cells(pygeos.point_on_surface(polygons), grid.cell_size)
+        grid.add(ids, {"buildings": np.ones(len(ids)), "buildingArea": pygeos.area(polygons[positions])})
+
+
+def road_length_column(classification: str) -> str:
+    """
+    :param classification: an OS OpenMap Local road classification, e.g. "A Road"
+    :return: the name of the column of the length of the roads of the classification, e.g. "roadLengthARoad"
+    """
+    return "roadLength" + "".join(word.capitalize() for word in classification.split())
+
+
+def add_roads(grid: GridAccumulator, chunk_size: int) -> None:
+    for chunk in tqdm(iter_gpkg_chunks(ROADS_FILE, ["classification"], chunk_size=chunk_size), desc="Roads"):
+        positions, ids, parts = clip_to_cells(_grid_geometries(chunk), grid.cell_size)
+        classifications = chunk["classification"].fillna(UNCLASSIFIED_ROAD).to_numpy()[positions]
+        lengths = pygeos.length(parts)
+        grid.add(
+            ids,
+            {
+                road_length_column(classification): np.where(classifications == classification, lengths, np.nan)
+                for classification in np.unique(classifications)
+            },
+        )
+
+
+def add_imd(grid: GridAccumulator) -> None:
+    gdf = read_geoparquet(IMD_FILE, columns=IMD_DECILE_COLUMNS)
+    positions, ids, parts = clip_to_cells(_grid_geometries(gdf), grid.cell_size)
+    areas = pygeos.area(parts)
+    # the area-weighted sums of the deciles, which are divided by the area once the cells are rolled up
+    weighted_deciles = {
+        f"{column}Weighted": gdf[column].to_numpy(dtype=float)[positions] * areas for column in IMD_DECILE_COLUMNS
+    }
+    grid.add(ids, {"imdArea": areas, **weighted_deciles})
+
+
+def add_ev_registrations(grid: GridAccumulator) -> None:
+    gdf = read_geoparquet(EV_REGISTRATIONS_FILE, columns=["count"])
+    districts = _grid_geometries(gdf)
+    positions, ids, parts = clip_to_cells(districts, grid.cell_size)
+    # the registrations of a postcode district are shared between its cells by area
+    share = pygeos.area(parts) / pygeos.area(districts)[positions]
+    grid.add(ids, {"evRegistrations": gdf["count"].to_numpy(dtype=float)[positions] * share})
+
+
+def aggregate(totals: pd.DataFrame, finest_cell_size: int, cell_size: int) -> gpd.GeoDataFrame:
+    """
+    :param totals: the sums over the cells of the finest grid
+    :param finest_cell_size: the size of the cells of the finest grid
+    :param cell_size: the size of the cells to aggregate to
+    :return: the values of the cells of the given size
+    """
+    sums = totals.groupby(coarsen(totals.index.to_numpy(), cell_size // finest_cell_size)).sum()
+    columns, rows = cell_columns_rows(sums.index.to_numpy())
+    cell_area_km2 = cell_size ** 2 / SQUARE_METRES_PER_SQUARE_KM
+
+    df = pd.DataFrame({"column": columns, "row": rows})
+    for column in sums.columns:
+        if column == "imdArea" or column.endswith("Weighted"):
+            continue
+        df[column] = sums[column].to_numpy()
+    df["busStopsPerKm2"] = df["busStops"] / cell_area_km2
+    # cells outside the IMD areas (e.g. at sea) have no deciles
+    imd_area = sums["imdArea"].to_numpy()
+    for column in IMD_DECILE_COLUMNS:
+        df[column] = np.divide(
+            sums[f"{column}Weighted"].to_numpy(), imd_area, out=np.full(len(df), np.nan), where=imd_area > 0
+        )
+
+    min_x, min_y, _, _ = GRID_BOUNDS
+    x = min_x + columns * cell_size
+    y = min_y + rows * cell_size
+    cells = from_pygeos(pygeos.box(x, y, x + cell_size, y + cell_size), df.index, GRID_CRS)
+    return gpd.GeoDataFrame(df, geometry=cells).to_crs(OUTPUT_CRS)
+
+
+def build_grids(
+    cell_sizes: Sequence[int], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Tuple[int, gpd.GeoDataFrame]]:
+    """
+    :param cell_sizes: the sizes of the cells of the grids, each a multiple of the smallest
+    :param chunk_size: the number of land-use features read at a time
+    :return: an iterator over the cell size and values of each grid
+    """
+    grid = GridAccumulator(min(cell_sizes))
+    add_charge_points(grid)
+    add_car_parks(grid)
+    add_bus_stops(grid)
+    add_imd(grid)
+    add_ev_registrations(grid)
+    add_buildings(grid, chunk_size)
+    add_roads(grid, chunk_size)
+    totals = grid.totals()
+    for cell_size in sorted(cell_sizes):
+        yield cell_size, aggregate(totals, grid.cell_size, cell_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--cell-sizes", type=int, nargs="+", default=DEFAULT_CELL_SIZES, help="sizes (in metres) of the grid cells"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="number of land-use features read at a time"
+    )
+    args = parser.parse_args()
+    if any(cell_size % min(args.cell_sizes) for cell_size in args.cell_sizes):
+        parser.error("each cell size must be a multiple of the smallest")
+
+    with stage_metrics("grid-aggregates"):
+        for cell_size, grid_gdf in build_grids(args.cell_sizes, args.chunk_size):
+            print(f"{len(grid_gdf)} cells of {cell_size}m")
+            write_outputs(grid_gdf, OUTPUT_TEMPLATE.format(cell_size=cell_size))
+
+
+if __name__ == "__main__":
+    main()
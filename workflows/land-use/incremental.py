@@ -0,0 +1,256 @@
+"""
+Incremental extraction of the land-use layers: when OS republishes OpenMap Local, only the tiles that changed are
+read again, and their features are replaced in the GeoPackages in place.
+
+The manifest (manifest.json in the manifest directory) records, for each layer, the layer spec it was extracted with
+and the CRC-32 and size of each tile of the archive (read from the zip directory, so comparing them decompresses
+nothing). <layer>-ids.parquet records the hashed ids of the features of each tile (see TileIds).
+
+A tile is re-read if it is new or its CRC-32 or size changed, along with any unchanged tile that shares a feature
+with it (before or after the change), since a feature repeated in neighbouring tiles is written from the first of
+them in archive order. The features of those tiles and of removed tiles are deleted from the GeoPackage (by their
+source_tile column) and the re-read tiles are de-duplicated against the features of the other tiles and appended, so
+the GeoPackage has the same features as a full extraction would write, though in a different order.
+
+A layer is extracted in full if it has no manifest entry for its current spec, its output is missing, or more than
+MAX_INCREMENTAL_FRACTION of the tiles changed.
+"""
+import json
+import sys
+import zipfile
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from tqdm import tqdm
+
+from openmap import (
+    DEFAULT_WORKERS,
+    ID_COLUMN,
+    OPEN_MAP_DATA,
+    OWNED_COLUMN,
+    SOURCE_TILE_COLUMN,
+    TILE_COLUMN,
+    LayerSpec,
+    TileIds,
+    deduplicate_tile,
+    extract_layers_to_files,
+    ordered_map,
+    read_tile_ids,
+    read_tiles,
+)
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.dedup import HashedIdSet  # noqa: E402 pylint: disable=wrong-import-position
+from common.gpkg import delete_gpkg_features, index_gpkg_column  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span  # noqa: E402 pylint: disable=wrong-import-position
+from common.sinks import FeatureSink  # noqa: E402 pylint: disable=wrong-import-position
+
+MANIFEST_DIR = "land-use-manifest"
+MANIFEST_FILE = "manifest.json"
+IDS_FILE_TEMPLATE = "{layer}-ids.parquet"
+# beyond this fraction of changed tiles, a full extraction is quicker than replacing the features of each tile
+MAX_INCREMENTAL_FRACTION = 0.5
+
+
+def tile_checksums(zip_path: str = OPEN_MAP_DATA) -> Dict[str, List[int]]:
+    """
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :return: the CRC-32 and uncompressed size of each GML tile, in archive order
+    """
+    with zipfile.ZipFile(zip_path) as zip_file:
+        return {
+            info.filename: [info.CRC, info.file_size] for info in zip_file.infolist() if info.filename.endswith(".gml")
+        }
+
+
+def _spec_signature(spec: LayerSpec) -> List:
+    return [spec.layer_name, list(spec.columns), spec.output]
+
+
+class Manifest:
+    """
+    The spec and tile checksums each layer was last extracted with, and the ids of the features of its tiles
+    """
+
+    def __init__(self, directory: str = MANIFEST_DIR):
+        """
+        :param directory: the manifest directory
+        """
+        self.directory = Path(directory)
+        try:
+            with open(self.directory / MANIFEST_FILE, encoding="utf-8") as file:
+                self.layers: Dict[str, Dict] = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.layers = {}
+
+    def ids_path(self, spec: LayerSpec) -> Path:
+        """
+        :return: the file of the ids of the features of each tile of a layer
+        """
+        return self.directory / IDS_FILE_TEMPLATE.format(layer=spec.name)
+
+    def recorded_tiles(self, spec: LayerSpec) -> Optional[Dict[str, List[int]]]:
+        """
+        :param spec: a layer
+        :return: the tile checksums the layer was extracted from, or None if it must be extracted in full (because it
+            was extracted with a different spec, or its output or ids are missing)
+        """
+        entry = self.layers.get(spec.name)
+        if entry is None or entry["spec"] != _spec_signature(spec):
+            return None
+        if not Path(spec.output).exists() or not self.ids_path(spec).exists():
+            return None
+        return entry["tiles"]
+
+    def invalidate(self) -> None:
+        """
+        Remove the manifest file while the outputs are being changed, so an interrupted run is followed by a full
+        extraction
+        """
+        (self.directory / MANIFEST_FILE).unlink(missing_ok=True)
+
+    def record(self, spec: LayerSpec, checksums: Dict[str, List[int]], tile_ids: TileIds) -> None:
+        """
+        :param spec: a layer that has been extracted
+        :param checksums: the checksums of the tiles it was extracted from
+        :param tile_ids: the ids of the features of its tiles
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tile_ids.write(str(self.ids_path(spec)))
+        self.layers[spec.name] = {"spec": _spec_signature(spec), "tiles": checksums}
+
+    def write(self) -> None:
+        """Write the manifest file"""
+        with open(self.directory / MANIFEST_FILE, "w", encoding="utf-8") as file:
+            json.dump(self.layers, file, indent=2)
+
+
+def _extract_all(
+    specs: Sequence[LayerSpec],
+    manifest: Manifest,
+    checksums: Dict[str, List[int]],
+    workers: int,
+    dedup_memory_limit: Optional[int],
+) -> None:
+    tile_ids = {spec.name: TileIds() for spec in specs}
+    extract_layers_to_files(specs, workers=workers, dedup_memory_limit=dedup_memory_limit, tile_ids=tile_ids)
+    for spec in specs:
+        index_gpkg_column(spec.output, SOURCE_TILE_COLUMN)
+        manifest.record(spec, checksums, tile_ids[spec.name])
+
+
+def _tiles_to_replace(
+    spec: LayerSpec, recorded_ids: TileIds, changed: Sequence[str], removed: Sequence[str], new_ids: Dict[str, Dict]
+) -> Set[str]:
+    # the changed tiles, and the unchanged tiles that share a feature with them (before or after the change)
+    ids_df = recorded_ids.to_frame()
+    affected = ids_df[TILE_COLUMN].isin([*changed, *removed])
+    shared_ids = np.concatenate(
+        [
+            ids_df.loc[affected, ID_COLUMN].to_numpy(),
+            *[new_ids[tile][spec.name] for tile in changed if spec.name in new_ids[tile]],
+        ]
+    )
+    neighbours = ids_df.loc[~affected & ids_df[ID_COLUMN].isin(shared_ids), TILE_COLUMN].unique()
+    return {*changed, *neighbours}
+
+
+def _update(
+    specs: Sequence[LayerSpec],
+    manifest: Manifest,
+    checksums: Dict[str, List[int]],
+    changes: Dict[str, List[List[str]]],
+    workers: int,
+    dedup_memory_limit: Optional[int],
+) -> None:
+    tiles = list(checksums)
+    changed_tiles = [tile for tile in tiles if any(tile in changed for changed, _ in changes.values())]
+    tqdm.write(f"Reading the feature ids of {len(changed_tiles)} changed tile(s)")
+    new_ids = dict(zip(changed_tiles, ordered_map(partial(read_tile_ids, specs=specs), changed_tiles, workers)))
+
+    recorded_ids = {spec.name: TileIds.read(str(manifest.ids_path(spec))) for spec in specs}
+    replaced = {
+        spec.name: _tiles_to_replace(spec, recorded_ids[spec.name], *changes[spec.name], new_ids) for spec in specs
+    }
+
+    index_sets = {}
+    tile_ids = {}
+    for spec in specs:
+        removed_tiles = changes[spec.name][1]
+        deleted_tiles = [*replaced[spec.name], *removed_tiles]
+        with span("delete") as delete_span:
+            delete_span.rows_out += delete_gpkg_features(spec.output, SOURCE_TILE_COLUMN, deleted_tiles)
+        ids_df = recorded_ids[spec.name].to_frame()
+        kept_ids_df = ids_df[~ids_df[TILE_COLUMN].isin(deleted_tiles)]
+        index_sets[spec.name] = HashedIdSet(max_bytes=dedup_memory_limit)
+        index_sets[spec.name].add(kept_ids_df.loc[kept_ids_df[OWNED_COLUMN], ID_COLUMN].to_numpy())
+        tile_ids[spec.name] = TileIds(kept_ids_df)
+        tqdm.write(
+            f"Replacing the {spec.name} of {len(replaced[spec.name])} tile(s) and deleting those of "
+            f"{len(removed_tiles)} removed tile(s)"
+        )
+
+    tiles_to_read = [tile for tile in tiles if any(tile in replaced_tiles for replaced_tiles in replaced.values())]
+    with ExitStack() as stack:
+        sinks = {
+            spec.name: stack.enter_context(FeatureSink(spec.output, driver="GPKG", mode="a")) for spec in specs
+        }
+        for tile, tile_layers in zip(tiles_to_read, read_tiles(tiles_to_read, specs, workers=workers)):
+            tile_layers = {name: gdf for name, gdf in tile_layers.items() if tile in replaced[name]}
+            deduplicated_layers = deduplicate_tile(tile, tile_layers, index_sets, tile_ids)
+            with span("write") as write_span:
+                for name, gdf in deduplicated_layers.items():
+                    sinks[name].write(gdf)
+                    write_span.rows_out += len(gdf)
+
+    for spec in specs:
+        manifest.record(spec, checksums, tile_ids[spec.name])
+
+
+def extract_layers_incrementally(
+    specs: Sequence[LayerSpec],
+    workers: int = DEFAULT_WORKERS,
+    dedup_memory_limit: Optional[int] = None,
+    manifest_dir: str = MANIFEST_DIR,
+    full: bool = False,
+) -> None:
+    """
+    Bring the GeoPackage of each layer up to date with the archive, re-reading only the tiles that changed since it
+    was last extracted (see the module docstring)
+    :param specs: the layers to extract
+    :param workers: number of worker processes used to read the tiles
+    :param dedup_memory_limit: optional ceiling, in bytes, on the memory used to de-duplicate each layer
+    :param manifest_dir: the directory of the manifest
+    :param full: extract every tile, whatever the manifest records
+    """
+    checksums = tile_checksums()
+    manifest = Manifest(manifest_dir)
+    full_specs = []
+    changes = {}
+    for spec in specs:
+        recorded_tiles = None if full else manifest.recorded_tiles(spec)
+        if recorded_tiles is None:
+            full_specs.append(spec)
+            continue
+        changed = [tile for tile, checksum in checksums.items() if recorded_tiles.get(tile) != checksum]
+        removed = [tile for tile in recorded_tiles if tile not in checksums]
+        if len(changed) + len(removed) > MAX_INCREMENTAL_FRACTION * len(checksums):
+            full_specs.append(spec)
+        elif changed or removed:
+            changes[spec.name] = [changed, removed]
+        else:
+            tqdm.write(f"{spec.output} is up to date with {OPEN_MAP_DATA}")
+
+    if not full_specs and not changes:
+        return
+    manifest.invalidate()
+    if full_specs:
+        _extract_all(full_specs, manifest, checksums, workers, dedup_memory_limit)
+    if changes:
+        _update(
+            [spec for spec in specs if spec.name in changes], manifest, checksums, changes, workers, dedup_memory_limit
+        )
+    manifest.write()
@@ -0,0 +1,46 @@
+"""
+Extracts land-use layers (roads, buildings, etc.) from OS map data in a single pass over the tiles.
+Only the tiles that changed since the last run are extracted again (see incremental.py).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from incremental import MANIFEST_DIR, extract_layers_incrementally
+from openmap import DEFAULT_WORKERS, LAYERS
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--layers", nargs="+", choices=sorted(LAYERS), default=sorted(LAYERS), help="the layers to extract"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="number of processes used to read the GML tiles"
+    )
+    parser.add_argument(
+        "--dedup-memory-limit",
+        type=int,
+        default=None,
+        help="maximum memory (in MB) used to de-duplicate the features of each layer",
+    )
+    parser.add_argument("--full", action="store_true", help="extract every tile, even if it has not changed")
+    parser.add_argument("--manifest-dir", default=MANIFEST_DIR, help="where to record the tiles extracted")
+    args = parser.parse_args()
+
+    dedup_memory_limit = args.dedup_memory_limit * 2 ** 20 if args.dedup_memory_limit is not None else None
+    with stage_metrics("land-use"):
+        extract_layers_incrementally(
+            [LAYERS[name] for name in args.layers],
+            workers=args.workers,
+            dedup_memory_limit=dedup_memory_limit,
+            manifest_dir=args.manifest_dir,
+            full=args.full,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Shared single-pass extraction of layers from the OS OpenMap Local GML tiles.
+
+Each tile is opened once and every configured layer is read from it, so adding a layer does not add another
+pass over the archive. Each feature is tagged with the tile it was taken from (source_tile), so the features of a
+tile can be replaced when it changes (see incremental.py).
+"""
+import os
+import sys
+import tempfile
+import zipfile
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import fiona
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.dedup import HashedIdSet, hash_ids  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span  # noqa: E402 pylint: disable=wrong-import-position
+from common.sinks import FeatureSink  # noqa: E402 pylint: disable=wrong-import-position
+
+OPEN_MAP_DATA = "os-openmap-local.zip"
+ID_COLUMN = "gml_id"
+SOURCE_TILE_COLUMN = "source_tile"
+OWNED_COLUMN = "owned"
+TILE_COLUMN = "tile"
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class LayerSpec:
+    """
+    Describes a layer to extract from the OS OpenMap Local tiles
+    :param name: short name of the layer, used on the command line
+    :param layer_name: name of the layer in the GML tiles (e.g. "Road")
+    :param columns: the columns to keep. Columns missing from a tile are filled with None
+    :param output: the GeoPackage file the layer is written to
+    """
+
+    name: str
+    layer_name: str
+    columns: Tuple[str, ...]
+    output: str
+
+
+# The layers available for extraction. See the OS OpenMap Local technical specification for the other
+# layers (e.g. Woodland, CarChargingPoint, FunctionalSite), which can be added here.
+LAYERS: Dict[str, LayerSpec] = {
+    spec.name: spec
+    for spec in [
+        LayerSpec(
+            name="roads",
+            layer_name="Road",
+            columns=("distinctiveName", "roadNumber", "classification", "geometry"),
+            output="roads.gpkg",
+        ),
+        LayerSpec(
+            name="buildings",
+            layer_name="Building",
+            columns=("geometry",),
+            output="buildings.gpkg",
+        ),
+    ]
+}
+
+
+class TileIds:
+    """
+    The hashed ids of the features of each tile of a layer, before de-duplication, and whether each is the copy of the
+    feature in the output (i.e. the tile is the first with the feature). Lets an incremental extraction find the
+    tiles that share features with a changed tile.
+    """
+
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        """
+        :param df: ids recorded earlier (see to_frame)
+        """
+        self._frames: List[pd.DataFrame] = [df] if df is not None else []
+
+    def add(self, tile: str, ids: np.ndarray, owned: np.ndarray) -> None:
+        """
+        :param tile: the name of the tile
+        :param ids: the hashed ids of the features of the tile
+        :param owned: a boolean mask, True where the feature was written from this tile
+        """
+        self._frames.append(
+            pd.DataFrame({TILE_COLUMN: pd.Categorical([tile] * len(ids)), ID_COLUMN: ids, OWNED_COLUMN: owned})
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: a frame with the tile, id and owned flag of every feature recorded
+        """
+        if not self._frames:
+            return pd.DataFrame(
+                {
+                    TILE_COLUMN: pd.Categorical([]),
+                    ID_COLUMN: np.empty(0, dtype=np.uint64),
+                    OWNED_COLUMN: np.empty(0, dtype=bool),
+                }
+            )
+        df = pd.concat(self._frames, ignore_index=True)
+        df[TILE_COLUMN] = df[TILE_COLUMN].astype("category")
+        self._frames = [df]
+        return df
+
+    def write(self, path: str) -> None:
+        """
+        :param path: the Parquet file to write the ids to
+        """
+        self.to_frame().to_parquet(path, index=False)
+
+    @classmethod
+    def read(cls, path: str) -> "TileIds":
+        """
+        :param path: a Parquet file written by write
+        """
+        return cls(pd.read_parquet(path))
+
+
+def list_tiles(zip_path: str = OPEN_MAP_DATA) -> List[str]:
+    """
+    List the GML tiles in the OS OpenMap Local archive
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :return: the name of each GML tile within the archive, in archive order
+    """
+    with zipfile.ZipFile(zip_path) as zip_file:
+        return [f for f in zip_file.namelist() if f.endswith(".gml")]
+
+
+def _trim_columns(gdf: gpd.GeoDataFrame, columns: Sequence[str]) -> gpd.GeoDataFrame:
+    for column in columns:
+        if column not in gdf:
+            gdf[column] = None
+    # hash the ids here, in the worker, so only compact integers are sent back for de-duplication. They are assigned
+    # to a new frame, as assigning to the selection of columns would write to a copy of a slice
+    return gdf[list(columns)].assign(**{ID_COLUMN: hash_ids(gdf[ID_COLUMN])})
+
+
+def read_tile(tile: str, specs: Sequence[LayerSpec], zip_path: str = OPEN_MAP_DATA) -> Dict[str, gpd.GeoDataFrame]:
+    """
+    Read all the requested layers from a single GML tile, keeping only the configured columns (plus the hashed
+    feature id).
+    The tile is decompressed once to a temporary directory, which also lets GDAL cache the GML schema (.gfs) between
+    the reads of the different layers rather than re-scanning the file for each one.
+    :param tile: name of the GML tile within the archive
+    :param specs: the layers to read
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :return: the non-empty layers of the tile, keyed by layer spec name
+    """
+    layers = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with zipfile.ZipFile(zip_path) as zip_file:
+            file_path = zip_file.extract(tile, temp_dir)
+
+        available_layers = fiona.listlayers(file_path)
+        for spec in specs:
+            if spec.layer_name not in available_layers:
+                tqdm.write(f"File {tile} does not contain a {spec.layer_name} layer")
+                continue
+
+            gdf = gpd.read_file(file_path, layer=spec.layer_name)
+
+            if len(gdf) == 0:
+                tqdm.write(f"File {tile} has no {spec.layer_name} features")
+                continue
+
+            tqdm.write(f"Loaded {len(gdf)} {spec.layer_name} features from {tile}")
+            layers[spec.name] = _trim_columns(gdf, spec.columns)
+
+    return layers
+
+
+def read_tile_ids(tile: str, specs: Sequence[LayerSpec], zip_path: str = OPEN_MAP_DATA) -> Dict[str, np.ndarray]:
+    """
+    Read only the hashed feature ids of the requested layers from a single GML tile, without building geometries
+    :param tile: name of the GML tile within the archive
+    :param specs: the layers to read
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :return: the ids of each layer of the tile, keyed by layer spec name
+    """
+    ids = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with zipfile.ZipFile(zip_path) as zip_file:
+            file_path = zip_file.extract(tile, temp_dir)
+
+        available_layers = fiona.listlayers(file_path)
+        for spec in specs:
+            if spec.layer_name in available_layers:
+                with fiona.open(file_path, layer=spec.layer_name, ignore_geometry=True) as collection:
+                    ids[spec.name] = hash_ids([feature["properties"][ID_COLUMN] for feature in collection])
+    return ids
+
+
+def ordered_map(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    """
+    Map func over items, using a pool of worker processes if workers > 1.
+    Results are yielded in the same order as the items. At most 2 * workers results are held
+    in memory at once, so a slow consumer does not cause results to pile up.
+    :param func: a picklable function
+    :param items: the items to process
+    :param workers: number of worker processes (1 means run in this process)
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    with Pool(workers) as pool:
+        pending: Deque = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def read_tiles(
+    tiles: Sequence[str], specs: Sequence[LayerSpec], workers: int = DEFAULT_WORKERS, zip_path: str = OPEN_MAP_DATA
+) -> Iterator[Dict[str, gpd.GeoDataFrame]]:
+    """
+    Read the given layers from each of the tiles, in worker processes
+    :param tiles: the names of the tiles within the archive
+    :param specs: the layers to read
+    :param workers: number of worker processes used to read the tiles
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :return: an iterator with, for each tile in order, its non-empty layers (see read_tile)
+    """
+    reader = partial(read_tile, specs=specs, zip_path=zip_path)
+    return tqdm(ordered_map(reader, tiles, workers), total=len(tiles))
+
+
+def deduplicate_tile(
+    tile: str,
+    tile_layers: Dict[str, gpd.GeoDataFrame],
+    index_sets: Dict[str, HashedIdSet],
+    tile_ids: Optional[Dict[str, TileIds]] = None,
+) -> Dict[str, gpd.GeoDataFrame]:
+    """
+    Drop the features of a tile that were already seen in an earlier tile, and tag the rest with the tile
+    :param tile: the name of the tile
+    :param tile_layers: the layers read from the tile (see read_tile)
+    :param index_sets: the ids seen so far of each layer, which the ids of the tile are added to
+    :param tile_ids: if given, the ids of the tile are recorded in these, by layer
+    :return: the non-empty de-duplicated layers, without the id column
+    """
+    deduplicated_layers = {}
+    with span("dedup") as dedup_span:
+        for name, gdf in tile_layers.items():
+            dedup_span.rows_in += len(gdf)
+            ids = gdf[ID_COLUMN].to_numpy()
+            new_mask = index_sets[name].add_new(ids)
+            if tile_ids is not None:
+                tile_ids[name].add(tile, ids, new_mask)
+            gdf = gdf[new_mask]
+            if len(gdf) == 0:
+                continue
+            deduplicated_layers[name] = gdf.drop(columns=[ID_COLUMN]).assign(**{SOURCE_TILE_COLUMN: tile})
+            dedup_span.rows_out += len(gdf)
+    return deduplicated_layers
+
+
+def extract_layers(
+    specs: Sequence[LayerSpec],
+    workers: int = DEFAULT_WORKERS,
+    zip_path: str = OPEN_MAP_DATA,
+    dedup_memory_limit: Optional[int] = None,
+    tile_ids: Optional[Dict[str, TileIds]] = None,
+) -> Iterator[Dict[str, gpd.GeoDataFrame]]:
+    """
+    Extract the given layers from every tile of the OS OpenMap Local archive in a single pass.
+    Tiles are read in worker processes but yielded in archive order, so the output is deterministic.
+    Features are repeated in neighbouring tiles, so any feature already seen in an earlier tile is dropped.
+    :param specs: the layers to extract
+    :param workers: number of worker processes used to read the tiles
+    :param zip_path: path to the downloaded OS OpenMap Local zip file
+    :param dedup_memory_limit: optional ceiling, in bytes, on the memory used to de-duplicate each layer
+    :param tile_ids: if given, the ids of the features of each tile are recorded in these, by layer
+    :return: an iterator with, for each tile, the non-empty de-duplicated layers keyed by layer spec name
+    """
+    tiles = list_tiles(zip_path)
+    tqdm.write(f"{len(tiles)} files to process using {workers} worker(s)")
+
+    index_sets = {spec.name: HashedIdSet(max_bytes=dedup_memory_limit) for spec in specs}
+
+    for tile, tile_layers in zip(tiles, read_tiles(tiles, specs, workers=workers, zip_path=zip_path)):
+        yield deduplicate_tile(tile, tile_layers, index_sets, tile_ids)
+
+    for name, index_set in index_sets.items():
+        tqdm.write(f"De-duplication index for {name}: {index_set.summary()}")
+
+
+def extract_layers_to_files(
+    specs: Sequence[LayerSpec],
+    workers: int = DEFAULT_WORKERS,
+    dedup_memory_limit: Optional[int] = None,
+    tile_ids: Optional[Dict[str, TileIds]] = None,
+) -> None:
+    """
+    Extract the given layers in a single pass over the archive, writing each to its own GeoPackage
+    :param specs: the layers to extract
+    :param workers: number of worker processes used to read the tiles
+    :param dedup_memory_limit: optional ceiling, in bytes, on the memory used to de-duplicate each layer
+    :param tile_ids: if given, the ids of the features of each tile are recorded in these, by layer
+    """
+    with ExitStack() as stack:
+        sinks = {spec.name: stack.enter_context(FeatureSink(spec.output, driver="GPKG")) for spec in specs}
+        for tile_layers in extract_layers(
+            specs, workers=workers, dedup_memory_limit=dedup_memory_limit, tile_ids=tile_ids
+        ):
+            with span("write") as write_span:
+                for name, gdf in tile_layers.items():
+                    sinks[name].write(gdf)
+                    write_span.rows_out += len(gdf)
@@ -23,7 +23,8 @@ cd "$(dirname "$0")"
 # AREA="SP"  # Oxford only
 AREA="GB"  # whole UK
 
-curl -SL -X "GET" \
+python ../common/fetch.py \
   "https://api.os.uk/downloads/v1/products/OpenMapLocal/downloads?area=${AREA}&format=GML&redirect=true" \
-  -H "accept: application/json" \
-  -o os-openmap-local.zip
+  os-openmap-local.zip \
+  --header "accept: application/json" \
+  --metrics os-openmap-local
@@ -0,0 +1,109 @@
+"""
+Finds the nearest primary substations to every charge point, car park, and bus stop or station, with their distance
+and demand headroom, so that these can be read rather than searched for.
+
+e.g. to find the nearest substations to ad-hoc points (e.g. candidate sites) instead:
+    python nearest-substations.py --point -1.2577 51.7520 --point -1.2000 51.7000 -k 3
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Tuple
+
+import geopandas as gpd
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.area_index import representative_points  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.nearest import (  # noqa: E402 pylint: disable=wrong-import-position
+    DISTANCE_COLUMN,
+    POINT_CRS,
+    RANK_COLUMN,
+    NearestSites,
+)
+from common.outputs import read_geoparquet, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
+PRIMARY_SUBSTATIONS_FILE = "../dnos/merge/dnos-primary-substations.parquet"
+# the attributes of the substations written for each feature
+SUBSTATION_COLUMNS = ["DNO", "Site Name", "Demand Headroom (MVA)"]
+DEFAULT_K = 3
+
+
+@dataclass(frozen=True)
+class FeatureLayer:
+    """
+    :param path: the GeoParquet file of the features
+    :param key_columns: the columns identifying each feature
+    """
+
+    path: str
+    key_columns: Tuple[str, ...]
+
+
+# the layers, and the columns identifying their features. The outputs are named after the layers, e.g.
+# "charge-points-nearest-substations"
+FEATURE_LAYERS = {
+    "charge-points": FeatureLayer("../charge-points/charge-points.parquet", ("chargeDeviceID",)),
+    "car-parks": FeatureLayer("../car-parks/car-parks.parquet", ("element_type", "osmid")),
+    "bus-stops-and-stations": FeatureLayer(
+        "../bus-stops-stations/bus-stops-and-stations.parquet", ("element_type", "osmid")
+    ),
+}
+
+
+def nearest_substations_of_layer(layer: FeatureLayer, substations: NearestSites, k: int) -> gpd.GeoDataFrame:
+    """
+    :param layer: the features
+    :param substations: the primary substations
+    :param k: the number of substations to find for each feature
+    :return: a row for each of the k nearest substations to each feature, with the key columns of the feature, the
+        rank of the substation, its attributes and its distance in metres, and the point the distance was measured
+        from as its geometry
+    """
+    gdf = read_geoparquet(layer.path, columns=list(layer.key_columns))
+    with span("nearest") as nearest_span:
+        nearest_df = substations.nearest(gdf.geometry, k, keys=gdf[list(layer.key_columns)])
+        nearest_span.rows_in += len(gdf)
+        nearest_span.rows_out += len(nearest_df)
+    points_gs = representative_points(gdf.geometry).to_crs(POINT_CRS)
+    return gpd.GeoDataFrame(
+        nearest_df.reset_index(drop=True), geometry=points_gs.loc[nearest_df.index].to_numpy(), crs=POINT_CRS
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="the number of substations to find for each feature")
+    parser.add_argument(
+        "--point",
+        nargs=2,
+        type=float,
+        action="append",
+        metavar=("LONGITUDE", "LATITUDE"),
+        help="find the nearest substations to this point rather than to the features of each layer",
+    )
+    args = parser.parse_args()
+
+    substations = NearestSites.from_file(PRIMARY_SUBSTATIONS_FILE, SUBSTATION_COLUMNS)
+    if args.point:
+        longitudes, latitudes = zip(*args.point)
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            print(substations.nearest_to_points(longitudes, latitudes, args.k))
+        return
+
+    with stage_metrics("nearest-substations"):
+        print(f"{len(substations)} primary substations")
+        for name, layer in FEATURE_LAYERS.items():
+            nearest_gdf = nearest_substations_of_layer(layer, substations, args.k)
+            nearest_distances = nearest_gdf.loc[nearest_gdf[RANK_COLUMN] == 1, DISTANCE_COLUMN]
+            print(
+                f"{name}: {len(nearest_gdf)} rows, "
+                f"median distance to the nearest substation {nearest_distances.median():.0f}m"
+            )
+            write_outputs(nearest_gdf, f"{name}-nearest-substations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+#!/usr/bin/env bash
+set -e
+
+cd "$(dirname "$0")"
+
+# Downloads the OpenStreetMap extract for Great Britain (England, Scotland and Wales) in PBF format.
+# See: https://download.geofabrik.de/europe/great-britain.html
+# OpenStreetMap data are available under the Open Database License (https://www.openstreetmap.org/copyright)
+
+python ../common/fetch.py "https://download.geofabrik.de/europe/great-britain-latest.osm.pbf" great-britain-latest.osm.pbf --metrics osm-extract-download
@@ -0,0 +1,70 @@
+"""
+Extracts the OpenStreetMap features used by the other workflows (car parks, bus stops and stations and county
+boundaries) from a local Great Britain .osm.pbf extract, in a single pass over the file.
+
+The outputs keep the tags those workflows read (dropping the others as the file is read), in the same layout as
+osmnx.geometries_from_place, and are read by the car-parks, bus-stops-stations and boundaries workflows when run with
+"--source pbf".
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.osm_pbf import Tags, features_from_pbf  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import PARQUET, write_outputs  # noqa: E402 pylint: disable=wrong-import-position
+
+GB_PBF = "great-britain-latest.osm.pbf"
+
+# output file name (without extension) -> the tags of the features to extract
+QUERIES: Dict[str, Tags] = {
+    "osm-car-parks": {"amenity": "parking"},
+    "osm-bus-stops-and-stations": {"amenity": "bus_station", "highway": "bus_stop"},
+    # counties and unitary authorities (admin_level 6) and ceremonial counties, read by osm-county-boundary.py when run
+    # with "--source pbf"
+    "osm-county-boundaries": {"admin_level": "6", "boundary": "ceremonial"},
+}
+# output file name -> the tags kept as columns, those read by osm-car-parks.py, osm-bus-stops-and-stations.py and
+# osm-county-boundary.py
+COLUMNS: Dict[str, List[str]] = {
+    "osm-car-parks": ["parking", "fee", "capacity", "park_ride", "supervised", "maxstay", "opening_hours"],
+    "osm-bus-stops-and-stations": ["amenity"],
+    "osm-county-boundaries": ["name"],
+}
+
+
+def extract(
+    pbf_path: str,
+    queries: Dict[str, Tags],
+    threads: Optional[int] = None,
+    columns: Optional[Dict[str, List[str]]] = None,
+) -> None:
+    """
+    Extract the features of each query and write them to GeoParquet
+    :param pbf_path: the .osm.pbf file (e.g. a small fixture, to test the extraction)
+    :param queries: output file name -> tags
+    :param threads: the number of threads decoding the file
+    :param columns: output file name -> the tags kept as columns (all of them for outputs without any)
+    """
+    with span("parse") as parse_span:
+        gdfs = features_from_pbf(pbf_path, queries, threads=threads, columns=columns)
+        parse_span.rows_out += sum(len(gdf) for gdf in gdfs.values())
+    for output, gdf in gdfs.items():
+        print(f"Extracted {len(gdf)} features to {output}")
+        write_outputs(gdf, output, formats=[PARQUET])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pbf", default=GB_PBF, help="the .osm.pbf file to read")
+    parser.add_argument("--threads", type=int, default=None, help="number of threads decoding the file")
+    args = parser.parse_args()
+
+    with stage_metrics("osm-extract"):
+        extract(args.pbf, QUERIES, threads=args.threads, columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Queries the workflow outputs from their persisted spatial indexes (see common/spatial_query.py).
+
+e.g. python query.py build
+     python query.py radius charge-points -1.2577 51.7520 2000
+     python query.py nearest dnos-primary-substations -1.2577 51.7520 -k 3
+     python query.py polygon car-parks "POLYGON ((-1.27 51.74, -1.24 51.74, -1.24 51.76, -1.27 51.76, -1.27 51.74))"
+
+Coordinates are longitudes and latitudes (EPSG:4326), and distances are in metres.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pygeos
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.metrics import stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.spatial_query import (  # noqa: E402 pylint: disable=wrong-import-position
+    DEFAULT_INDEX_DIR,
+    LAYERS,
+    WORKFLOWS_DIR,
+    SpatialQueryService,
+    build_index,
+)
+
+
+def build(service: SpatialQueryService, layer_names: List[str]) -> None:
+    """
+    :param service: the service of the layers
+    :param layer_names: the layers whose indexes to build (all of them if empty)
+    """
+    for name in layer_names or service.layer_names:
+        start = time.perf_counter()
+        build_index(WORKFLOWS_DIR / service.layer_paths[name], service.index_dir / name)
+        print(f"{name}: built in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=str(DEFAULT_INDEX_DIR), help="the directory of the indexes")
+    parser.add_argument("--geojson", action="store_true", help="print the results as GeoJSON rather than a table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="build the indexes of the layers")
+    build_parser.add_argument("layers", nargs="*", choices=list(LAYERS), help="the layers (default: all)")
+
+    radius_parser = subparsers.add_parser("radius", help="the features within a radius of a point")
+    nearest_parser = subparsers.add_parser("nearest", help="the features nearest a point")
+    for point_parser in [radius_parser, nearest_parser]:
+        point_parser.add_argument("layer", choices=list(LAYERS))
+        point_parser.add_argument("longitude", type=float)
+        point_parser.add_argument("latitude", type=float)
+    radius_parser.add_argument("metres", type=float)
+    nearest_parser.add_argument("-k", type=int, default=1, help="the number of features")
+
+    polygon_parser = subparsers.add_parser("polygon", help="the features intersecting a polygon")
+    polygon_parser.add_argument("layer", choices=list(LAYERS))
+    polygon_parser.add_argument("wkt", help="the polygon, as WKT")
+    args = parser.parse_args()
+
+    service = SpatialQueryService(index_dir=args.index_dir)
+    if args.command == "build":
+        with stage_metrics("query-indexes"):
+            build(service, args.layers)
+        return
+
+    layer = service.layer(args.layer)
+    layer.open()
+    start = time.perf_counter()
+    if args.command == "radius":
+        results = layer.within_radius(args.longitude, args.latitude, args.metres)
+    elif args.command == "nearest":
+        results = layer.nearest(args.longitude, args.latitude, args.k)
+    else:
+        results = layer.within_polygon(pygeos.from_wkt(args.wkt))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if args.geojson:
+        print(results.to_json())
+    else:
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            print(results)
+        print(f"{len(results)} features in {elapsed_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+"""
+Tiles the workflow outputs drawn on the web map (roads, buildings, car parks and the boundaries) into a single
+MBTiles archive of Mapbox Vector Tiles, so the map fetches only the tiles in view rather than whole GeoJSON files.
+
+The layers are projected to web mercator (EPSG:3857), and every tile of each zoom level that a feature may touch is
+rendered by a pool of worker processes, which share the layers and their spatial indexes: the features of each layer
+that intersect the tile (and a small buffer around it) are clipped to it, features smaller than a pixel of the tile
+are dropped, the rest are simplified to the resolution of the tile, and the tile is encoded and gzip-compressed. A
+layer is only drawn from its minimum zoom level (e.g. buildings only when zoomed in far enough to see them).
+
+The GeoPackage layers (the land-use roads and buildings, tens of millions of features for all of GB) are never held
+whole. The tiles from the region zoom level up are rendered one region (a tile of that zoom level, about 25 km
+across in GB at zoom 10) at a time, reading only the features of the GeoPackage layers in and around the region,
+found through the spatial index of the GeoPackage, and forking the workers once they are read. The other layers are
+read whole. So the memory used is that of the other layers and of the roads and buildings of the densest region,
+rather than of all of GB. A million buildings take about 0.7 GB once read (0.9 GB at the peak of reading them), and
+the densest region, central London, has of the order of two million features, so the stage needs about 2 GB, within
+an 8 GB worker. A higher --region-zoom reads smaller regions, using less memory. The region zoom level is lowered to
+the minimum zoom of any GeoPackage layer drawn below it, as the tiles below it span several regions.
+
+e.g. python vector-tiles.py --layers roads buildings --max-zoom 12
+     python vector-tiles.py --input charge-points ../charge-points/charge-points.parquet 8 --output chargers.mbtiles
+"""
+import argparse
+import gzip
+import os
+import sys
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pygeos
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.geometry import from_pygeos, to_pygeos  # noqa: E402 pylint: disable=wrong-import-position
+from common.gpkg import gpkg_extent, iter_gpkg_chunks  # noqa: E402 pylint: disable=wrong-import-position
+from common.mbtiles import MBTilesWriter  # noqa: E402 pylint: disable=wrong-import-position
+from common.metrics import span, stage_metrics  # noqa: E402 pylint: disable=wrong-import-position
+from common.mvt import DEFAULT_EXTENT, MvtLayer, encode_tile  # noqa: E402 pylint: disable=wrong-import-position
+from common.outputs import read_geodataframe  # noqa: E402 pylint: disable=wrong-import-position
+
+OUTPUT = "gb-layers.mbtiles"
+DEFAULT_MIN_ZOOM = 4
+DEFAULT_MAX_ZOOM = 14
+DEFAULT_WORKERS = os.cpu_count() or 1
+# the tiles rendered by a worker process in one task
+TILES_PER_TASK = 64
+# the zoom level of the regions the GeoPackage layers are read and tiled in
+DEFAULT_REGION_ZOOM = 10
+
+TILE_CRS = "EPSG:3857"
+# half the width of the web mercator world, in metres
+HALF_WORLD = 20037508.342789244
+# the extent of Great Britain, in EPSG:4326, for the metadata of the tileset
+GB_BOUNDS = (-8.7, 49.8, 1.8, 60.9)
+GB_CENTER = (-2.0, 54.0, 6)
+# the buffer around each tile that features are clipped to, in tile coordinates, so lines and polygon edges that
+# cross the edge of a tile are drawn without gaps
+TILE_BUFFER = 64
+# features smaller than this, in tile coordinates (length for lines, square root of area for polygons), are dropped
+MIN_FEATURE_SIZE = 1.0
+# the simplification tolerance, in tile coordinates
+SIMPLIFY_TOLERANCE = 1.0
+
+
+@dataclass(frozen=True)
+class TileLayer:
+    """
+    :param path: the workflow output (GeoParquet, GeoJSON or GeoPackage) the layer is read from
+    :param columns: the attribute columns written to the tiles (all of them if None, except for GeoPackages)
+    :param min_zoom: the lowest zoom level the layer is drawn at
+    """
+
+    path: str
+    columns: Optional[Tuple[str, ...]]
+    min_zoom: int
+
+
+LAYERS: Dict[str, TileLayer] = {
+    "administrative-counties": TileLayer(
+        "../boundaries/administrative-county-boundaries.parquet", ("display_name",), DEFAULT_MIN_ZOOM
+    ),
+    "ceremonial-counties": TileLayer(
+        "../boundaries/ceremonial-county-boundaries.parquet", ("display_name",), DEFAULT_MIN_ZOOM
+    ),
+    "postcode-districts": TileLayer("../boundaries-postcode-district/uk-postcode-districts.parquet", ("Name",), 8),
+    "lsoa-boundaries": TileLayer("../boundaries-lsoa/lsoa-boundaries.parquet", ("LSOA11CD",), 10),
+    "roads": TileLayer("../land-use/roads.gpkg", ("classification", "distinctiveName", "roadNumber"), 10),
+    "car-parks": TileLayer("../car-parks/car-parks.parquet", ("parking", "fee", "capacity"), 12),
+    "buildings": TileLayer("../land-use/buildings.gpkg", (), 13),
+}
+
+
+@dataclass
+class LoadedLayer:
+    """
+    :param geometries: the pygeos geometries of the features, in web mercator
+    :param properties: the attributes of the features
+    :param tree: the spatial index of the geometries
+    :param min_zoom: the lowest zoom level the layer is drawn at
+    """
+
+    geometries: np.ndarray
+    properties: pd.DataFrame
+    tree: pygeos.STRtree
+    min_zoom: int
+
+
+@dataclass(frozen=True)
+class RegionalLayer:
+    """
+    A GeoPackage layer, read one region at a time
+    :param layer: the layer
+    :param crs: the CRS of the GeoPackage layer
+    :param bounds: the bounds of its features, in web mercator (None if it has none)
+    """
+
+    layer: TileLayer
+    crs: Optional[str]
+    bounds: Optional[Tuple[float, float, float, float]]
+
+
+# the layers being tiled (the regional layers of the region being rendered), shared with the worker processes (which
+# are forked once they are loaded)
+_LAYERS: Dict[str, LoadedLayer] = {}
+
+
+def is_regional(layer: TileLayer) -> bool:
+    """
+    :param layer: the layer
+    :return: whether the layer is a GeoPackage, read one region at a time rather than whole
+    """
+    return Path(layer.path).suffix == ".gpkg"
+
+
+def transform_bounds(
+    bounds: Tuple[float, float, float, float], from_crs: Optional[str], to_crs: Optional[str]
+) -> Tuple[float, float, float, float]:
+    """
+    :param bounds: bounds (minx, miny, maxx, maxy)
+    :param from_crs: their CRS
+    :param to_crs: the CRS to reproject them to
+    :return: the bounds of the reprojected box (whose edges are densified first, as they curve once reprojected)
+    """
+    box = pygeos.segmentize(pygeos.box(*bounds), (bounds[2] - bounds[0]) / 32)
+    return tuple(from_pygeos(np.array([box]), pd.RangeIndex(1), from_crs).to_crs(to_crs).total_bounds)
+
+
+def _loaded_layer(geometries: np.ndarray, properties: pd.DataFrame, min_zoom: int) -> LoadedLayer:
+    keep = ~pygeos.is_missing(geometries) & ~pygeos.is_empty(geometries)
+    geometries = geometries[keep]
+    properties = properties[keep].reset_index(drop=True)
+    return LoadedLayer(geometries, properties, pygeos.STRtree(geometries), min_zoom)
+
+
+def read_layer(layer: TileLayer) -> gpd.GeoDataFrame:
+    """
+    :param layer: a layer other than a GeoPackage
+    :return: the features of the layer, with its columns, in web mercator
+    """
+    columns = list(layer.columns) if layer.columns is not None else None
+    return read_geodataframe(layer.path, columns).to_crs(TILE_CRS)
+
+
+def read_region(layer: RegionalLayer, bounds: Tuple[float, float, float, float]) -> LoadedLayer:
+    """
+    :param layer: a GeoPackage layer
+    :param bounds: the bounds of a region, in web mercator
+    :return: the features of the layer whose bounding box intersects the region, read chunk by chunk into pygeos
+        geometries in web mercator
+    """
+    layer_bounds = transform_bounds(bounds, TILE_CRS, layer.crs)
+    geometries, properties = [np.empty(0, dtype=object)], []
+    for chunk in iter_gpkg_chunks(layer.layer.path, layer.layer.columns or (), bounds=layer_bounds):
+        geometries.append(to_pygeos(chunk.geometry.to_crs(TILE_CRS)))
+        properties.append(pd.DataFrame(chunk.drop(columns=chunk.geometry.name)))
+    columns = list(layer.layer.columns or ())
+    properties_df = pd.concat(properties, ignore_index=True) if properties else pd.DataFrame(columns=columns)
+    return _loaded_layer(np.concatenate(geometries), properties_df, layer.layer.min_zoom)
+
+
+def load_layers(layers: Dict[str, TileLayer]) -> Dict[str, RegionalLayer]:
+    """
+    Read the layers other than the GeoPackages, and build their spatial indexes
+    :param layers: the layers, by name
+    :return: the GeoPackage layers, by name, to be read one region at a time
+    """
+    regional_layers = {}
+    for name, layer in layers.items():
+        if is_regional(layer):
+            extent, crs = gpkg_extent(layer.path)
+            bounds = transform_bounds(extent, crs, TILE_CRS) if extent is not None else None
+            regional_layers[name] = RegionalLayer(layer, crs, bounds)
+            continue
+        gdf = read_layer(layer)
+        properties = pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).reset_index(drop=True)
+        _LAYERS[name] = _loaded_layer(to_pygeos(gdf.geometry), properties, layer.min_zoom)
+        print(f"{name}: {len(_LAYERS[name].geometries)} features")
+    return regional_layers
+
+
+def tile_size(zoom: int) -> float:
+    """
+    :param zoom: a zoom level
+    :return: the width of a tile at the zoom level, in web mercator metres
+    """
+    return 2 * HALF_WORLD / (1 << zoom)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    :param zoom: the zoom level of the tile
+    :param x: the column of the tile
+    :param y: the row of the tile, numbered from the north
+    :return: the bounds of the tile (minx, miny, maxx, maxy), in web mercator
+    """
+    size = tile_size(zoom)
+    min_x = -HALF_WORLD + x * size
+    max_y = HALF_WORLD - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+
+def covered_tiles(geometries: np.ndarray, zoom: int, region: Optional[Tuple[int, int, int]] = None) -> np.ndarray:
+    """
+    :param geometries: pygeos geometries, in web mercator
+    :param zoom: a zoom level
+    :param region: only return the tiles within this tile (zoom, x, y) of the same or a lower zoom level
+    :return: the (x, y) of each tile of the zoom level that the bounding box of any of the geometries touches
+    """
+    first_x, first_y, last_x, last_y = 0, 0, (1 << zoom) - 1, (1 << zoom) - 1
+    if region is not None:
+        region_zoom, region_x, region_y = region
+        shift = zoom - region_zoom
+        first_x, first_y = region_x << shift, region_y << shift
+        last_x, last_y = first_x + (1 << shift) - 1, first_y + (1 << shift) - 1
+    bounds = pygeos.bounds(geometries).reshape(-1, 4)
+    size = tile_size(zoom)
+    x0, x1 = (np.floor((bounds[:, i] + HALF_WORLD) / size) for i in (0, 2))
+    y0, y1 = (np.floor((HALF_WORLD - bounds[:, i]) / size) for i in (3, 1))
+    # the bounding boxes that touch the tiles (missing and empty geometries have NaN bounds, so are left out)
+    touching = (x1 >= first_x) & (x0 <= last_x) & (y1 >= first_y) & (y0 <= last_y)
+    if not touching.any():
+        return np.empty((0, 2), dtype=np.int64)
+    x0, x1 = (np.clip(x[touching], first_x, last_x).astype(np.int64) for x in (x0, x1))
+    y0, y1 = (np.clip(y[touching], first_y, last_y).astype(np.int64) for y in (y0, y1))
+    # expand each bounding box into its tiles: the tiles of the i-th box are x0[i] + (k // height[i]) and
+    # y0[i] + (k % height[i]) for k in 0..width[i] * height[i]
+    widths, heights = x1 - x0 + 1, y1 - y0 + 1
+    counts = widths * heights
+    owners = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tiles = np.column_stack([x0[owners] + k // heights[owners], y0[owners] + k % heights[owners]])
+    return np.unique(tiles, axis=0)
+
+
+def _visible(geometries: np.ndarray, pixel: float) -> np.ndarray:
+    # points are always kept; lines and polygons are kept if they are at least a pixel long / across
+    dimensions = pygeos.get_dimensions(geometries)
+    size = np.where(dimensions == 1, pygeos.length(geometries), np.sqrt(pygeos.area(geometries)))
+    return ~pygeos.is_empty(geometries) & ((dimensions == 0) | (size >= MIN_FEATURE_SIZE * pixel))
+
+
+def render_tile(zoom: int, x: int, y: int, extent: int = DEFAULT_EXTENT) -> Optional[bytes]:
+    """
+    :param zoom: the zoom level of the tile
+    :param x: the column of the tile
+    :param y: the row of the tile, numbered from the north
+    :param extent: the size of the tile, in tile coordinates
+    :return: the encoded tile, gzip-compressed, or None if no feature is drawn on the tile
+    """
+    min_x, _, _, max_y = bounds = tile_bounds(zoom, x, y)
+    pixel = tile_size(zoom) / extent
+    buffer = TILE_BUFFER * pixel
+    buffered = (bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+    mvt_layers = []
+    for name, layer in _LAYERS.items():
+        if zoom < layer.min_zoom:
+            continue
+        indices = np.sort(layer.tree.query(pygeos.box(*buffered), predicate="intersects"))
+        if not len(indices):
+            continue
+        geometries = pygeos.clip_by_rect(layer.geometries[indices], *buffered)
+        visible = _visible(geometries, pixel)
+        geometries = pygeos.simplify(geometries[visible], SIMPLIFY_TOLERANCE * pixel)
+        # to tile coordinates, with y pointing down
+        coordinates = pygeos.get_coordinates(geometries)
+        tile_coordinates = np.column_stack([coordinates[:, 0] - min_x, max_y - coordinates[:, 1]]) / pixel
+        geometries = pygeos.set_coordinates(geometries.copy(), tile_coordinates)
+        properties = layer.properties.iloc[indices[visible]]
+        mvt_layers.append(MvtLayer(name, geometries, properties, extent))
+    tile = encode_tile(mvt_layers)
+    return gzip.compress(tile) if tile is not None else None
+
+
+def render_tiles(zoom: int, tiles: np.ndarray) -> List[Tuple[int, int, int, bytes]]:
+    """
+    :param zoom: the zoom level of the tiles
+    :param tiles: the (x, y) of each tile
+    :return: the zoom, x, y and data of each tile that has any features
+    """
+    rendered = []
+    for x, y in tiles.tolist():
+        data = render_tile(zoom, x, y)
+        if data is not None:
+            rendered.append((zoom, x, y, data))
+    return rendered
+
+
+def _render_task(task: Tuple[int, np.ndarray]) -> List[Tuple[int, int, int, bytes]]:
+    return render_tiles(*task)
+
+
+def tile_tasks(
+    min_zoom: int, max_zoom: int, region: Optional[Tuple[int, int, int]] = None
+) -> List[Tuple[int, np.ndarray]]:
+    """
+    :param min_zoom: the lowest zoom level
+    :param max_zoom: the highest zoom level
+    :param region: only the tiles within this tile (zoom, x, y), of a zoom level no higher than min_zoom
+    :return: the tiles that may have features, in tasks of neighbouring tiles of one zoom level
+    """
+    tasks = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        geometries = [layer.geometries for layer in _LAYERS.values() if zoom >= layer.min_zoom]
+        tiles = covered_tiles(np.concatenate(geometries) if geometries else np.empty(0, dtype=object), zoom, region)
+        if not len(tiles):
+            # no layer is drawn at this zoom level (e.g. below the minimum zoom of every layer)
+            continue
+        tasks.extend((zoom, chunk) for chunk in np.array_split(tiles, -(-len(tiles) // TILES_PER_TASK)))
+    return tasks
+
+
+def _field_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "Boolean"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "Number"
+    return "String"
+
+
+def _regional_dtypes(layer: RegionalLayer) -> pd.Series:
+    # the types of the columns of a GeoPackage layer, from its first feature
+    first = next(iter_gpkg_chunks(layer.layer.path, layer.layer.columns or (), chunk_size=1), None)
+    if first is None:
+        return pd.Series(dtype=object, index=list(layer.layer.columns or ()))
+    return first.drop(columns=first.geometry.name).dtypes
+
+
+def tileset_metadata(
+    name: str, min_zoom: int, max_zoom: int, regional_layers: Optional[Dict[str, RegionalLayer]] = None
+) -> Dict[str, object]:
+    """
+    :param name: the name of the tileset
+    :param min_zoom: the lowest zoom level
+    :param max_zoom: the highest zoom level
+    :param regional_layers: the GeoPackage layers, read one region at a time
+    :return: the MBTiles metadata of the tileset, describing the loaded and the regional layers
+    """
+    layer_dtypes = {layer_name: (layer.properties.dtypes, layer.min_zoom) for layer_name, layer in _LAYERS.items()}
+    for layer_name, layer in (regional_layers or {}).items():
+        layer_dtypes[layer_name] = (_regional_dtypes(layer), layer.layer.min_zoom)
+    vector_layers = [
+        {
+            "id": layer_name,
+            "fields": {column: _field_type(dtype) for column, dtype in dtypes.items()},
+            "minzoom": max(min_zoom, layer_min_zoom),
+            "maxzoom": max_zoom,
+        }
+        for layer_name, (dtypes, layer_min_zoom) in layer_dtypes.items()
+    ]
+    return {
+        "name": name,
+        "format": "pbf",
+        "type": "overlay",
+        "bounds": ",".join(map(str, GB_BOUNDS)),
+        "center": ",".join(map(str, GB_CENTER)),
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "json": {"vector_layers": vector_layers},
+    }
+
+
+def _render(tasks: List[Tuple[int, np.ndarray]], writer: MBTilesWriter, workers: int, progress: bool) -> None:
+    if not tasks:
+        return
+    # the workers are forked here, so they share the layers loaded so far
+    with get_context("fork").Pool(workers) as pool:
+        rendered_tasks = pool.imap_unordered(_render_task, tasks)
+        for rendered in tqdm(rendered_tasks, total=len(tasks), desc="Tiles") if progress else rendered_tasks:
+            for zoom, x, y, data in rendered:
+                writer.write(zoom, x, y, data)
+
+
+def tile_regions(regional_layers: Dict[str, RegionalLayer], region_zoom: int) -> np.ndarray:
+    """
+    :param regional_layers: the GeoPackage layers
+    :param region_zoom: the zoom level of the regions
+    :return: the (x, y) of each region (a tile of the region zoom level) that any of the loaded layers or the
+        GeoPackage layers may have features in
+    """
+    extents = [pygeos.box(*layer.bounds) for layer in regional_layers.values() if layer.bounds is not None]
+    geometries = np.concatenate([np.array(extents, dtype=object), *(layer.geometries for layer in _LAYERS.values())])
+    return covered_tiles(geometries, region_zoom)
+
+
+def export_tiles(
+    output: str,
+    min_zoom: int,
+    max_zoom: int,
+    regional_layers: Optional[Dict[str, RegionalLayer]] = None,
+    workers: int = DEFAULT_WORKERS,
+    region_zoom: int = DEFAULT_REGION_ZOOM,
+) -> int:
+    """
+    Render every tile of the loaded and the regional layers, and write them to an MBTiles file
+    :param output: the MBTiles file
+    :param min_zoom: the lowest zoom level
+    :param max_zoom: the highest zoom level
+    :param regional_layers: the GeoPackage layers, read one region at a time
+    :param workers: the number of processes rendering tiles
+    :param region_zoom: the zoom level of the regions the GeoPackage layers are read in
+    :return: the number of tiles written
+    """
+    regional_layers = regional_layers or {}
+    if regional_layers:
+        region_zoom = min(region_zoom, *(layer.layer.min_zoom for layer in regional_layers.values()))
+    else:
+        # with only loaded layers, every zoom level is rendered at once
+        region_zoom = max_zoom + 1
+    metadata = tileset_metadata(Path(output).stem, min_zoom, max_zoom, regional_layers)
+    with MBTilesWriter(output, metadata) as writer:
+        # below the region zoom level only the loaded layers are drawn
+        _render(tile_tasks(min_zoom, min(max_zoom, region_zoom - 1)), writer, workers, progress=True)
+        if region_zoom > max_zoom:
+            return writer.n_tiles
+        regions = tile_regions(regional_layers, region_zoom)
+        # the features of the GeoPackage layers are read with the largest buffer of the tiles of the region
+        buffer = TILE_BUFFER * tile_size(region_zoom) / DEFAULT_EXTENT
+        for x, y in tqdm(regions.tolist(), desc="Regions"):
+            min_x, min_y, max_x, max_y = tile_bounds(region_zoom, x, y)
+            buffered = (min_x - buffer, min_y - buffer, max_x + buffer, max_y + buffer)
+            for name, layer in regional_layers.items():
+                _LAYERS[name] = read_region(layer, buffered)
+            tasks = tile_tasks(max(min_zoom, region_zoom), max_zoom, (region_zoom, x, y))
+            _render(tasks, writer, workers, progress=False)
+            # released before the next region is read, so only one region is held at a time
+            for name in regional_layers:
+                del _LAYERS[name]
+        return writer.n_tiles
+
+
+def _layers_to_export(layer_names: Optional[Sequence[str]], inputs: Sequence[Sequence[str]]) -> Dict[str, TileLayer]:
+    layers = {name: LAYERS[name] for name in layer_names} if layer_names is not None else {}
+    for name, path, min_zoom in inputs:
+        layers[name] = TileLayer(path, None, int(min_zoom))
+    return layers if layer_names is not None or inputs else dict(LAYERS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layers", nargs="*", choices=list(LAYERS), help="the layers to tile (default: all)")
+    parser.add_argument(
+        "--input",
+        nargs=3,
+        action="append",
+        default=[],
+        metavar=("NAME", "PATH", "MIN_ZOOM"),
+        help="also tile another workflow output, with all its columns, as a layer (may be repeated)",
+    )
+    parser.add_argument("--min-zoom", type=int, default=DEFAULT_MIN_ZOOM, help="the lowest zoom level")
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM, help="the highest zoom level")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of processes rendering tiles")
+    parser.add_argument(
+        "--region-zoom",
+        type=int,
+        default=DEFAULT_REGION_ZOOM,
+        help="the zoom level of the regions the GeoPackage layers are read in (higher uses less memory)",
+    )
+    parser.add_argument("--output", default=OUTPUT, help="the MBTiles file to write")
+    args = parser.parse_args()
+    if not 0 <= args.min_zoom <= args.max_zoom:
+        parser.error("--min-zoom must be between 0 and --max-zoom")
+
+    with stage_metrics("vector-tiles"):
+        with span("load") as load_span:
+            regional_layers = load_layers(_layers_to_export(args.layers, args.input))
+            load_span.rows_in += sum(len(layer.geometries) for layer in _LAYERS.values())
+        with span("render") as render_span:
+            n_tiles = export_tiles(
+                args.output, args.min_zoom, args.max_zoom, regional_layers, args.workers, args.region_zoom
+            )
+            render_span.rows_out += n_tiles
+    print(f"Wrote {n_tiles} tiles to {args.output}")
+
+
+if __name__ == "__main__":
+    main()